@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+GLB Compression Benchmark
+Compares file size and decode time of float32 and 16-bit quantized point cloud GLBs
+
+Usage: python benchmarks/glb_compression_bench.py [--sizes 100,1000,5000]
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import struct
+import argparse
+import numpy as np
+
+# Add the parent directory to the path so we can import from routes
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.dimension import CLOUD_PARAMS, build_point_cloud, point_cloud_glb, GLTF_UNSIGNED_SHORT
+from point_cloud_bench import synthetic_route
+
+def decode_positions(glb):
+    """Parse a point cloud GLB back into float32 XYZ, applying the node transform for quantized files"""
+    json_length = struct.unpack_from("<I", glb, 12)[0]
+    gltf = json.loads(glb[20:20 + json_length])
+    bin_offset = 20 + json_length + 8
+
+    accessor = gltf["accessors"][0]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    start = bin_offset + view.get("byteOffset", 0)
+
+    if accessor["componentType"] != GLTF_UNSIGNED_SHORT:
+        return np.frombuffer(glb, dtype="<f4", count=accessor["count"] * 3, offset=start).reshape(-1, 3)
+
+    node = gltf["nodes"][0]
+    stride = view["byteStride"] // 2
+    quantized = np.frombuffer(glb, dtype="<u2", count=accessor["count"] * stride, offset=start).reshape(-1, stride)
+    scale = np.asarray(node["scale"], dtype=np.float32)
+    translation = np.asarray(node["translation"], dtype=np.float32)
+    return quantized[:, :3] * scale + translation
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized GLB export")
+    parser.add_argument("--sizes", default="100,1000,5000", help="Comma separated input point counts")
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'format':>10} {'size':>12} {'gzip':>12} {'encode':>9} {'decode':>9} {'max err':>9}")
+    for n_points in [int(s) for s in args.sizes.split(",")]:
+        vertices = build_point_cloud(synthetic_route(n_points), **CLOUD_PARAMS)
+        extent = float(np.max(vertices.max(axis=0) - vertices.min(axis=0)))
+
+        for label, quantize in (("float32", False), ("quantized", True)):
+            glb, encode_time = timed(lambda: b"".join(point_cloud_glb(vertices, quantize)[0]))
+            decoded, decode_time = timed(decode_positions, glb)
+            error = float(np.max(np.abs(decoded - vertices))) / extent
+            print(f"{n_points:>8} {label:>10} {len(glb):>12} {len(gzip.compress(glb, 6)):>12} "
+                  f"{encode_time:>8.3f}s {decode_time:>8.3f}s {error:>9.1e}")
+
+if __name__ == "__main__":
+    main()
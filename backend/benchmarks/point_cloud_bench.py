@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Point Cloud Benchmark
+Compares the vectorized point cloud builder against the original per-point loop
+
+Usage: python benchmarks/point_cloud_bench.py [--sizes 100,1000,10000] [--loop-max 1000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Add the parent directory to the path so we can import from routes
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.dimension import build_point_cloud, normalize_and_scale
+
+# Production settings used by /dimension/floating-line-model
+DENSITY_FACTOR = 5
+TAIL_POINTS = 50
+INTERP_TAIL_INTERVAL = 1
+
+def add_tail_to_point(point, dense_coords, tail_points, min_z_level, grid_size=9):
+    """Original loop implementation, kept as the reference output"""
+    total_tail_length = point[2] - min_z_level
+    for j in range(1, tail_points + 1):
+        tail_point = point.copy()
+        z_factor = j / tail_points
+        tail_point[2] = point[2] - (z_factor * total_tail_length)
+        dense_coords.append(tail_point)
+
+        offset = total_tail_length * 0.001
+        if j % 3 == 0:
+            half_grid = grid_size // 2
+            for dx_idx in range(grid_size):
+                for dy_idx in range(grid_size):
+                    dx = offset * (dx_idx - half_grid)
+                    dy = offset * (dy_idx - half_grid)
+                    if dx == 0 and dy == 0:
+                        continue
+                    extra_point = tail_point.copy()
+                    extra_point[0] += dx
+                    extra_point[1] += dy
+                    dense_coords.append(extra_point)
+
+def build_point_cloud_loop(coords, density_factor=20, tail_points=500, interp_tail_interval=1):
+    """Original loop implementation, kept as the reference output"""
+    coords = np.array(coords, dtype=np.float32)
+    min_z_level = np.min(coords[:, 2]) - 1000.0
+
+    dense_coords = []
+    for i in range(len(coords) - 1):
+        p1 = coords[i]
+        p2 = coords[i + 1]
+        dense_coords.append(p1)
+        add_tail_to_point(p1, dense_coords, tail_points, min_z_level, grid_size=9)
+        for j in range(1, density_factor):
+            t = j / density_factor
+            interp_point = p1 * (1 - t) + p2 * t
+            dense_coords.append(interp_point)
+            if j % interp_tail_interval == 0:
+                add_tail_to_point(interp_point, dense_coords, tail_points // 2, min_z_level, grid_size=7)
+
+    last_point = coords[-1]
+    dense_coords.append(last_point)
+    add_tail_to_point(last_point, dense_coords, tail_points, min_z_level, grid_size=9)
+    return np.array(dense_coords, dtype=np.float32)
+
+def synthetic_route(n_points, seed=0):
+    """Random-walk lat/lng/elevation track scaled the same way as the endpoint"""
+    rng = np.random.default_rng(seed)
+    lat = 43.47 + np.cumsum(rng.normal(0, 1e-4, n_points))
+    lng = -80.54 + np.cumsum(rng.normal(0, 1e-4, n_points))
+    elevation = 330 + np.cumsum(rng.normal(0, 0.5, n_points))
+    coords = np.stack([lat, lng, elevation], axis=1)
+    return normalize_and_scale(coords, target_size=1.0, z_exaggeration=2000.0, xy_exaggeration=100000.0)
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark point cloud generation")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma separated input point counts")
+    parser.add_argument("--loop-max", type=int, default=1000,
+                        help="Largest input to run the loop version on (10k needs several GB of RAM)")
+    args = parser.parse_args()
+
+    params = dict(density_factor=DENSITY_FACTOR, tail_points=TAIL_POINTS, interp_tail_interval=INTERP_TAIL_INTERVAL)
+    print(f"{'points':>8} {'output':>12} {'vectorized':>12} {'loop':>12} {'speedup':>9}")
+
+    for n_points in [int(s) for s in args.sizes.split(",")]:
+        coords = synthetic_route(n_points)
+        fast, fast_time = timed(build_point_cloud, coords, **params)
+
+        if n_points <= args.loop_max:
+            slow, slow_time = timed(build_point_cloud_loop, coords, **params)
+            if slow.shape != fast.shape or not np.allclose(slow, fast, rtol=1e-5, atol=1e-2):
+                raise SystemExit(f"Output mismatch at {n_points} points")
+            loop_col, speedup_col = f"{slow_time:.3f}s", f"{slow_time / fast_time:.1f}x"
+        else:
+            loop_col, speedup_col = "skipped", "-"
+
+        print(f"{n_points:>8} {len(fast):>12} {fast_time:>11.3f}s {loop_col:>12} {speedup_col:>9}")
+
+if __name__ == "__main__":
+    main()
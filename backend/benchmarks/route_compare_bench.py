@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Route Comparison Benchmark
+Compares the metric resampled comparison engine against the original raw-degree Hausdorff check
+
+Usage: python benchmarks/route_compare_bench.py [--sizes 100,1000,10000,50000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.spatial.distance import directed_hausdorff
+
+# Add the parent directory to the path so we can import from utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.route_compare import compare_routes
+
+def compare_polylines_original(poly1, poly2, threshold_ratio=0.02):
+    """Original /maps/compare implementation, kept for reference"""
+    all_points = np.vstack([poly1, poly2])
+    bbox_diag = np.linalg.norm(all_points.max(axis=0) - all_points.min(axis=0))
+    if bbox_diag == 0:
+        return False
+    u = np.array(poly1)
+    v = np.array(poly2)
+    dist = max(directed_hausdorff(u, v)[0], directed_hausdorff(v, u)[0])
+    return (dist / bbox_diag) < threshold_ratio
+
+def synthetic_run(n_points, seed):
+    """A looping route around Waterloo sampled at n_points with GPS-like noise"""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, n_points)
+    lat = 43.47 + 0.01 * np.sin(t) + 0.002 * np.sin(5 * t) + rng.normal(0, 2e-5, n_points)
+    lng = -80.54 + 0.015 * np.cos(t) + rng.normal(0, 2e-5, n_points)
+    return np.column_stack([lat, lng])
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route comparison")
+    parser.add_argument("--sizes", default="100,1000,10000,50000", help="Comma separated points per route")
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'original':>10} {'hausdorff':>10} {'+frechet':>10} {'distance':>10} {'match':>6}")
+    for n_points in [int(s) for s in args.sizes.split(",")]:
+        reference = synthetic_run(n_points, seed=1)
+        candidate = synthetic_run(n_points, seed=2)
+
+        original, original_time = timed(compare_polylines_original, reference, candidate)
+        result, fast_time = timed(compare_routes, reference, candidate)
+        ordered, ordered_time = timed(compare_routes, reference, candidate, check_order=True)
+
+        print(f"{n_points:>8} {original_time:>9.3f}s {fast_time:>9.3f}s {ordered_time:>9.3f}s "
+              f"{result['hausdorff_m']:>9.1f}m {str(ordered['match']):>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Activity Stream Decoding Benchmark
+Measures time and peak memory of decoding full-resolution latlng/altitude/time streams and comparing
+the routes, whole-body json.loads versus the incremental decoder with streaming resampling
+
+Usage: python benchmarks/stream_decode_bench.py [--sizes 10000,100000,500000] [--chunk 65536]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+# Add the parent directory to the path so we can import from utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.route_compare import compare_routes, RouteIndex
+from utils.route_streams import ActivityStreams, StreamDecoder
+from route_compare_bench import synthetic_run
+
+def streams_body(n_points, seed):
+    """A key_by_type=true streams response as Strava sends it"""
+    latlng = synthetic_run(n_points, seed).round(6)
+    return json.dumps({
+        "latlng": {"data": latlng.tolist(), "series_type": "distance", "original_size": n_points, "resolution": "high"},
+        "altitude": {"data": np.round(300 + 10 * np.sin(np.arange(n_points) / 500), 1).tolist(), "series_type": "distance"},
+        "time": {"data": list(range(n_points)), "series_type": "distance"},
+    }, separators=(",", ":"))
+
+def decode_whole(bodies):
+    """Parse each body in one go and compare the raw routes"""
+    routes = [np.asarray(json.loads(body)["latlng"]["data"]) for body in bodies]
+    return compare_routes(routes[0], routes[1])
+
+def decode_streaming(bodies, chunk_size):
+    """Feed each body through the incremental decoder in chunks and compare the resampled routes"""
+    routes = []
+    for body in bodies:
+        streams = ActivityStreams()
+        decoder = StreamDecoder(streams.add)
+        for start in range(0, len(body), chunk_size):
+            decoder.feed(body[start:start + chunk_size])
+        routes.append(streams.finish()["latlng"])
+    return RouteIndex.from_coords(routes[0]).compare(routes[1])
+
+def measure(fn, *args):
+    """Run fn, returning its result, wall time and peak traced allocation"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-resolution stream decoding")
+    parser.add_argument("--sizes", default="10000,100000,500000", help="Comma separated points per stream")
+    parser.add_argument("--chunk", type=int, default=65536, help="Characters per decoder chunk")
+    args = parser.parse_args()
+
+    print(f"{'points':>8} {'mode':>10} {'time':>9} {'per 10k':>9} {'peak MiB':>9} {'per 10k':>9} {'distance':>9}")
+    for n_points in [int(s) for s in args.sizes.split(",")]:
+        bodies = [streams_body(n_points, seed=1), streams_body(n_points, seed=2)]
+        per_10k = 10000 / n_points / len(bodies)
+
+        for label, fn, extra in (("whole", decode_whole, ()), ("streaming", decode_streaming, (args.chunk,))):
+            result, elapsed, peak = measure(fn, bodies, *extra)
+            peak_mib = peak / 2**20
+            print(f"{n_points:>8} {label:>10} {elapsed:>8.3f}s {elapsed * per_10k:>8.4f}s "
+                  f"{peak_mib:>9.2f} {peak_mib * per_10k:>9.3f} {result['hausdorff_m']:>8.1f}m")
+
+if __name__ == "__main__":
+    main()
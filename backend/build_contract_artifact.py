@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Script to compile the GLBNFT contract into artifacts/GLBNFT.json
+Run this whenever the contract source changes and commit the artifact, so the API loads
+the ABI and bytecode from disk instead of installing solc and compiling at startup
+"""
+
+import sys
+import argparse
+from utils.nft_contract import ARTIFACT_PATH, SOLIDITY_VERSION, compile_contract, read_artifact, source_hash, write_artifact
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precompiled NFT contract artifact")
+    parser.add_argument("--output", default=ARTIFACT_PATH, help="Artifact path")
+    parser.add_argument("--check", action="store_true", help="Only check that the artifact matches the source")
+    args = parser.parse_args()
+
+    if args.check:
+        if read_artifact(args.output) is None:
+            print(f"Artifact {args.output} is missing or stale; run build_contract_artifact.py")
+            sys.exit(1)
+        print(f"Artifact {args.output} is up to date ({source_hash()[:12]})")
+        return
+
+    print(f"Compiling with solc {SOLIDITY_VERSION}...")
+    abi, bytecode = compile_contract()
+    write_artifact(abi, bytecode, args.output)
+    print(f"Wrote {args.output} ({source_hash()[:12]}, {len(bytecode) // 2} bytes of bytecode)")
+
+if __name__ == "__main__":
+    main()
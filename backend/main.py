@@ -18,7 +18,9 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "RaceFi API"}
+    # Readiness of the lazily initialized NFT subsystem; the first check starts connecting in the background
+    nft.provider.warm_up()
+    return {"status": "healthy", "service": "RaceFi API", "nft": nft.provider.status()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,12 @@
+-- Per-user Strava OAuth tokens (STRAVA_TOKEN_BACKEND=supabase).
+-- Only the backend's service role reads or writes them, so RLS is enabled with no policies.
+CREATE TABLE IF NOT EXISTS public.strava_tokens (
+  user_id TEXT PRIMARY KEY,
+  access_token TEXT NOT NULL,
+  refresh_token TEXT NOT NULL,
+  expires_at BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS strava_tokens_expires_at_idx ON public.strava_tokens (expires_at);
+
+ALTER TABLE public.strava_tokens ENABLE ROW LEVEL SECURITY;
@@ -1,34 +1,181 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import os
+import json
+import random
+import struct
+import asyncio
+import threading
 import numpy as np
 import polyline
 import googlemaps
-import trimesh
+import requests
 from dotenv import load_dotenv
+from services.glb_cache import GLBCache
+from services.elevation_cache import ElevationCache
+from utils.geometry import simplify_coords, simplify_indices
 
 load_dotenv()
 
 router = APIRouter(prefix="/dimension", tags=["dimension-mapping"])
 
+# Bump when the generated GLB changes for the same inputs so cached files and ETags are invalidated
+GLB_FORMAT_VERSION = 1
+
+# Normalize and exaggerate XY much more than Z
+SCALE_PARAMS = {
+    "target_size": 1.0,
+    "z_exaggeration": 2000.0,   # Much lower Z exaggeration to make tails longer relative to height
+    "xy_exaggeration": 100000.0,
+}
+
+# Point cloud with dense tails for ALL points
+CLOUD_PARAMS = {
+    "density_factor": 5,        # Fewer interpolated points to balance with tails
+    "tail_points": 50,          # 50 points per tail for shorter tails
+    "interp_tail_interval": 1,  # Add tails to EVERY interpolated point
+}
+
+# Levels of detail: mint is the full model, lower levels scale CLOUD_PARAMS and the
+# grid sizes down until the point cloud fits target_vertices
+LOD_LEVELS = {
+    "preview": {"target_vertices": 50_000},     # mobile previews and marketplace thumbnails
+    "standard": {"target_vertices": 250_000},
+    "mint": {"target_vertices": None},
+}
+LOD_SCALES = (1.0, 0.8, 0.6, 0.5, 0.4, 0.3, 0.2, 0.1)
+LOD_PRECOMPUTE = os.getenv("LOD_PRECOMPUTE", "1") == "1"
+
+# Server-side ceiling on route points fed into the model (0 disables)
+MAX_ROUTE_POINTS = int(os.getenv("MAX_ROUTE_POINTS", "0"))
+
+glb_cache = GLBCache()
+elevation_cache = ElevationCache()
+
 class DimensionRequest(BaseModel):
     polyline: str
+    lod: str = "mint"                           # one of LOD_LEVELS
+    quantize: bool = False                      # 16-bit KHR_mesh_quantization positions
+    simplify_tolerance: Optional[float] = None  # meters; drop points closer than this to the simplified line
+    max_points: Optional[int] = None            # keep at most this many route points
+
+# Google Elevation API accepts at most 512 locations per request and URLs up to 16k characters
+ELEVATION_BATCH_SIZE = int(os.getenv("ELEVATION_BATCH_SIZE", "512"))
+ELEVATION_MAX_URL_CHARS = int(os.getenv("ELEVATION_MAX_URL_CHARS", "8000"))
+ELEVATION_CONCURRENCY = int(os.getenv("ELEVATION_CONCURRENCY", "4"))
+ELEVATION_RETRIES = int(os.getenv("ELEVATION_RETRIES", "3"))
+ELEVATION_BACKOFF_SECONDS = 0.5
+
+_gmaps_client = None
+_gmaps_lock = threading.Lock()
+_elevation_semaphore = None
+
+def get_gmaps_client():
+    """Shared Google Maps client whose HTTP session keeps a pool of ELEVATION_CONCURRENCY connections"""
+    global _gmaps_client
+    with _gmaps_lock:
+        if _gmaps_client is None:
+            api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+            if not api_key:
+                raise HTTPException(status_code=500, detail="GOOGLE_MAPS_API_KEY not configured")
+            client = googlemaps.Client(key=api_key, retry_over_query_limit=False)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=ELEVATION_CONCURRENCY)
+            client.session.mount("https://", adapter)
+            _gmaps_client = client
+        return _gmaps_client
+
+def google_elevation_provider(locations):
+    """Look up elevations for (lat, lng) pairs with the shared Google Maps client"""
+    return [result["elevation"] for result in get_gmaps_client().elevation(locations)]
+
+def elevation_batches(locations):
+    """
+    Split locations into consecutive batches of at most ELEVATION_BATCH_SIZE points
+    whose pipe-separated form fits in ELEVATION_MAX_URL_CHARS. The client sends the
+    shorter of that and an encoded polyline, so this bounds the real URL length.
+    """
+    batch, batch_chars = [], 0
+    for location in locations:
+        chars = len(f"{location[0]},{location[1]}|")
+        if batch and (len(batch) >= ELEVATION_BATCH_SIZE or batch_chars + chars > ELEVATION_MAX_URL_CHARS):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(location)
+        batch_chars += chars
+    if batch:
+        yield batch
+
+def elevation_semaphore():
+    """Per-process limit on concurrent upstream batches, bound to the running event loop"""
+    global _elevation_semaphore
+    loop = asyncio.get_running_loop()
+    if _elevation_semaphore is None or _elevation_semaphore[0] is not loop:
+        _elevation_semaphore = (loop, asyncio.Semaphore(ELEVATION_CONCURRENCY))
+    return _elevation_semaphore[1]
+
+async def fetch_elevation_batch(locations, provider):
+    """Run one upstream batch in a worker thread, retrying failures with exponential backoff"""
+    async with elevation_semaphore():
+        for attempt in range(ELEVATION_RETRIES + 1):
+            try:
+                elevations = await asyncio.to_thread(provider, locations)
+                if len(elevations) != len(locations):
+                    raise ValueError(f"Expected {len(locations)} elevations, got {len(elevations)}")
+                return elevations
+            except HTTPException:
+                raise
+            except Exception as e:
+                if attempt == ELEVATION_RETRIES:
+                    raise
+                delay = ELEVATION_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+                print(f"Elevation batch of {len(locations)} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
-def fetch_elevation(polyline_str: str):
-    api_key = os.getenv("GOOGLE_MAPS_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="GOOGLE_MAPS_API_KEY not configured")
+def route_point_budget(max_points=None):
+    """Combine a requested point budget with the MAX_ROUTE_POINTS ceiling"""
+    budgets = [budget for budget in (max_points, MAX_ROUTE_POINTS) if budget]
+    return min(budgets) if budgets else None
+
+async def fetch_elevation(polyline_str: str, provider=None, simplify_tolerance=None, max_points=None):
+    """
+    Decode a polyline and attach an elevation to every point.
+    The decoded route is first simplified (Douglas-Peucker) when a tolerance
+    in meters or a point budget is given. Elevations come from the grid cache; only cells not seen before are sent
+    upstream, as size-bounded batches fetched concurrently off the event loop.
+    provider maps a list of (lat, lng) pairs to elevations and defaults to the
+    Google Elevation API.
+    """
+    provider = provider or google_elevation_provider
 
     try:
         coords = polyline.decode(polyline_str)
-        gmaps = googlemaps.Client(key=api_key)
-        elevation_result = gmaps.elevation(coords)
+        coords = simplify_coords(coords, simplify_tolerance, max_points)
+        cells = elevation_cache.quantize(coords)
+        elevations = await asyncio.to_thread(elevation_cache.lookup, cells)
+
+        missing = [cell for cell in dict.fromkeys(cells) if cell not in elevations]
+        centers = dict(zip(elevation_cache.cell_centers(missing), missing))
+        batches = list(elevation_batches(list(centers)))
+        results = await asyncio.gather(*(fetch_elevation_batch(batch, provider) for batch in batches))
+
+        fetched = {
+            centers[location]: elevation
+            for batch, batch_elevations in zip(batches, results)
+            for location, elevation in zip(batch, batch_elevations)
+        }
+        if fetched:
+            await asyncio.to_thread(elevation_cache.store, fetched)
+            elevations.update(fetched)
 
         coords_3d = [
-            [float(lat), float(lng), float(elevation_result[i]["elevation"])]
-            for i, (lat, lng) in enumerate(coords)
+            [float(lat), float(lng), float(elevations[cell])]
+            for (lat, lng), cell in zip(coords, cells)
         ]
         return coords_3d
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Elevation data error: {str(e)}")
 
@@ -64,121 +211,385 @@ def normalize_and_scale(coords, target_size=1.0, z_exaggeration=10.0, xy_exagger
     coords[:, 2] = z
     return coords
 
-def add_tail_to_point(point, dense_coords, tail_points, min_z_level, grid_size=9):
-    """Helper function to add a vertical tail from the point down to min_z_level"""
-    # Tails start at the actual point and go down to min_z_level
-    total_tail_length = point[2] - min_z_level
-    
-    # Keep the original X,Y but create a tail from the point down to min_z_level
-    for j in range(1, tail_points + 1):  # Start from 1 to avoid duplicating the point
-        # Create points with same X,Y but Z ranging from point to min
-        tail_point = point.copy()
-        # Calculate Z position along the tail
-        z_factor = j / tail_points
-        tail_point[2] = point[2] - (z_factor * total_tail_length)
-        dense_coords.append(tail_point)
-        
-        # Add more points around each tail point to make it more visible
-        offset = total_tail_length * 0.001  # Offset relative to tail length
-        
-        # Create an ultra-dense grid of points around each tail point
-        # Only add these for every few points to avoid too many points
-        if j % 3 == 0:  # Every 3rd point gets a grid
-            half_grid = grid_size // 2
-            for dx_idx in range(grid_size):
-                for dy_idx in range(grid_size):
-                    # Calculate offsets to create a grid centered on the tail point
-                    dx = offset * (dx_idx - half_grid)
-                    dy = offset * (dy_idx - half_grid)
-                    
-                    # Skip the center point (already added)
-                    if dx == 0 and dy == 0:
-                        continue
-                    
-                    # Add grid point
-                    extra_point = tail_point.copy()
-                    extra_point[0] += dx
-                    extra_point[1] += dy
-                    dense_coords.append(extra_point)
+# Point cloud layout: every backbone point is followed by its vertical tail, and
+# every TAIL_GRID_EVERY-th tail point is surrounded by a square grid of points.
+ANCHOR_GRID_SIZE = 9
+INTERP_GRID_SIZE = 7
+TAIL_GRID_EVERY = 3
+TAIL_GRID_SPACING = 0.001  # grid offset relative to the tail length
+TAIL_DEPTH = 1000.0        # tails end this far below the lowest point
+CHUNK_ROWS = 1 << 20       # rows materialized per broadcast when filling blocks
 
-def create_point_cloud_glb(coords, density_factor=20, tail_points=500, interp_tail_interval=1):
-    """Create an EXTREMELY dense point cloud GLB with vertical tails going down from each point"""
-    coords = np.array(coords, dtype=np.float32)
+def tail_template(tail_points, grid_size):
+    """
+    Describe the block emitted for one point as (xy multipliers, z factors).
+
+    Row 0 is the point itself, followed by tail points 1..tail_points and the
+    grid around every TAIL_GRID_EVERY-th tail point (centre skipped, dx-major).
+    A point P with tail length L expands to
+    P.xy + L * TAIL_GRID_SPACING * xy and P.z - z * L.
+    """
+    half = grid_size // 2
+    gx, gy = np.meshgrid(np.arange(grid_size) - half, np.arange(grid_size) - half, indexing="ij")
+    ring = np.stack([gx.ravel(), gy.ravel()], axis=1).astype(np.float32)
+    ring = ring[(ring != 0).any(axis=1)]
+
+    js = np.arange(1, tail_points + 1)
+    has_grid = js % TAIL_GRID_EVERY == 0
+    counts = 1 + np.where(has_grid, len(ring), 0)
+    z = np.concatenate([[0.0], np.repeat(js / max(tail_points, 1), counts)]).astype(np.float32)
+
+    xy = np.zeros((len(z), 2), dtype=np.float32)
+    tail_rows = 1 + np.cumsum(counts) - counts
+    grid_rows = tail_rows[has_grid][:, None] + 1 + np.arange(len(ring))
+    xy[grid_rows] = ring
+    return xy, z
+
+def interpolate_backbone(coords, density_factor):
+    """Densify a route: each segment contributes its start point and density_factor - 1 evenly spaced points, then the final point is appended."""
+    t = (np.arange(density_factor, dtype=np.float32) / np.float32(density_factor))[None, :, None]
+    segments = coords[:-1, None, :] * (1 - t) + coords[1:, None, :] * t
+    return np.concatenate([segments.reshape(-1, 3), coords[-1:]], axis=0)
+
+def _fill_blocks(out, starts, points, min_z_level, template):
+    """Expand each point into its tail block and write it at its offset in out"""
+    xy, z = template
+    block_len = len(z)
+    offsets = np.arange(block_len)
+    step = max(1, CHUNK_ROWS // block_len)
+    for i in range(0, len(points), step):
+        pts = points[i:i + step]
+        tail_length = pts[:, 2] - min_z_level
+        block = np.empty((len(pts), block_len, 3), dtype=np.float32)
+        block[:, :, :2] = pts[:, None, :2] + (tail_length * np.float32(TAIL_GRID_SPACING))[:, None, None] * xy[None]
+        block[:, :, 2] = pts[:, None, 2] - z[None] * tail_length[:, None]
+        out[starts[i:i + step, None] + offsets] = block
+
+def build_point_cloud(coords, density_factor=20, tail_points=500, interp_tail_interval=1,
+                      anchor_grid_size=ANCHOR_GRID_SIZE, interp_grid_size=INTERP_GRID_SIZE):
+    """
+    Build the dense point cloud (interpolated route plus vertical tails) as a float32 (N, 3) array.
+
+    Original points get tails of tail_points points with an anchor_grid_size grid,
+    every interp_tail_interval-th interpolated point gets a tail half as long with
+    an interp_grid_size grid. The output size is known up front, so the array is
+    allocated once and filled with a handful of broadcasts per block type.
+    """
+    coords = np.asarray(coords, dtype=np.float32)
     if coords.shape[0] < 2:
         raise ValueError("Need at least 2 points to create a point cloud")
-    
-    # Calculate minimum Z level for all tails
-    min_z_level = np.min(coords[:, 2]) - 1000.0  # 1,000 units below the lowest point
-    
-    # Interpolate points to create a much denser point cloud
-    dense_coords = []
-    for i in range(len(coords) - 1):
-        p1 = coords[i]
-        p2 = coords[i + 1]
-        
-        # Add the first point
-        dense_coords.append(p1)
-        
-        # Add tail going down from the original point
-        add_tail_to_point(p1, dense_coords, tail_points, min_z_level, grid_size=9)
-        
-        # Add many interpolated points between p1 and p2
-        for j in range(1, density_factor):
-            t = j / density_factor
-            interp_point = p1 * (1 - t) + p2 * t
-            dense_coords.append(interp_point)
-            
-            # Add tails to ALL interpolated points
-            if j % interp_tail_interval == 0:  # Every nth interpolated point
-                add_tail_to_point(interp_point, dense_coords, tail_points // 2, min_z_level, grid_size=7)
-    
-    # Add the last point
-    if len(coords) > 0:
-        last_point = coords[-1]
-        dense_coords.append(last_point)
-        
-        # Add tail to the last point
-        add_tail_to_point(last_point, dense_coords, tail_points, min_z_level, grid_size=9)
-    
-    # Convert to numpy array
-    dense_coords = np.array(dense_coords, dtype=np.float32)
+
+    min_z_level = np.min(coords[:, 2]) - np.float32(TAIL_DEPTH)
+    backbone = interpolate_backbone(coords, density_factor)
+
+    # Segment starts and the final point are anchors
+    position = np.arange(len(backbone)) % density_factor
+    anchor = position == 0
+    interp = ~anchor & (position % interp_tail_interval == 0)
+    bare = ~anchor & ~interp
+
+    anchor_template = tail_template(tail_points, anchor_grid_size)
+    interp_template = tail_template(tail_points // 2, interp_grid_size)
+
+    block_lengths = np.ones(len(backbone), dtype=np.int64)
+    block_lengths[anchor] = len(anchor_template[1])
+    block_lengths[interp] = len(interp_template[1])
+    starts = np.cumsum(block_lengths) - block_lengths
+
+    dense_coords = np.empty((int(block_lengths.sum()), 3), dtype=np.float32)
+    _fill_blocks(dense_coords, starts[anchor], backbone[anchor], min_z_level, anchor_template)
+    _fill_blocks(dense_coords, starts[interp], backbone[interp], min_z_level, interp_template)
+    dense_coords[starts[bare]] = backbone[bare]
+    return dense_coords
+
+def tail_block_length(tail_points, grid_size):
+    """Rows emitted for one point: the point, its tail and the grids around every TAIL_GRID_EVERY-th tail point"""
+    return 1 + tail_points + (tail_points // TAIL_GRID_EVERY) * (grid_size * grid_size - 1)
+
+def point_cloud_size(n_coords, density_factor=20, tail_points=500, interp_tail_interval=1,
+                     anchor_grid_size=ANCHOR_GRID_SIZE, interp_grid_size=INTERP_GRID_SIZE):
+    """Number of vertices build_point_cloud produces for a route of n_coords points"""
+    segments = n_coords - 1
+    interp_tails = segments * ((density_factor - 1) // interp_tail_interval)
+    bare = segments * (density_factor - 1) - interp_tails
+    return (n_coords * tail_block_length(tail_points, anchor_grid_size)
+            + interp_tails * tail_block_length(tail_points // 2, interp_grid_size)
+            + bare)
+
+def scaled_cloud_params(scale):
+    """CLOUD_PARAMS and grid sizes scaled down by scale (grids stay odd so they keep a centre)"""
+    return {
+        "density_factor": max(1, round(CLOUD_PARAMS["density_factor"] * scale)),
+        "tail_points": max(3, round(CLOUD_PARAMS["tail_points"] * scale)),
+        "interp_tail_interval": CLOUD_PARAMS["interp_tail_interval"],
+        "anchor_grid_size": max(1, round(ANCHOR_GRID_SIZE * scale)) | 1,
+        "interp_grid_size": max(1, round(INTERP_GRID_SIZE * scale)) | 1,
+    }
+
+def lod_params(n_coords, lod):
+    """
+    Point cloud parameters for a level of detail, plus a route point budget.
+    The scale steps down through LOD_SCALES until the cloud fits the level's
+    target; if even the smallest step is too large the route is also capped
+    to the number of points that fit. The budget is None when not needed.
+    """
+    target = LOD_LEVELS[lod]["target_vertices"]
+    if target is None:
+        return scaled_cloud_params(1.0), None
+
+    for scale in LOD_SCALES:
+        params = scaled_cloud_params(scale)
+        if point_cloud_size(n_coords, **params) <= target:
+            return params, None
+
+    per_segment = point_cloud_size(3, **params) - point_cloud_size(2, **params)
+    first_point = point_cloud_size(2, **params) - per_segment
+    return params, max(2, (target - first_point) // per_segment + 1)
+
+def build_lod_point_cloud(scaled_coords, lod):
+    """Build the point cloud for a level of detail from already scaled route coordinates"""
+    params, max_points = lod_params(len(scaled_coords), lod)
+    if max_points is not None and max_points < len(scaled_coords):
+        scaled_coords = scaled_coords[simplify_indices(scaled_coords[:, :2], max_points=max_points)]
+    return build_point_cloud(scaled_coords, **params)
+
+# GLB 2.0 container constants
+GLB_MAGIC = b"glTF"
+GLB_VERSION = 2
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+GLB_STREAM_CHUNK_SIZE = 1 << 20
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_SHORT = 5123
+GLTF_ARRAY_BUFFER = 34962
+GLTF_MODE_POINTS = 0
+QUANTIZED_STRIDE = 8  # uint16 XYZ padded to the 4-byte alignment vertex attributes require
+QUANTIZED_LEVELS = 65535
+
+def point_cloud_gltf(positions, quantization=None):
+    """
+    glTF JSON for a single POINTS primitive whose POSITION data is the whole BIN chunk.
+    positions is either float32 XYZ, or (with quantization=(translation, scale))
+    KHR_mesh_quantization uint16 XYZ padded to QUANTIZED_STRIDE, in which case the
+    node transform maps them back to the original coordinates.
+    """
+    xyz = positions[:, :3]
+    node = {"name": "floating_line", "mesh": 0}
+    accessor = {
+        "bufferView": 0,
+        "byteOffset": 0,
+        "componentType": GLTF_FLOAT,
+        "type": "VEC3",
+        "count": len(positions),
+        "min": xyz.min(axis=0).tolist(),
+        "max": xyz.max(axis=0).tolist(),
+    }
+    buffer_view = {"buffer": 0, "byteOffset": 0, "byteLength": positions.nbytes}
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "RaceFi"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{
+            "name": "floating_line",
+            "primitives": [{"attributes": {"POSITION": 0}, "mode": GLTF_MODE_POINTS, "material": 0}],
+        }],
+        "materials": [{
+            "pbrMetallicRoughness": {"baseColorFactor": [1, 1, 1, 1], "metallicFactor": 0, "roughnessFactor": 0}
+        }],
+        "buffers": [{"byteLength": positions.nbytes}],
+        "bufferViews": [buffer_view],
+        "accessors": [accessor],
+    }
+
+    if quantization is not None:
+        translation, scale = quantization
+        node["translation"] = translation.tolist()
+        node["scale"] = scale.tolist()
+        accessor["componentType"] = GLTF_UNSIGNED_SHORT
+        buffer_view["byteStride"] = QUANTIZED_STRIDE
+        buffer_view["target"] = GLTF_ARRAY_BUFFER
+        gltf["extensionsUsed"] = ["KHR_mesh_quantization"]
+        gltf["extensionsRequired"] = ["KHR_mesh_quantization"]
+    return gltf
+
+def quantize_positions(vertices):
+    """
+    Quantize float32 XYZ to 16 bits per axis over the bounding box.
+    Returns (uint16 (N, 4) positions with a zero pad column, translation, scale)
+    such that vertex ~= position * scale + translation.
+    """
+    translation = vertices.min(axis=0).astype(np.float64)
+    extent = vertices.max(axis=0).astype(np.float64) - translation
+    scale = np.where(extent > 0, extent / QUANTIZED_LEVELS, 1.0)
+
+    positions = np.zeros((len(vertices), 4), dtype="<u2")
+    step = CHUNK_ROWS
+    for i in range(0, len(vertices), step):
+        chunk = (vertices[i:i + step] - translation) / scale
+        positions[i:i + step, :3] = np.rint(chunk)
+    return positions, translation, scale
+
+def glb_header(gltf, bin_length):
+    """
+    Build everything that precedes the BIN payload: the file header, the padded
+    JSON chunk and the BIN chunk header. Returns (header bytes, total file length).
+    """
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    bin_padding = -bin_length % 4
+    total_length = 12 + 8 + len(json_bytes) + 8 + bin_length + bin_padding
+
+    header = GLB_MAGIC + struct.pack("<II", GLB_VERSION, total_length)
+    header += struct.pack("<II", len(json_bytes), GLB_CHUNK_JSON) + json_bytes
+    header += struct.pack("<II", bin_length + bin_padding, GLB_CHUNK_BIN)
+    return header, total_length
+
+def iter_glb(header, payload, chunk_size=GLB_STREAM_CHUNK_SIZE):
+    """Yield a GLB as the header followed by slices of the BIN payload, without copying the payload as a whole"""
+    yield header
+    view = memoryview(payload).cast("B")
+    for offset in range(0, len(view), chunk_size):
+        yield bytes(view[offset:offset + chunk_size])
+    padding = -len(view) % 4
+    if padding:
+        yield b"\x00" * padding
+
+def point_cloud_glb(vertices, quantize=False):
+    """
+    Return (chunk iterator, total length) for a point cloud GLB written straight from
+    the vertex buffer. quantize stores 16-bit positions (KHR_mesh_quantization), which
+    takes 8 instead of 12 bytes per vertex.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype="<f4")
+    if quantize:
+        positions, translation, scale = quantize_positions(vertices)
+        gltf = point_cloud_gltf(positions, quantization=(translation, scale))
+    else:
+        positions, gltf = vertices, point_cloud_gltf(vertices)
+    header, total_length = glb_header(gltf, positions.nbytes)
+    return iter_glb(header, positions), total_length
+
+def create_point_cloud_glb(coords, density_factor=20, tail_points=500, interp_tail_interval=1):
+    """Create an EXTREMELY dense point cloud GLB with vertical tails going down from each point"""
+    dense_coords = build_point_cloud(coords, density_factor, tail_points, interp_tail_interval)
     print(f"Original points: {len(coords)}, Dense points with tails: {len(dense_coords)}")
-    
-    # Create a point cloud mesh with the dense points including tails
-    mesh = trimesh.points.PointCloud(dense_coords)
-    glb_data = mesh.export(file_type='glb')
-    return glb_data
+
+    chunks, _ = point_cloud_glb(dense_coords)
+    return b"".join(chunks)
+
+def glb_response(chunks, total_length, headers=None):
+    """Stream GLB chunks to the client with a known Content-Length"""
+    headers = dict(headers or {})
+    headers["Content-Length"] = str(total_length)
+    return StreamingResponse(chunks, media_type="model/gltf-binary", headers=headers)
+
+def etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header value against an ETag. The "*" wildcard is
+    not honoured: the model is generated by a POST, so there is no existing
+    representation for it to match before the request is validated.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def model_cache_key(polyline_str, simplify, lod, quantize):
+    """Cache key (and ETag) for a floating-line model"""
+    return GLBCache.make_key(
+        version=GLB_FORMAT_VERSION,
+        polyline=polyline_str,
+        simplify=simplify,
+        scale=SCALE_PARAMS,
+        cloud=CLOUD_PARAMS,
+        lod=lod,
+        lod_level=LOD_LEVELS[lod],
+        quantize=quantize,
+    )
+
+def precompute_lods(scaled_coords, polyline_str, simplify, skip_lod, quantize):
+    """
+    Render and cache the remaining levels of detail from the same scaled route,
+    so follow-up requests for other levels skip the elevation lookup. Levels
+    already cached or too large for the memory layer are skipped.
+    """
+    for lod in LOD_LEVELS:
+        cache_key = model_cache_key(polyline_str, simplify, lod, quantize)
+        if lod == skip_lod or glb_cache.contains(cache_key):
+            continue
+        params, max_points = lod_params(len(scaled_coords), lod)
+        n_coords = min(len(scaled_coords), max_points or len(scaled_coords))
+        bytes_per_vertex = QUANTIZED_STRIDE if quantize else 12
+        if point_cloud_size(n_coords, **params) * bytes_per_vertex > glb_cache.max_entry_bytes:
+            continue
+        chunks, _ = point_cloud_glb(build_lod_point_cloud(scaled_coords, lod), quantize)
+        glb_cache.put(cache_key, b"".join(chunks))
 
 @router.post("/floating-line-model")
-async def floating_line_model_endpoint(request: DimensionRequest):
+async def floating_line_model_endpoint(request: DimensionRequest, background_tasks: BackgroundTasks,
+                                       if_none_match: Optional[str] = Header(None)):
     """
     Generate a 3D point cloud GLB from a polyline.
     XY differences are exaggerated by 100,000x and Z can be optionally exaggerated.
+    lod selects a level of detail (preview, standard or mint); the other levels are
+    rendered in the background from the same elevation data. quantize stores
+    16-bit positions for smaller downloads and Walrus blobs.
+    Responses carry a content-addressed ETag, so clients can revalidate with If-None-Match.
     """
+    if request.lod not in LOD_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown lod '{request.lod}', expected one of {list(LOD_LEVELS)}")
+
+    simplify = {"tolerance": request.simplify_tolerance, "max_points": route_point_budget(request.max_points)}
+    cache_key = model_cache_key(request.polyline, simplify, request.lod, request.quantize)
+    etag = f'"{cache_key}"'
+    headers = {"ETag": etag}
+
+    if etag_matches(if_none_match, etag):
+        glb_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    cached = glb_cache.get(cache_key)
+    if isinstance(cached, str):
+        return FileResponse(cached, media_type="model/gltf-binary", headers=headers)
+    if cached is not None:
+        return Response(content=cached, media_type="model/gltf-binary", headers=headers)
+
     try:
-        coords_3d = fetch_elevation(request.polyline)
+        coords_3d = await fetch_elevation(
+            request.polyline,
+            simplify_tolerance=simplify["tolerance"],
+            max_points=simplify["max_points"]
+        )
         coords_np = np.array(coords_3d, dtype=np.float32)
 
-        # Normalize and exaggerate XY much more than Z
-        scaled_coords = normalize_and_scale(
-            coords_np,
-            target_size=1.0,
-            z_exaggeration=2000.0,   # Much lower Z exaggeration to make tails longer relative to height
-            xy_exaggeration=100000.0
-        )
+        scaled_coords = normalize_and_scale(coords_np, **SCALE_PARAMS)
+        dense_coords = await asyncio.to_thread(build_lod_point_cloud, scaled_coords, request.lod)
+        print(f"Original points: {len(scaled_coords)}, Dense points with tails ({request.lod}): {len(dense_coords)}")
 
-        # Generate point cloud GLB with dense tails for ALL points
-        glb_data = create_point_cloud_glb(
-            scaled_coords, 
-            density_factor=5,       # Fewer interpolated points to balance with tails
-            tail_points=50,         # 50 points per tail for shorter tails
-            interp_tail_interval=1  # Add tails to EVERY interpolated point
-        )
-        return Response(content=glb_data, media_type="model/gltf-binary")
+        if LOD_PRECOMPUTE:
+            background_tasks.add_task(
+                precompute_lods, scaled_coords, request.polyline, simplify, request.lod, request.quantize
+            )
+
+        # Small files are materialized and cached in memory, large ones are streamed
+        # straight from the vertex buffer (and written to the disk layer if enabled)
+        chunks, total_length = point_cloud_glb(dense_coords, request.quantize)
+        if total_length <= glb_cache.max_entry_bytes:
+            glb_data = b"".join(chunks)
+            glb_cache.put(cache_key, glb_data)
+            return Response(content=glb_data, media_type="model/gltf-binary", headers=headers)
+        return glb_response(glb_cache.tee(cache_key, chunks), total_length, headers)
 
     except HTTPException:
         raise
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters for the GLB and elevation caches"""
+    return {"glb": glb_cache.stats(), "elevation": elevation_cache.stats()}
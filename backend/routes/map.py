@@ -1,17 +1,44 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from typing import List, Optional
 from pydantic import BaseModel
+from concurrent.futures import ProcessPoolExecutor
 import os
-import numpy as np
-from scipy.spatial.distance import directed_hausdorff
+import asyncio
 import polyline
 from stravalib.client import Client
 from dotenv import load_dotenv
+from utils.route_compare import RouteIndex, compare_encoded
+from services.route_index_store import RouteIndexStore
+from services.strava_service import StravaError, StravaService
+from services.strava_token_store import DEFAULT_USER, StravaTokenStore
+from utils.supabase_auth import AuthError, authenticated_user_id
 
 load_dotenv()
 
+# Only used to build the authorization URL; tokens live in the per-user token store
 client = Client()
 
+# Activity reads go through one pooled async HTTP client instead of blocking stravalib calls,
+# with cached polylines and a rate-limit budget that sheds load before Strava returns 429s
+strava_service = StravaService()
+token_store = StravaTokenStore(strava_service)
+
+# Batch comparisons fan out to a process pool (0 scores in a worker thread instead)
+COMPARE_WORKERS = int(os.getenv("COMPARE_WORKERS", str(os.cpu_count() or 1)))
+# Batches smaller than this are not worth shipping to other processes
+COMPARE_PARALLEL_MIN = int(os.getenv("COMPARE_PARALLEL_MIN", "16"))
+
+# Callers without a Supabase session share the DEFAULT_USER tokens; only for single-user setups
+STRAVA_ALLOW_ANONYMOUS = os.getenv("STRAVA_ALLOW_ANONYMOUS", "0") == "1"
+
+_compare_pool = None
+
+# Reference routes are decoded, projected and indexed once per polyline
+route_index_store = RouteIndexStore()
+
+# "summary" compares map.summary_polyline; "full" compares the full-resolution GPS streams
+RESOLUTIONS = ("summary", "full")
+
 class LinkRequest(BaseModel):
     link: str
 
@@ -21,6 +48,38 @@ class CompareRequest(BaseModel):
     polyline1: str = None
     polyline2: str = None
     threshold_ratio: float = 0.02
+    check_order: bool = False  # also require the same direction of travel (discrete Fréchet)
+    resolution: str = "summary"  # one of RESOLUTIONS; "full" applies to activity ids only
+
+class CompareResponse(BaseModel):
+    match: bool
+    hausdorff_m: Optional[float] = None
+    ratio: Optional[float] = None
+    threshold_m: float
+    bbox_diagonal_m: float
+    frechet_match: Optional[bool] = None
+
+class CompareBatchRequest(BaseModel):
+    reference_activity_id: Optional[int] = None
+    reference_polyline: Optional[str] = None
+    candidate_activity_ids: List[int] = []
+    candidate_polylines: List[str] = []
+    threshold_ratio: float = 0.02
+    check_order: bool = False
+
+class CompareBatchResult(BaseModel):
+    index: int
+    activity_id: Optional[int] = None
+    match: bool
+    hausdorff_m: Optional[float] = None
+    ratio: Optional[float] = None
+    frechet_match: Optional[bool] = None
+    error: Optional[str] = None
+
+class CompareBatchResponse(BaseModel):
+    total: int
+    matched: int
+    results: List[CompareBatchResult]
 
 class AuthRequest(BaseModel):
     code: str
@@ -30,6 +89,30 @@ class RefreshTokenRequest(BaseModel):
 
 router = APIRouter(prefix="/maps", tags=["maps"])
 
+def caller_id(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """
+    The caller's user id from their Supabase access token, which picks whose
+    Strava tokens a request uses. None for anonymous callers (DEFAULT_USER
+    when STRAVA_ALLOW_ANONYMOUS is set).
+    """
+    try:
+        user_id = authenticated_user_id(authorization)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid access token: {e}", headers={"WWW-Authenticate": "Bearer"})
+    if user_id is None and STRAVA_ALLOW_ANONYMOUS:
+        return DEFAULT_USER
+    return user_id
+
+def require_user(user_id):
+    """401 unless the request identified a user"""
+    if user_id is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Sign in required: send your Supabase access token as 'Authorization: Bearer <token>'",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return user_id
+
 @router.get("/authorize")
 async def authorize_strava():
     """Get Strava authorization URL"""
@@ -45,8 +128,9 @@ async def authorize_strava():
     return {"authorization_url": url}
 
 @router.post("/authorization")
-async def handle_authorization(request: AuthRequest):
-    """Handle Strava OAuth callback and exchange code for token"""
+async def handle_authorization(request: AuthRequest, user_id: Optional[str] = Depends(caller_id)):
+    """Handle Strava OAuth callback and exchange code for the signed-in user's tokens"""
+    require_user(user_id)
     client_id = os.getenv("STRAVA_CLIENT_ID")
     client_secret = os.getenv("STRAVA_CLIENT_SECRET")
     
@@ -54,16 +138,7 @@ async def handle_authorization(request: AuthRequest):
         raise HTTPException(status_code=500, detail="Strava credentials not configured")
     
     try:
-        token_response = client.exchange_code_for_token(
-            client_id=client_id,
-            client_secret=client_secret,
-            code=request.code
-        )
-        
-        access_token = token_response["access_token"]
-        refresh_token = token_response["refresh_token"]
-        
-        client.access_token = access_token
+        await token_store.exchange_code(user_id, request.code)
         
         return {
             "message": "Authorization successful!",
@@ -73,8 +148,9 @@ async def handle_authorization(request: AuthRequest):
         raise HTTPException(status_code=500, detail=f"Token exchange failed: {str(e)}")
 
 @router.post("/refresh-token")
-async def refresh_access_token(request: RefreshTokenRequest):
+async def refresh_access_token(request: RefreshTokenRequest, user_id: Optional[str] = Depends(caller_id)):
     """Refresh expired access token using refresh token"""
+    require_user(user_id)
     client_id = os.getenv("STRAVA_CLIENT_ID")
     client_secret = os.getenv("STRAVA_CLIENT_SECRET")
     
@@ -82,16 +158,7 @@ async def refresh_access_token(request: RefreshTokenRequest):
         raise HTTPException(status_code=500, detail="Strava credentials not configured")
     
     try:
-        token_response = client.refresh_access_token(
-            client_id=client_id,
-            client_secret=client_secret,
-            refresh_token=request.refresh_token,
-        )
-        
-        new_access_token = token_response["access_token"]
-        new_refresh_token = token_response["refresh_token"]
-        
-        client.access_token = new_access_token
+        await token_store.refresh_with(user_id, request.refresh_token)
         
         return {
             "message": "Token refreshed successfully!",
@@ -100,45 +167,71 @@ async def refresh_access_token(request: RefreshTokenRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Token refresh failed: {str(e)}")
 
-def hausdorff_distance(poly1, poly2):
-    """Compute symmetric Hausdorff distance between two polylines."""
-    u = np.array(poly1)
-    v = np.array(poly2)
-    return max(directed_hausdorff(u, v)[0], directed_hausdorff(v, u)[0])
+def strava_http_error(error: StravaError):
+    """Map a Strava API error onto the HTTPException returned to our client"""
+    status_code = error.status_code if error.status_code in (401, 403, 404, 429) else 500
+    headers = {"Retry-After": str(error.retry_after)} if error.retry_after else None
+    return HTTPException(status_code=status_code, detail=f"Strava API error: {error}", headers=headers)
 
-def compare_polylines(poly1, poly2, threshold_ratio=0.02):
+async def user_access_token(user_id):
+    """The user's Strava access token, or 401 if they aren't signed in or haven't completed the OAuth flow"""
+    require_user(user_id)
+    try:
+        access_token = await token_store.get_access_token(user_id)
+    except StravaError as e:
+        raise strava_http_error(e)
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Not authorized. Please complete OAuth flow first.")
+    return access_token
+
+async def fetch_polylines(activity_ids, user_id, return_errors=False):
     """
-    Compare two polylines by Hausdorff distance.
-    Returns True if shape difference < threshold_ratio of polyline size.
+    Fetch summary polylines for activities concurrently with the user's access token.
+    With return_errors, an activity Strava won't return (deleted, private, rate limited)
+    gets its StravaError in its place instead of failing the whole fetch.
     """
-    all_points = np.vstack([poly1, poly2])
-    bbox_diag = np.linalg.norm(all_points.max(axis=0) - all_points.min(axis=0))
-
-    if bbox_diag == 0:
-        return False
+    access_token = await user_access_token(user_id)
+    try:
+        polylines = await strava_service.get_activity_polylines(
+            activity_ids, access_token, return_exceptions=return_errors
+        )
+    except StravaError as e:
+        raise strava_http_error(e)
+    for result in polylines:
+        # Only Strava's answers are per activity; anything else is our bug
+        if isinstance(result, BaseException) and not isinstance(result, StravaError):
+            raise result
+    return polylines
 
-    dist = hausdorff_distance(poly1, poly2)
-    return (dist / bbox_diag) < threshold_ratio
+async def fetch_routes(activity_ids, user_id):
+    """Fetch activities' full-resolution routes concurrently as resampled (lat, lng) arrays"""
+    access_token = await user_access_token(user_id)
+    try:
+        streams = await asyncio.gather(*(
+            strava_service.get_activity_streams(activity_id, access_token, keys=("latlng",))
+            for activity_id in activity_ids
+        ))
+    except StravaError as e:
+        raise strava_http_error(e)
+    for activity_id, activity_streams in zip(activity_ids, streams):
+        if activity_streams["original_size"] < 2:
+            raise HTTPException(status_code=400, detail=f"Activity {activity_id} has no GPS stream")
+    return [activity_streams["latlng"] for activity_streams in streams]
 
 @router.get("/", response_model=str)
-async def get_map_strava(activity_id: int):
+async def get_map_strava(activity_id: int, user_id: Optional[str] = Depends(caller_id)):
     """Get a polyline from Strava"""
-    if not client.access_token:
-        raise HTTPException(status_code=401, detail="Not authorized. Please complete OAuth flow first.")
-    
     try:
-        activity = client.get_activity(activity_id)
-        polyline_str = activity.map.summary_polyline
+        polyline_str, = await fetch_polylines([activity_id], user_id)
         return polyline_str
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Strava API error: {e}")
 
 @router.post("/by-link")
-async def get_map_strava_by_link(request: LinkRequest):
+async def get_map_strava_by_link(request: LinkRequest, user_id: Optional[str] = Depends(caller_id)):
     """Get a polyline from Strava by link"""
-    if not client.access_token:
-        raise HTTPException(status_code=401, detail="Not authorized. Please complete OAuth flow first.")
-    
     try:
         link = request.link
         
@@ -152,7 +245,7 @@ async def get_map_strava_by_link(request: LinkRequest):
         except ValueError:
             raise HTTPException(status_code=400, detail="Could not extract valid activity ID from link")
         
-        polyline_str = await get_map_strava(activity_id)
+        polyline_str = await get_map_strava(activity_id, user_id)
         return polyline_str
         
     except HTTPException:
@@ -160,26 +253,103 @@ async def get_map_strava_by_link(request: LinkRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Strava API error: {str(e)}")
 
-@router.post("/compare", response_model=bool)
-async def compare_map(request: CompareRequest):
+@router.post("/compare", response_model=CompareResponse)
+async def compare_map(request: CompareRequest, user_id: Optional[str] = Depends(caller_id)):
     """Compare two Strava activity polylines or direct polylines by shape similarity"""
-    if request.activity_id1 is not None and request.activity_id2 is not None:
-        if not client.access_token:
-            raise HTTPException(status_code=401, detail="Not authorized. Please complete OAuth flow first.")
-    
+    if request.resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution '{request.resolution}', expected one of {list(RESOLUTIONS)}")
+
     try:
         if request.activity_id1 is not None and request.activity_id2 is not None:
-            activity1 = client.get_activity(request.activity_id1)
-            activity2 = client.get_activity(request.activity_id2)
-
-            polyline1 = polyline.decode(activity1.map.summary_polyline)
-            polyline2 = polyline.decode(activity2.map.summary_polyline)
+            if request.resolution == "full":
+                reference, candidate = await fetch_routes([request.activity_id1, request.activity_id2], user_id)
+                index = RouteIndex.from_coords(reference)
+                return index.compare(candidate, request.threshold_ratio, request.check_order)
+            reference, candidate = await fetch_polylines([request.activity_id1, request.activity_id2], user_id)
         elif request.polyline1 is not None and request.polyline2 is not None:
-            polyline1 = polyline.decode(request.polyline1)
-            polyline2 = polyline.decode(request.polyline2)
+            reference = request.polyline1
+            candidate = request.polyline2
         else:
             raise HTTPException(status_code=400, detail="Either activity_id1/activity_id2 or polyline1/polyline2 must be provided.")
 
-        return compare_polylines(polyline1, polyline2, request.threshold_ratio)
+        # The first route is the reference (usually the challenge route), so its index is reused
+        index = route_index_store.get(reference)
+        return index.compare(polyline.decode(candidate), request.threshold_ratio, request.check_order)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Comparison error: {e}")
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Hit/miss counters for the reference route index store, Strava polyline cache and token refreshes"""
+    return {
+        "route_index": route_index_store.stats(),
+        "strava": strava_service.stats(),
+        "strava_tokens": token_store.stats(),
+    }
+
+def get_compare_pool():
+    """Lazily started process pool shared by batch comparisons"""
+    global _compare_pool
+    if _compare_pool is None:
+        _compare_pool = ProcessPoolExecutor(max_workers=COMPARE_WORKERS)
+    return _compare_pool
+
+async def score_candidates(index, polylines, threshold_ratio, check_order):
+    """Score encoded candidates against a RouteIndex, split across the process pool for large batches"""
+    if COMPARE_WORKERS <= 0 or len(polylines) < COMPARE_PARALLEL_MIN:
+        return await asyncio.to_thread(compare_encoded, index, polylines, threshold_ratio, check_order)
+
+    loop = asyncio.get_running_loop()
+    chunk_size = -(-len(polylines) // COMPARE_WORKERS)
+    chunks = [polylines[i:i + chunk_size] for i in range(0, len(polylines), chunk_size)]
+    scored = await asyncio.gather(*(
+        loop.run_in_executor(get_compare_pool(), compare_encoded, index, chunk, threshold_ratio, check_order)
+        for chunk in chunks
+    ))
+    return [result for chunk in scored for result in chunk]
+
+@router.post("/compare-batch", response_model=CompareBatchResponse)
+async def compare_map_batch(request: CompareBatchRequest, user_id: Optional[str] = Depends(caller_id)):
+    """Compare many runs (activity ids and/or polylines) against one reference route in a single call"""
+    try:
+        if request.reference_activity_id is None and request.reference_polyline is None:
+            raise HTTPException(status_code=400, detail="Either reference_activity_id or reference_polyline must be provided.")
+
+        # Reference and candidate activities are fetched in one concurrent round. A candidate Strava
+        # won't return fails on its own; without the reference nothing can be compared
+        fetch_ids = list(request.candidate_activity_ids)
+        if request.reference_activity_id is not None:
+            fetch_ids.insert(0, request.reference_activity_id)
+        fetched = await fetch_polylines(fetch_ids, user_id, return_errors=True) if fetch_ids else []
+        reference = fetched.pop(0) if request.reference_activity_id is not None else request.reference_polyline
+        if isinstance(reference, StravaError):
+            raise strava_http_error(reference)
+
+        activity_ids = [None] * len(request.candidate_polylines) + list(request.candidate_activity_ids)
+        candidates = list(request.candidate_polylines) + fetched
+        if not candidates:
+            raise HTTPException(status_code=400, detail="At least one candidate must be provided.")
+
+        readable = [i for i, candidate in enumerate(candidates) if not isinstance(candidate, StravaError)]
+        index = route_index_store.get(reference)
+        scored = await score_candidates(
+            index, [candidates[i] for i in readable], request.threshold_ratio, request.check_order
+        ) if readable else []
+        scores = dict(zip(readable, scored))
+
+        results = [
+            CompareBatchResult(index=i, activity_id=activity_id, **scores[i]) if i in scores else
+            CompareBatchResult(index=i, activity_id=activity_id, match=False, error=f"Strava API error: {candidates[i]}")
+            for i, activity_id in enumerate(activity_ids)
+        ]
+        return CompareBatchResponse(
+            total=len(results),
+            matched=sum(result.match for result in results),
+            results=results
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison error: {e}")
@@ -1,14 +1,20 @@
 # routers/nft.py
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import os
+import threading
 import requests
 from web3 import Web3
 from dotenv import load_dotenv
-from solcx import compile_standard, install_solc
 import json
-from services.walrus_service import WalrusService
+from services.nft_provider import NFTProvider, ProviderUnavailable
+from services.mint_jobs import MintJobs, check_webhook_url
+from services.token_index import TokenIndex
+from utils.nft_events import minted_token_ids
+from utils.nft_contract import OZ_ERC721_SOURCE, SOLIDITY_VERSION, contract_abi, contract_bytecode
 
 load_dotenv()
 
@@ -21,12 +27,13 @@ PRIVATE_KEY    = os.getenv("PRIVATE_KEY")
 CHAIN_ID       = int(os.getenv("CHAIN_ID", "11155111"))
 WALRUS_CONFIG_PATH = os.getenv("WALRUS_CONFIG_PATH", None)
 
-try:
-    walrus_service = WalrusService(WALRUS_CONFIG_PATH)
-    print("Walrus service initialized")
-except Exception as e:
-    print(f"Warning: Could not initialize Walrus service: {e}")
-    walrus_service = None
+# The Web3 client, signer state and Walrus are created on first use, so the rest of the API
+# starts (and keeps serving) without a reachable chain
+provider = NFTProvider(RPC_URL, PUBLIC_ADDRESS, PRIVATE_KEY, WALRUS_CONFIG_PATH)
+mint_jobs = MintJobs()
+# Ownership and token URIs indexed from contract logs; queries sync it first unless it was synced this recently
+token_index = TokenIndex()
+TOKEN_INDEX_MAX_AGE = float(os.getenv("TOKEN_INDEX_MAX_AGE", "15"))
 
 print(f"NFT Module Environment Status:")
 print(f"- RPC_URL: {'Set' if RPC_URL else 'NOT SET'}")
@@ -34,18 +41,26 @@ print(f"- PUBLIC_ADDRESS: {'Set' if PUBLIC_ADDRESS else 'NOT SET'}")
 print(f"- PRIVATE_KEY: {'Set' if PRIVATE_KEY else 'NOT SET'}")
 print(f"- CHAIN_ID: {CHAIN_ID}")
 print(f"- WALRUS_CONFIG_PATH: {WALRUS_CONFIG_PATH}")
-print(f"- WALRUS_SERVICE: {'Initialized' if walrus_service else 'NOT INITIALIZED'}")
 
-if not (RPC_URL and PUBLIC_ADDRESS and PRIVATE_KEY):
-    raise RuntimeError("RPC_URL, PUBLIC_ADDRESS, and PRIVATE_KEY must be set in environment")
+if provider.missing():
+    print(f"Warning: {', '.join(provider.missing())} not set; NFT endpoints will return 503")
 
-if not walrus_service:
-    raise RuntimeError("WALRUS_CONFIG_PATH must be set and valid for NFT operations")
+# Gas budget per mintBatch transaction, and assets rendered and uploaded at once for a batch
+MINT_BATCH_GAS_LIMIT = int(os.getenv("MINT_BATCH_GAS_LIMIT", "8000000"))
+MINT_BATCH_CONCURRENCY = int(os.getenv("MINT_BATCH_CONCURRENCY", "8"))
+# Seconds a transaction may stay unmined before it is replaced with higher fees, and replacements per transaction
+FEE_BUMP_AFTER = float(os.getenv("FEE_BUMP_AFTER", "60"))
+FEE_MAX_BUMPS = int(os.getenv("FEE_MAX_BUMPS", "3"))
+# Seconds a request waits for its transaction to be mined before answering with the pending transaction instead
+MINT_CONFIRM_TIMEOUT = float(os.getenv("MINT_CONFIRM_TIMEOUT", "30"))
 
-w3 = Web3(Web3.HTTPProvider(RPC_URL, request_kwargs={'timeout': 15}))
+class ConfirmationPending(Exception):
+    """A transaction was sent but not mined within MINT_CONFIRM_TIMEOUT; future still resolves like confirm()'s"""
 
-def next_nonce(address):
-    return w3.eth.get_transaction_count(Web3.to_checksum_address(address))
+    def __init__(self, tx_hash, future):
+        self.tx_hash = Web3.to_hex(tx_hash)
+        self.future = future
+        super().__init__(f"Transaction {self.tx_hash} not mined within {MINT_CONFIRM_TIMEOUT:g}s")
 
 def get_next_token_id(contract):
     try:
@@ -57,12 +72,14 @@ def get_next_token_id(contract):
 def validate_contract(contract_address):
     try:
         checksum_address = Web3.to_checksum_address(contract_address)
+        if provider.validated_contracts.get(checksum_address) is not None:
+            return True, "Contract validated"
         
-        code = w3.eth.get_code(checksum_address)
+        code = provider.w3().eth.get_code(checksum_address)
         if code == b'' or code == '0x':
             return False, "Contract does not exist at this address"
         
-        contract = w3.eth.contract(address=checksum_address, abi=ABI)
+        contract = provider.contract(checksum_address)
         
         try:
             name = contract.functions.name().call()
@@ -70,119 +87,50 @@ def validate_contract(contract_address):
             print(f"Contract validated: {name} ({symbol})")
         except Exception as e:
             print(f"Contract exists but could not verify ERC721 interface: {str(e)}")
+            name = symbol = None
         
+        # Code at an address doesn't change, so later mints skip these calls until the entry expires
+        provider.validated_contracts.put(checksum_address, (name, symbol))
         return True, "Contract validated"
+    except ProviderUnavailable:
+        raise
     except Exception as e:
         return False, f"Invalid contract: {str(e)}"
 
-if not w3.is_connected():
-    raise RuntimeError("Web3 connection failed; check RPC_URL")
-
-# Solidity contract
-SOLIDITY_VERSION = "0.8.20"
-install_solc(SOLIDITY_VERSION)
-
-OZ_ERC721_SOURCE = """
-// SPDX-License-Identifier: MIT
-pragma solidity ^0.8.20;
-
-contract GLBNFT {
-    string public name;
-    string public symbol;
-    address public owner;
-    uint256 private _nextTokenId;
-    
-    mapping(uint256 => address) private _owners;
-    mapping(address => uint256) private _balances;
-    mapping(uint256 => string) private _tokenURIs;
-    
-    event NFTMinted(address indexed recipient, uint256 indexed tokenId, string tokenURI);
-    event Transfer(address indexed from, address indexed to, uint256 indexed tokenId);
-    
-    modifier onlyOwner() {
-        require(msg.sender == owner, "Not owner");
-        _;
-    }
-    
-    constructor(string memory name_, string memory symbol_) {
-        name = name_;
-        symbol = symbol_;
-        owner = msg.sender;
-    }
-    
-    function mintNFT(address recipient, string memory tokenURI) public onlyOwner returns (uint256) {
-        uint256 tokenId = _nextTokenId++;
-        _mint(recipient, tokenId);
-        _setTokenURI(tokenId, tokenURI);
-        
-        emit NFTMinted(recipient, tokenId, tokenURI);
-        return tokenId;
-    }
-    
-    function _mint(address to, uint256 tokenId) internal {
-        require(to != address(0), "Invalid recipient");
-        require(_owners[tokenId] == address(0), "Token already exists");
-        
-        _balances[to]++;
-        _owners[tokenId] = to;
-        
-        emit Transfer(address(0), to, tokenId);
-    }
-    
-    function _setTokenURI(uint256 tokenId, string memory tokenURI) internal {
-        _tokenURIs[tokenId] = tokenURI;
-    }
-    
-    function ownerOf(uint256 tokenId) public view returns (address) {
-        address tokenOwner = _owners[tokenId];
-        require(tokenOwner != address(0), "Token does not exist");
-        return tokenOwner;
-    }
-    
-    function balanceOf(address account) public view returns (uint256) {
-        return _balances[account];
-    }
-    
-    function tokenURI(uint256 tokenId) public view returns (string memory) {
-        require(_owners[tokenId] != address(0), "Token does not exist");
-        return _tokenURIs[tokenId];
-    }
-    
-    function getCurrentTokenId() public view returns (uint256) {
-        return _nextTokenId;
-    }
+# Lazily created module attributes, so `from routes.nft import ABI` (or w3) keeps working
+# without compiling or connecting at import time
+LAZY_ATTRIBUTES = {
+    "ABI": contract_abi,
+    "BYTECODE": contract_bytecode,
+    "w3": lambda: provider.w3(),
+    "walrus_service": lambda: provider.walrus(),
+    "nonce_manager": lambda: provider.nonce_manager(),
+    "receipt_poller": lambda: provider.receipt_poller(),
 }
-"""
-
-def compile_contract():
-    compiled = compile_standard(
-        {
-            "language": "Solidity",
-            "sources": {"GLBNFT.sol": {"content": OZ_ERC721_SOURCE}},
-            "settings": {
-                "outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}
-            },
-        },
-        solc_version=SOLIDITY_VERSION
-    )
-    contract_interface = compiled["contracts"]["GLBNFT.sol"]["GLBNFT"]
-    return contract_interface["abi"], contract_interface["evm"]["bytecode"]["object"]
 
-ABI, BYTECODE = compile_contract()
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def require_provider(walrus=True):
+    """Connect to the chain (and Walrus), or fail the request with 503"""
+    try:
+        provider.w3()
+        if walrus:
+            provider.walrus()
+    except ProviderUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"NFT service unavailable: {e}")
 
 def deploy_contract(name="GLBNFT", symbol="GLB"):
     print(f"Deploying new NFT contract: {name} ({symbol})...")
     try:
-        network_id = w3.eth.chain_id
-        block_number = w3.eth.block_number
-        gas_price = w3.eth.gas_price
+        w3 = provider.w3()
         balance = w3.eth.get_balance(PUBLIC_ADDRESS)
-        print(f"Network ID: {network_id}, Current block: {block_number}")
-        print(f"Gas price: {w3.from_wei(gas_price, 'gwei')} gwei")
+        print(f"Network ID: {provider.chain_id()}")
         print(f"Wallet balance: {w3.from_wei(balance, 'ether')} ETH")
         
-        contract = w3.eth.contract(abi=ABI, bytecode=BYTECODE)
-        nonce = next_nonce(PUBLIC_ADDRESS)
+        contract = w3.eth.contract(abi=contract_abi(), bytecode=contract_bytecode())
         
         try:
             gas_estimate = contract.constructor(name, symbol).estimate_gas({"from": PUBLIC_ADDRESS})
@@ -194,10 +142,9 @@ def deploy_contract(name="GLBNFT", symbol="GLB"):
             
         tx = contract.constructor(name, symbol).build_transaction({
             "from": PUBLIC_ADDRESS,
-            "nonce": nonce,
             "chainId": CHAIN_ID,
             "gas": gas_limit,
-            "gasPrice": w3.to_wei(5, "gwei")
+            **provider.fee_oracle().fees()
         })
         
         print(f"Sending transaction with gas limit: {gas_limit}")
@@ -208,29 +155,136 @@ def deploy_contract(name="GLBNFT", symbol="GLB"):
             
         contract_address = receipt.contractAddress
         print(f"Contract deployed at: {contract_address}")
+        provider.validated_contracts.put(Web3.to_checksum_address(contract_address), (name, symbol))
         return contract_address
         
     except Exception as e:
         print(f"Deployment error: {str(e)}")
         raise
 
+def broadcast(tx):
+    w3 = provider.w3()
+    print(f"Transaction details:")
+    print(f"  From: {tx.get('from')}")
+    print(f"  To: {tx.get('to', 'Contract deployment')}")
+    print(f"  Gas: {tx.get('gas')}")
+    if "maxFeePerGas" in tx:
+        print(f"  Max Fee: {w3.from_wei(tx['maxFeePerGas'], 'gwei')} gwei "
+              f"(priority {w3.from_wei(tx['maxPriorityFeePerGas'], 'gwei')} gwei)")
+    else:
+        print(f"  Gas Price: {w3.from_wei(tx.get('gasPrice', 0), 'gwei')} gwei")
+    print(f"  Nonce: {tx.get('nonce')}")
+
+    signed = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
+
+    print("Sending transaction...")
+    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    print(f"Transaction sent: {tx_hash.hex()}")
+    return tx_hash
+
+def confirm(tx, tx_hash):
+    """
+    A future resolved with (tx, tx hash, receipt) for whichever version of the
+    transaction is mined. While it stays pending, it is replaced every
+    FEE_BUMP_AFTER seconds by a copy with the same nonce and higher fees, up to
+    FEE_MAX_BUMPS times. Fails once every version has timed out.
+    """
+    receipt_poller = provider.receipt_poller()
+    result = Future()
+    lock = threading.Lock()
+    state = {"tx": tx, "hashes": [], "bumps": 0, "timer": None, "done": False, "error": None}
+
+    def finish(outcome, error):
+        """Settle the result once (caller holds the lock; the result is set after it is released)"""
+        state["done"] = True
+        if state["timer"] is not None:
+            state["timer"].cancel()
+        # The other versions can never be mined now
+        for replaced in state["hashes"]:
+            receipt_poller.forget(replaced)
+        return lambda: result.set_result(outcome) if error is None else result.set_exception(error)
+
+    def watch(tx, tx_hash):
+        with lock:
+            state["hashes"].append(tx_hash)
+        receipt_poller.wait(tx_hash).add_done_callback(lambda future: settled(future, tx, tx_hash))
+
+    def settled(future, tx, tx_hash):
+        error = future.exception()
+        with lock:
+            state["hashes"].remove(tx_hash)
+            if state["done"]:
+                return
+            if error is not None:
+                # Another version, or a replacement still to come, may yet be mined
+                state["error"] = error
+                if state["hashes"] or state["timer"] is not None:
+                    return
+            settle = finish((tx, tx_hash, future.result() if error is None else None), error)
+        settle()
+
+    def schedule():
+        with lock:
+            if state["done"]:
+                return
+            if state["bumps"] < FEE_MAX_BUMPS:
+                state["timer"] = threading.Timer(FEE_BUMP_AFTER, bump)
+                state["timer"].daemon = True
+                state["timer"].start()
+                return
+            state["timer"] = None
+            if state["hashes"]:
+                return
+            settle = finish(None, state["error"])
+        settle()
+
+    def bump():
+        with lock:
+            if state["done"]:
+                return
+            state["bumps"] += 1
+            stuck = state["tx"]
+        replacement = provider.fee_oracle().bump(stuck)
+        print(f"Transaction with nonce {stuck['nonce']} pending for {FEE_BUMP_AFTER:g}s, replacing it with higher fees")
+        try:
+            replacement_hash = broadcast(replacement)
+        except Exception as e:
+            # Usually a version was mined in the meantime; its receipt is on the way
+            print(f"Replacement for nonce {stuck['nonce']} not sent: {e}")
+        else:
+            provider.nonce_manager().sent(replacement["nonce"], Web3.to_hex(replacement_hash))
+            with lock:
+                state["tx"] = replacement
+            watch(replacement, replacement_hash)
+        schedule()
+
+    watch(tx, tx_hash)
+    schedule()
+    return result
+
+def release_nonce(nonce, future):
+    """Hand a settled confirm() future's nonce back: confirmed if it was mined, abandoned (free for reuse) if not"""
+    if future.exception() is not None:
+        provider.nonce_manager().abandoned(nonce)
+    else:
+        provider.nonce_manager().confirmed(nonce)
+
 def sign_send_wait(tx):
+    """
+    Sign, send and wait up to MINT_CONFIRM_TIMEOUT for the transaction, returning (tx hash, receipt).
+    Raises ConfirmationPending when it is still unmined; confirmation carries on in the background.
+    """
     try:
-        print(f"Transaction details:")
-        print(f"  From: {tx.get('from')}")
-        print(f"  To: {tx.get('to', 'Contract deployment')}")
-        print(f"  Gas: {tx.get('gas')}")
-        print(f"  Gas Price: {w3.from_wei(tx.get('gasPrice', 0), 'gwei')} gwei")
-        print(f"  Nonce: {tx.get('nonce')}")
-        
-        signed = w3.eth.account.sign_transaction(tx, private_key=PRIVATE_KEY)
-        
-        print("Sending transaction...")
-        tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        print(f"Transaction sent: {tx_hash.hex()}")
+        tx, tx_hash = provider.nonce_manager().send(tx, broadcast)
         
         print("Waiting for transaction confirmation...")
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30)
+        pending = confirm(tx, tx_hash)
+        # The nonce is released whenever the transaction settles, even after this request gives up on it
+        pending.add_done_callback(lambda future, nonce=tx["nonce"]: release_nonce(nonce, future))
+        # wait() rather than result(timeout=...): a transaction that failed with a TimeoutError isn't pending
+        if not wait([pending], timeout=MINT_CONFIRM_TIMEOUT).done:
+            raise ConfirmationPending(tx_hash, pending)
+        tx, tx_hash, receipt = pending.result()
         print(f"Transaction confirmed in block {receipt.blockNumber}")
         print(f"Gas used: {receipt.gasUsed} ({receipt.gasUsed / tx.get('gas', 1) * 100:.1f}% of limit)")
         
@@ -245,7 +299,7 @@ def sign_send_wait(tx):
 
 def upload_file_to_walrus(file_bytes, filename="file.glb"):
     try:
-        blob_id = walrus_service.store_bytes(file_bytes, filename)
+        blob_id = provider.walrus().store_bytes(file_bytes, filename)
         return blob_id
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Walrus file upload failed: {str(e)}")
@@ -275,7 +329,7 @@ def upload_metadata_to_walrus(name, description, file_uri, challenge_id="", imag
         })
 
     try:
-        blob_id = walrus_service.store_json(metadata)
+        blob_id = provider.walrus().store_json(metadata)
         return blob_id
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Walrus metadata upload failed: {str(e)}")
@@ -291,10 +345,30 @@ class MintFloatingLineRequest(BaseModel):
     contract_address: str = "0x02f07A7DDAb530B5BF1FE4D26a297ea1CE7e85fA"
     name: str = "Floating Line NFT"
     description: str = "A 3D floating line NFT"
+    quantize: bool = False  # store the GLB with 16-bit quantized positions
+    challenge_id: Optional[str] = None
+
+class BatchMint(BaseModel):
+    polyline: str
+    recipient: str
+    name: Optional[str] = None         # defaults to the batch name
+    description: Optional[str] = None  # defaults to the batch description
+
+class MintBatchRequest(BaseModel):
+    mints: List[BatchMint]
+    contract_address: str = "0x02f07A7DDAb530B5BF1FE4D26a297ea1CE7e85fA"
+    name: str = "Floating Line NFT"
+    description: str = "A 3D floating line NFT"
+    quantize: bool = False
+    challenge_id: Optional[str] = None
+
+class MintJobRequest(MintFloatingLineRequest):
+    webhook_url: Optional[str] = None  # receives the job as JSON on every status change
 
 # Endpoints
 @router.post("/deploy-contract")
 def deploy_nft_contract(req: DeployContractRequest):
+    require_provider()
     try:
         contract_address = deploy_contract(req.name, req.symbol)
         return {
@@ -309,76 +383,370 @@ def deploy_nft_contract(req: DeployContractRequest):
         print(f"Error details: {error_trace}")
         raise HTTPException(status_code=500, detail=f"Contract deployment failed: {str(e)}")
 
+def render_and_upload(req, progress=lambda status: None):
+    """Render the GLB and upload it and its metadata to Walrus, returning (file_uri, token_uri)"""
+    progress("rendering")
+    DIMENSION_API = os.getenv("DIMENSION_API_URL", "http://localhost:8001/dimension/floating-line-model")
+    resp = requests.post(DIMENSION_API, json={"polyline": req.polyline, "quantize": req.quantize})
+    if resp.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Dimension service failed: {resp.text}")
+    glb_bytes = resp.content
+
+    progress("uploading")
+    file_uri = upload_file_to_walrus(glb_bytes, filename="floating_line.glb")
+    token_uri = upload_metadata_to_walrus(req.name, req.description, file_uri, req.challenge_id)
+    return file_uri, token_uri
+
+def resolve_contract(contract_address):
+    """Validate the requested contract, or deploy a new one when none is given"""
+    if not contract_address:
+        print("No contract address provided, deploying a new contract...")
+        contract_address = deploy_contract("RaceFi NFT", "RACE")
+        print(f"New contract deployed at: {contract_address}")
+    else:
+        print(f"Validating contract at {contract_address}...")
+        valid, message = validate_contract(contract_address)
+        if not valid:
+            raise HTTPException(status_code=400, detail=f"Contract validation failed: {message}")
+    return contract_address
+
+def build_mint_tx(contract_address, recipient, token_uri):
+    """Build the mintNFT transaction (without a nonce); the token id comes from its receipt"""
+    print(f"Minting NFT to {recipient}...")
+    contract = provider.contract(contract_address)
+
+    try:
+        gas_estimate = provider.uri_gas(contract_address, "mintNFT", token_uri, lambda: contract.functions.mintNFT(
+            Web3.to_checksum_address(recipient),
+            token_uri
+        ).estimate_gas({"from": PUBLIC_ADDRESS}))
+        gas_limit = int(gas_estimate * 1.2)
+        print(f"Estimated gas for minting: {gas_estimate}, using {gas_limit}")
+    except Exception as e:
+        print(f"Gas estimation failed: {str(e)}")
+        gas_limit = 300_000
+
+    tx = contract.functions.mintNFT(Web3.to_checksum_address(recipient), token_uri).build_transaction({
+        "from": PUBLIC_ADDRESS,
+        "chainId": CHAIN_ID,
+        "gas": gas_limit,
+        **provider.fee_oracle().fees()
+    })
+
+    return tx
+
+def mint_result(req, contract_address, tx_hash, receipt, token_uri, file_uri):
+    """Response body for a confirmed mint, with the token id decoded from the receipt logs"""
+    token_ids = minted_token_ids(receipt, contract_address)
+    token_id = token_ids[0] if token_ids else None
+    print(f"Successfully minted NFT with token ID: {token_id}")
+    return {
+        "message": f"NFT minted to {req.recipient}",
+        "contract_address": contract_address,
+        "token_id": token_id,
+        "tx_hash": tx_hash,
+        "block_number": receipt.blockNumber,
+        "token_uri": token_uri,
+        "file_uri": file_uri,
+        "challenge_id": req.challenge_id if req.challenge_id else None,
+        "view_on_explorer": f"https://sepolia.etherscan.io/token/{contract_address}?a={req.recipient}"
+    }
+
+def mint_error_detail(e):
+    """User-facing description of a failed mint"""
+    if isinstance(e, HTTPException):
+        return e.detail
+    if isinstance(e, ProviderUnavailable):
+        return f"NFT service unavailable: {e}"
+    if isinstance(e, ConfirmationPending):
+        return f"{e}; it may still be mined, check it on a block explorer before retrying"
+    error_details = str(e)
+    if "insufficient funds" in error_details.lower():
+        return f"Insufficient funds in wallet {PUBLIC_ADDRESS} to complete transaction"
+    elif "nonce too low" in error_details.lower():
+        return f"Nonce error: {error_details}. Try again in a few minutes."
+    elif "could not establish connection" in error_details.lower() or "connection failed" in error_details.lower():
+        return f"Blockchain connection error: Check your RPC_URL environment variable"
+    elif "private key" in error_details.lower():
+        return f"Private key error: Check your PRIVATE_KEY environment variable"
+    else:
+        return f"Unexpected error: {str(e)}"
+
 @router.post("/mint-floating-line")
 def mint_floating_line(req: MintFloatingLineRequest):
+    require_provider()
+    contract_address = None
     try:
-        DIMENSION_API = os.getenv("DIMENSION_API_URL", "http://localhost:8001/dimension/floating-line-model")
-        resp = requests.post(DIMENSION_API, json={"polyline": req.polyline})
-        if resp.status_code != 200:
-            raise HTTPException(status_code=500, detail=f"Dimension service failed: {resp.text}")
-        glb_bytes = resp.content
-
-        file_uri = upload_file_to_walrus(glb_bytes, filename="floating_line.glb")
-        token_uri = upload_metadata_to_walrus(req.name, req.description, file_uri, req.challenge_id)
-
-        contract_address = req.contract_address
-        if not contract_address:
-            print("No contract address provided, deploying a new contract...")
-            contract_address = deploy_contract("RaceFi NFT", "RACE")
-            print(f"New contract deployed at: {contract_address}")
-        else:
-            print(f"Validating contract at {contract_address}...")
-            valid, message = validate_contract(contract_address)
-            if not valid:
-                raise HTTPException(status_code=400, detail=f"Contract validation failed: {message}")
-            
-        print(f"Minting NFT to {req.recipient}...")
-        contract = w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=ABI)
-        nonce = next_nonce(PUBLIC_ADDRESS)
-        
+        file_uri, token_uri = render_and_upload(req)
+        contract_address = resolve_contract(req.contract_address)
+        tx = build_mint_tx(contract_address, req.recipient, token_uri)
+
         try:
-            gas_estimate = contract.functions.mintNFT(
-                Web3.to_checksum_address(req.recipient), 
-                token_uri
-            ).estimate_gas({"from": PUBLIC_ADDRESS})
-            gas_limit = int(gas_estimate * 1.2)
-            print(f"Estimated gas for minting: {gas_estimate}, using {gas_limit}")
+            tx_hash, receipt = sign_send_wait(tx)
+        except ConfirmationPending as e:
+            return pending_mint(req, contract_address, e, token_uri, file_uri)
+
+        return mint_result(req, contract_address, tx_hash, receipt, token_uri, file_uri)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Error details: {error_trace}")
+        if contract_address:
+            provider.forget_contract(contract_address)
+        raise HTTPException(status_code=500, detail=mint_error_detail(e))
+
+def pending_mint(req, contract_address, pending, token_uri, file_uri):
+    """
+    202 response for a mint still unmined after MINT_CONFIRM_TIMEOUT. A mint job
+    follows the pending transaction, so the caller polls its status_url (as with
+    POST /mint-jobs) instead of retrying and minting twice.
+    """
+    def follow(job_id):
+        mint_jobs.update(job_id, status="confirming", tx_hash=pending.tx_hash)
+        pending.future.add_done_callback(
+            lambda future: settle_mint_job(job_id, req, contract_address, token_uri, file_uri, future)
+        )
+
+    job = mint_jobs.submit(follow)
+    print(f"Mint {pending.tx_hash} still pending, followed by mint job {job['job_id']}")
+    return JSONResponse(status_code=202, content={
+        "message": f"{pending}; follow it at the status_url",
+        "job_id": job["job_id"],
+        "status": "confirming",
+        "status_url": f"/nft/mint-jobs/{job['job_id']}",
+        "tx_hash": pending.tx_hash,
+        "contract_address": contract_address,
+        "token_uri": token_uri,
+        "file_uri": file_uri
+    })
+
+def settle_mint_job(job_id, req, contract_address, token_uri, file_uri, future):
+    """Record a mint job's outcome once its confirm() future settles"""
+    try:
+        _, mined_hash, receipt = future.result()
+        tx_hash = Web3.to_hex(mined_hash)
+        if receipt.status == 0:
+            provider.forget_contract(contract_address)
+            raise Exception("Transaction failed - reverted on blockchain. Check contract code or parameters.")
+        result = mint_result(req, contract_address, tx_hash, receipt, token_uri, file_uri)
+        mint_jobs.update(job_id, status="minted", tx_hash=tx_hash, result=result)
+    except Exception as e:
+        mint_jobs.update(job_id, status="failed", error=mint_error_detail(e))
+
+def run_mint_job(job_id, req):
+    """Render, upload and send a mint on a job worker; confirmation is left to the receipt poller"""
+    try:
+        file_uri, token_uri = render_and_upload(req, lambda status: mint_jobs.update(job_id, status=status))
+        contract_address = resolve_contract(req.contract_address)
+        mint_jobs.update(job_id, status="sending")
+        tx = build_mint_tx(contract_address, req.recipient, token_uri)
+        tx, sent_hash = provider.nonce_manager().send(tx, broadcast)
+        mint_jobs.update(job_id, status="confirming", tx_hash=Web3.to_hex(sent_hash))
+    except Exception as e:
+        mint_jobs.update(job_id, status="failed", error=mint_error_detail(e))
+        return
+
+    pending = confirm(tx, sent_hash)
+    pending.add_done_callback(lambda future: release_nonce(tx["nonce"], future))
+    pending.add_done_callback(
+        lambda future: settle_mint_job(job_id, req, contract_address, token_uri, file_uri, future)
+    )
+
+@router.post("/mint-jobs", status_code=202)
+def create_mint_job(req: MintJobRequest):
+    """Queue a floating line mint and return its job id right away"""
+    if req.webhook_url:
+        try:
+            check_webhook_url(req.webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    require_provider()
+    job = mint_jobs.submit(lambda job_id: run_mint_job(job_id, req), req.webhook_url)
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/nft/mint-jobs/{job['job_id']}"
+    }
+
+@router.get("/mint-jobs/{job_id}")
+def get_mint_job(job_id: str):
+    """Status of a mint job; the result holds the mint response once it is minted"""
+    job = mint_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Mint job not found (unknown, or finished and expired)")
+    return job
+
+def batch_gas(contract, recipients, token_uris):
+    """
+    Estimate mintBatch gas as base + per_token * n from batches of one and two tokens.
+    Raises if the contract has no mintBatch (deployed before it was added).
+    """
+    one = contract.functions.mintBatch(recipients[:1], token_uris[:1]).estimate_gas({"from": PUBLIC_ADDRESS})
+    if len(recipients) < 2:
+        return one, 0
+    two = contract.functions.mintBatch(recipients[:2], token_uris[:2]).estimate_gas({"from": PUBLIC_ADDRESS})
+    per_token = max(two - one, 1)
+    return max(one - per_token, 0), per_token
+
+def send_mints(tx_builders):
+    """
+    Send (indices, build) pairs back to back through the nonce manager.
+    Returns (indices, tx, tx hash, error) for each; a failed send doesn't stop the rest.
+    """
+    sent = []
+    for indices, build in tx_builders:
+        try:
+            tx, tx_hash = provider.nonce_manager().send(build(), broadcast)
+            sent.append((indices, tx, tx_hash, None))
         except Exception as e:
-            print(f"Gas estimation failed: {str(e)}")
-            gas_limit = 300_000
-            
-        tx = contract.functions.mintNFT(Web3.to_checksum_address(req.recipient), token_uri).build_transaction({
+            print(f"Mint transaction for {len(indices)} tokens failed: {e}")
+            sent.append((indices, None, None, mint_error_detail(e)))
+    return sent
+
+def send_mint_batches(contract, recipients, token_uris, base, per_token):
+    """Mint with mintBatch in chunks that keep each transaction (plus 20% headroom) within MINT_BATCH_GAS_LIMIT"""
+    chunk_size = max(1, int((MINT_BATCH_GAS_LIMIT / 1.2 - base) // per_token)) if per_token else len(recipients)
+    print(f"mintBatch gas: {base} + {per_token} per token, {chunk_size} tokens per transaction")
+
+    def builder(indices):
+        return lambda: contract.functions.mintBatch(
+            [recipients[i] for i in indices], [token_uris[i] for i in indices]
+        ).build_transaction({
             "from": PUBLIC_ADDRESS,
-            "nonce": nonce,
             "chainId": CHAIN_ID,
-            "gas": gas_limit,
-            "gasPrice": w3.to_wei(5, "gwei")
+            "gas": int((base + per_token * len(indices)) * 1.2),
+            **provider.fee_oracle().fees()
         })
-        
+
+    chunks = [list(range(start, min(start + chunk_size, len(recipients))))
+              for start in range(0, len(recipients), chunk_size)]
+    return send_mints([(indices, builder(indices)) for indices in chunks])
+
+def send_individual_mints(contract_address, recipients, token_uris):
+    """Fallback for contracts without mintBatch: one mintNFT per token"""
+    def builder(i):
+        return lambda: build_mint_tx(contract_address, recipients[i], token_uris[i])
+    return send_mints([([i], builder(i)) for i in range(len(recipients))])
+
+@router.post("/mint-batch")
+def mint_batch(req: MintBatchRequest):
+    """
+    Mint one floating line NFT per entry (e.g. every finisher of a challenge).
+    Assets are rendered and uploaded concurrently, then minted with mintBatch in
+    gas-limited chunks, or one mintNFT each on contracts without mintBatch.
+    """
+    if not req.mints:
+        raise HTTPException(status_code=400, detail="At least one mint must be provided.")
+    require_provider()
+    try:
+        items = [
+            MintFloatingLineRequest(
+                polyline=mint.polyline,
+                recipient=mint.recipient,
+                contract_address=req.contract_address,
+                name=mint.name or req.name,
+                description=mint.description or req.description,
+                quantize=req.quantize,
+                challenge_id=req.challenge_id
+            )
+            for mint in req.mints
+        ]
+
+        def prepare(item):
+            try:
+                return render_and_upload(item), None
+            except Exception as e:
+                return None, mint_error_detail(e)
+
+        with ThreadPoolExecutor(max_workers=MINT_BATCH_CONCURRENCY) as pool:
+            prepared = list(pool.map(prepare, items))
+
+        results = [
+            {"recipient": item.recipient, "token_id": None, "tx_hash": None,
+             "file_uri": uris[0] if uris else None, "token_uri": uris[1] if uris else None, "error": error}
+            for item, (uris, error) in zip(items, prepared)
+        ]
+        ready = [i for i, result in enumerate(results) if result["error"] is None]
+        if not ready:
+            raise HTTPException(status_code=500, detail=f"Every asset failed to render or upload: {results[0]['error']}")
+
+        contract_address = resolve_contract(req.contract_address)
+        contract = provider.contract(contract_address)
+        recipients = [Web3.to_checksum_address(results[i]["recipient"]) for i in ready]
+        token_uris = [results[i]["token_uri"] for i in ready]
+
         try:
-            current_token_id = get_next_token_id(contract)
-            print(f"Current token ID before minting: {current_token_id}")
+            gas = batch_gas(contract, recipients, token_uris)
         except Exception as e:
-            print(f"Could not get current token ID: {str(e)}")
-            current_token_id = 0
-        
-        tx_hash, receipt = sign_send_wait(tx)
-        
-        token_id = current_token_id
-        
-        print(f"Successfully minted NFT with token ID: {token_id}")
-        
-        return {
-            "message": f"NFT minted to {req.recipient}",
+            print(f"mintBatch unavailable ({e}), minting tokens individually")
+            gas = None
+        if gas:
+            sent = send_mint_batches(contract, recipients, token_uris, *gas)
+            mode = "batch"
+        else:
+            sent = send_individual_mints(contract_address, recipients, token_uris)
+            mode = "individual"
+
+        waits = []
+        for indices, tx, tx_hash, error in sent:
+            future = None
+            if tx_hash:
+                future = confirm(tx, tx_hash)
+                # Nonces are released whenever the transactions settle, even after this request returns
+                future.add_done_callback(lambda future, nonce=tx["nonce"]: release_nonce(nonce, future))
+            waits.append((indices, tx_hash, error, future))
+        # One MINT_CONFIRM_TIMEOUT for the whole batch, the same bound a single mint waits
+        wait([future for *_, future in waits if future is not None], timeout=MINT_CONFIRM_TIMEOUT)
+
+        transactions, pending = [], []
+        for indices, tx_hash, error, future in waits:
+            tx_hash = Web3.to_hex(tx_hash) if tx_hash else None
+            receipt, token_ids = None, []
+            is_pending = future is not None and not future.done()
+            if is_pending:
+                pending.append(tx_hash)
+            elif future is not None:
+                try:
+                    _, mined_hash, receipt = future.result()
+                    tx_hash = Web3.to_hex(mined_hash)
+                    if receipt.status == 0:
+                        raise Exception("Transaction reverted on blockchain")
+                    token_ids = minted_token_ids(receipt, contract_address)
+                except Exception as e:
+                    error = mint_error_detail(e)
+            for position, i in enumerate(indices):
+                result = results[ready[i]]
+                result["tx_hash"] = tx_hash
+                result["token_id"] = token_ids[position] if position < len(token_ids) else None
+                result["error"] = error
+            transactions.append({
+                "tx_hash": tx_hash,
+                "token_count": len(indices),
+                "pending": is_pending,
+                "block_number": receipt.blockNumber if receipt else None,
+                "gas_used": receipt.gasUsed if receipt else None,
+                "error": error
+            })
+
+        message = f"Minted {sum(result['token_id'] is not None for result in results)} of {len(results)} NFTs"
+        body = {
+            "message": message,
             "contract_address": contract_address,
-            "token_id": token_id,
-            "tx_hash": tx_hash,
-            "block_number": receipt.blockNumber,
-            "token_uri": token_uri,
-            "file_uri": file_uri,
-            "challenge_id": req.challenge_id if req.challenge_id else None,
-            "view_on_explorer": f"https://sepolia.etherscan.io/token/{contract_address}?a={req.recipient}"
+            "mode": mode,
+            "challenge_id": req.challenge_id,
+            "pending_tx_hashes": pending,
+            "transactions": transactions,
+            "results": results
         }
+        if pending:
+            # Like a pending single mint: 202 so the caller looks the tokens up instead of minting them again
+            body["message"] = (f"{message}; {len(pending)} transactions not mined within {MINT_CONFIRM_TIMEOUT:g}s, "
+                               f"their tokens appear in /nft/index/{contract_address}/tokens once mined")
+            return JSONResponse(status_code=202, content=body)
+        return body
 
     except HTTPException:
         raise
@@ -386,27 +754,103 @@ def mint_floating_line(req: MintFloatingLineRequest):
         import traceback
         error_trace = traceback.format_exc()
         print(f"Error details: {error_trace}")
-        
-        error_details = str(e)
-        if "insufficient funds" in error_details.lower():
-            raise HTTPException(status_code=500, detail=f"Insufficient funds in wallet {PUBLIC_ADDRESS} to complete transaction")
-        elif "nonce too low" in error_details.lower():
-            raise HTTPException(status_code=500, detail=f"Nonce error: {error_details}. Try again in a few minutes.")
-        elif "could not establish connection" in error_details.lower() or "connection failed" in error_details.lower():
-            raise HTTPException(status_code=500, detail=f"Blockchain connection error: Check your RPC_URL environment variable")
-        elif "private key" in error_details.lower():
-            raise HTTPException(status_code=500, detail=f"Private key error: Check your PRIVATE_KEY environment variable")
-        else:
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+        raise HTTPException(status_code=500, detail=mint_error_detail(e))
+
+@router.get("/nonce-status")
+def nonce_status():
+    """Next nonce and in-flight transactions for PUBLIC_ADDRESS, receipt polling, fee sampling and mint job counters"""
+    require_provider()
+    return {
+        "nonces": provider.nonce_manager().stats(),
+        "receipts": provider.receipt_poller().stats(),
+        "fees": provider.fee_oracle().stats(),
+        "mint_jobs": mint_jobs.stats(),
+    }
+
+def checksum_or_400(address, field="contract_address"):
+    try:
+        return Web3.to_checksum_address(address)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: {address}")
+
+def sync_token_index(contract_address):
+    """
+    Bring the token index up to date before a query. If the chain can't be
+    reached, contracts that were indexed before are served from the index as is.
+    """
+    try:
+        require_provider(walrus=False)
+        return token_index.sync(provider.w3(), contract_address, max_age=TOKEN_INDEX_MAX_AGE)
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else mint_error_detail(e)
+        state = token_index.state(contract_address)
+        if state is None or not state["synced_at"]:
+            raise HTTPException(status_code=503, detail=f"Token index unavailable: {detail}")
+        print(f"Token index sync failed for {contract_address}, serving indexed data: {detail}")
+        return {"contract": contract_address, "error": detail}
+
+@router.post("/index/{contract_address}/sync")
+def sync_index(contract_address: str):
+    """Index new Transfer/NFTMinted logs of a contract (up to TOKEN_INDEX_MAX_BLOCKS blocks per call)"""
+    contract_address = checksum_or_400(contract_address)
+    require_provider(walrus=False)
+    try:
+        return token_index.sync(provider.w3(), contract_address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Token index sync failed for {contract_address}: {e}")
+        raise HTTPException(status_code=500, detail=f"Token index sync failed: {mint_error_detail(e)}")
+
+@router.get("/index/{contract_address}/owners/{owner_address}")
+def indexed_owner_tokens(contract_address: str, owner_address: str):
+    """Tokens held by an address, from the log index"""
+    contract_address = checksum_or_400(contract_address)
+    owner_address = checksum_or_400(owner_address, "owner_address")
+    sync = sync_token_index(contract_address)
+    tokens = token_index.owner_tokens(contract_address, owner_address)
+    return {
+        "owner": owner_address,
+        "owned_tokens": tokens,
+        "total_owned": len(tokens),
+        "index": sync
+    }
+
+@router.get("/index/{contract_address}/tokens")
+def indexed_tokens(contract_address: str, offset: int = 0, limit: int = 100):
+    """A page of the collection with owners and token URIs, from the log index"""
+    contract_address = checksum_or_400(contract_address)
+    if offset < 0 or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 1000")
+    sync = sync_token_index(contract_address)
+    return {
+        "contract_address": contract_address,
+        "total_tokens": token_index.stats(contract_address)["contracts"].get(contract_address, {}).get("tokens", 0),
+        "offset": offset,
+        "tokens": token_index.tokens(contract_address, offset, limit),
+        "index": sync
+    }
+
+@router.get("/index/{contract_address}/tokens/{token_id}")
+def indexed_token(contract_address: str, token_id: int):
+    """One token's owner, URI and transfer history, from the log index"""
+    contract_address = checksum_or_400(contract_address)
+    sync = sync_token_index(contract_address)
+    token = token_index.token(contract_address, token_id)
+    if token is None:
+        raise HTTPException(status_code=404, detail=f"Token {token_id} not found in the index")
+    return dict(token, index=sync)
 
 @router.get("/blob/{blob_id}")
 def get_blob_info(blob_id: str):
     try:
         print(f"Blob info request for: {blob_id}")
         
-        if not walrus_service:
+        try:
+            walrus_service = provider.walrus()
+        except ProviderUnavailable as e:
             print("Walrus service not available")
-            raise HTTPException(status_code=500, detail="Walrus service not available")
+            raise HTTPException(status_code=503, detail=f"Walrus service not available: {e}")
         
         try:
             blob_info = walrus_service.get_blob_info(blob_id)
@@ -485,9 +929,11 @@ def download_blob(blob_id: str):
     try:
         print(f"Download request for blob: {blob_id}")
         
-        if not walrus_service:
+        try:
+            walrus_service = provider.walrus()
+        except ProviderUnavailable as e:
             print("Walrus service not available")
-            raise HTTPException(status_code=500, detail="Walrus service not available")
+            raise HTTPException(status_code=503, detail=f"Walrus service not available: {e}")
         
         try:
             blob_info = walrus_service.get_blob_info(blob_id)
@@ -575,10 +1021,12 @@ def debug_walrus_service():
     try:
         print("Debug Walrus service request")
         
-        if not walrus_service:
+        try:
+            walrus_service = provider.walrus()
+        except ProviderUnavailable as e:
             return {
                 "status": "error",
-                "message": "Walrus service not available",
+                "message": f"Walrus service not available: {e}",
                 "config_path": WALRUS_CONFIG_PATH,
                 "walrus_service": None
             }
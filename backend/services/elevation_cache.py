@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+Cell = Tuple[int, int]
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+class ElevationCache:
+    """Persistent elevation cache on a quantized lat/lng grid, stored in SQLite"""
+
+    def __init__(self, db_path: str = None, grid_deg: float = None):
+        """
+        Initialize the cache
+
+        Args:
+            db_path: SQLite file path, or ":memory:" (defaults to ELEVATION_CACHE_PATH or a file in the temp dir)
+            grid_deg: Grid spacing in degrees that coordinates are snapped to (defaults to ELEVATION_GRID_DEG or 1e-4, ~11 m)
+        """
+        self.db_path = db_path or os.getenv(
+            "ELEVATION_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "racefi_elevation.sqlite3")
+        )
+        self.grid_deg = grid_deg or float(os.getenv("ELEVATION_GRID_DEG", "0.0001"))
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS elevations ("
+            "grid REAL NOT NULL, lat INTEGER NOT NULL, lng INTEGER NOT NULL, elevation REAL NOT NULL, "
+            "PRIMARY KEY (grid, lat, lng))"
+        )
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, coords: Iterable[Tuple[float, float]]) -> List[Cell]:
+        """Snap (lat, lng) pairs to grid cells"""
+        return [(round(lat / self.grid_deg), round(lng / self.grid_deg)) for lat, lng in coords]
+
+    def cell_centers(self, cells: Iterable[Cell]) -> List[Tuple[float, float]]:
+        """(lat, lng) of each cell's grid point, which is what gets looked up upstream"""
+        return [(round(lat * self.grid_deg, 7), round(lng * self.grid_deg, 7)) for lat, lng in cells]
+
+    def lookup(self, cells: Iterable[Cell]) -> Dict[Cell, float]:
+        """
+        Fetch cached elevations
+
+        Args:
+            cells: Grid cells to look up
+
+        Returns:
+            Mapping of the cells that are cached to their elevation
+        """
+        cells = list(dict.fromkeys(cells))
+        found = {}
+        with self._lock:
+            for i in range(0, len(cells), _LOOKUP_CHUNK):
+                chunk = cells[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("(?,?)" for _ in chunk)
+                params = [self.grid_deg] + [value for cell in chunk for value in cell]
+                rows = self._conn.execute(
+                    f"SELECT lat, lng, elevation FROM elevations WHERE grid = ? AND (lat, lng) IN (VALUES {placeholders})",
+                    params
+                ).fetchall()
+                found.update({(lat, lng): elevation for lat, lng, elevation in rows})
+            self.hits += len(found)
+            self.misses += len(cells) - len(found)
+        return found
+
+    def store(self, elevations: Dict[Cell, float]):
+        """
+        Save elevations for grid cells
+
+        Args:
+            elevations: Mapping of grid cell to elevation in meters
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO elevations (grid, lat, lng, elevation) VALUES (?, ?, ?, ?)",
+                [(self.grid_deg, lat, lng, float(elevation)) for (lat, lng), elevation in elevations.items()]
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Cell hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "grid_deg": self.grid_deg,
+            }
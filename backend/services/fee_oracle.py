@@ -0,0 +1,140 @@
+import os
+import math
+import time
+import threading
+from typing import Dict, Optional
+
+from web3 import Web3
+
+class FeeOracle:
+    """
+    Transaction fees from recent blocks. Samples eth_feeHistory and prices
+    type-2 (EIP-1559) transactions from the next block's base fee plus a
+    percentile of recent priority fees; chains without a base fee get legacy
+    gasPrice transactions. A sample is reused until a new block can have
+    arrived (refresh_interval), so a burst of mints shares one eth_feeHistory call.
+    """
+
+    def __init__(self, w3: Web3, percentile: float = None, history_blocks: int = None,
+                 base_fee_multiplier: float = None, min_priority_gwei: float = None,
+                 max_fee_gwei: float = None, bump_percent: float = None, refresh_interval: float = None):
+        """
+        Initialize the oracle
+
+        Args:
+            w3: Connected Web3 instance
+            percentile: Priority fee percentile of recent transactions to pay (defaults to FEE_PRIORITY_PERCENTILE or 50)
+            history_blocks: Blocks sampled per eth_feeHistory call (defaults to FEE_HISTORY_BLOCKS or 10)
+            base_fee_multiplier: Headroom over the next base fee in maxFeePerGas, 2 survives six full blocks (defaults to FEE_BASE_MULTIPLIER or 2)
+            min_priority_gwei: Lowest priority fee offered (defaults to FEE_MIN_PRIORITY_GWEI or 0.01)
+            max_fee_gwei: Cap on maxFeePerGas/gasPrice; None for no cap (defaults to FEE_MAX_GWEI)
+            bump_percent: Fee increase of a same-nonce replacement, nodes require at least 10 (defaults to FEE_BUMP_PERCENT or 12.5)
+            refresh_interval: Seconds a sample is reused, about one block (defaults to FEE_REFRESH_INTERVAL or 12)
+        """
+        self.w3 = w3
+        self.percentile = percentile if percentile is not None else float(os.getenv("FEE_PRIORITY_PERCENTILE", "50"))
+        self.history_blocks = history_blocks or int(os.getenv("FEE_HISTORY_BLOCKS", "10"))
+        self.base_fee_multiplier = base_fee_multiplier or float(os.getenv("FEE_BASE_MULTIPLIER", "2"))
+        self.min_priority = Web3.to_wei(
+            min_priority_gwei if min_priority_gwei is not None else float(os.getenv("FEE_MIN_PRIORITY_GWEI", "0.01")),
+            "gwei"
+        )
+        max_fee_gwei = max_fee_gwei if max_fee_gwei is not None else os.getenv("FEE_MAX_GWEI")
+        self.max_fee = Web3.to_wei(float(max_fee_gwei), "gwei") if max_fee_gwei else None
+        self.bump_percent = bump_percent or float(os.getenv("FEE_BUMP_PERCENT", "12.5"))
+        self.refresh_interval = refresh_interval or float(os.getenv("FEE_REFRESH_INTERVAL", "12"))
+
+        self._lock = threading.Lock()
+        self._sample: Optional[Dict] = None
+        self._sampled_at = 0.0
+
+        self.samples = 0
+        self.bumps = 0
+
+    def _cap(self, fee: int) -> int:
+        return min(fee, self.max_fee) if self.max_fee else fee
+
+    def _take_sample(self) -> Dict:
+        """Fees for the next block from eth_feeHistory, or the node's gasPrice on chains without a base fee"""
+        try:
+            history = self.w3.eth.fee_history(self.history_blocks, "latest", [self.percentile])
+            base_fees = history["baseFeePerGas"]
+            block = history["oldestBlock"] + len(history["gasUsedRatio"]) - 1
+        except Exception as e:
+            print(f"eth_feeHistory failed: {e}")
+            base_fees, block = [], None
+            history = {}
+        if not base_fees:
+            # Nodes without enough history return nothing; the latest block still shows whether there is a base fee
+            latest = self.w3.eth.get_block("latest")
+            base_fees, block = [latest.get("baseFeePerGas")], latest["number"]
+        if not base_fees[-1]:
+            return {"block": None, "gasPrice": self._cap(self.w3.eth.gas_price)}
+
+        # Blocks with no transactions report a zero reward; they say nothing about the going rate
+        rewards = sorted(reward[0] for reward in history.get("reward") or [] if reward and reward[0])
+        if rewards:
+            priority = rewards[len(rewards) // 2]
+        else:
+            priority = self.w3.eth.max_priority_fee
+        priority = max(priority, self.min_priority)
+        # baseFeePerGas has one entry past the newest block: the next block's base fee
+        next_base_fee = base_fees[-1]
+        max_fee = self._cap(int(next_base_fee * self.base_fee_multiplier) + priority)
+        return {
+            "block": block,
+            "baseFeePerGas": next_base_fee,
+            "maxPriorityFeePerGas": min(priority, max_fee),
+            "maxFeePerGas": max_fee,
+        }
+
+    def sample(self) -> Dict:
+        """The current fee sample, refreshed at most once per refresh_interval"""
+        with self._lock:
+            if self._sample is None or time.monotonic() - self._sampled_at >= self.refresh_interval:
+                self._sample = self._take_sample()
+                self._sampled_at = time.monotonic()
+                self.samples += 1
+            return self._sample
+
+    def fees(self) -> Dict:
+        """Fee fields for a new transaction: maxFeePerGas/maxPriorityFeePerGas, or gasPrice on legacy chains"""
+        sample = self.sample()
+        if "gasPrice" in sample:
+            return {"gasPrice": sample["gasPrice"]}
+        return {"maxFeePerGas": sample["maxFeePerGas"], "maxPriorityFeePerGas": sample["maxPriorityFeePerGas"]}
+
+    def bump(self, tx: Dict) -> Dict:
+        """
+        Same-nonce replacement for a stuck transaction: every fee field raised by
+        at least bump_percent, or to the current fees if those are higher
+
+        Args:
+            tx: The stuck transaction, with its nonce and fees
+
+        Returns:
+            A copy of tx with the new fees
+        """
+        with self._lock:
+            # A stuck transaction means the sample is stale
+            self._sample = None
+        current = self.fees()
+        factor = 1 + self.bump_percent / 100
+        replacement = dict(tx)
+        for field in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice"):
+            if field in tx:
+                # The minimum bump wins over FEE_MAX_GWEI, or the node would reject the replacement
+                replacement[field] = max(math.ceil(tx[field] * factor), current.get(field, 0))
+        if replacement.get("maxPriorityFeePerGas", 0) > replacement.get("maxFeePerGas", math.inf):
+            replacement["maxFeePerGas"] = replacement["maxPriorityFeePerGas"]
+        self.bumps += 1
+        return replacement
+
+    def stats(self) -> Dict:
+        """The current sample and counters"""
+        with self._lock:
+            sample = dict(self._sample) if self._sample else None
+        if sample:
+            sample = {key: (str(Web3.from_wei(value, "gwei")) + " gwei" if key != "block" and value is not None else value)
+                      for key, value in sample.items()}
+        return {"sample": sample, "samples": self.samples, "bumps": self.bumps, "percentile": self.percentile}
@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Iterator, Optional, Union
+
+class GLBCache:
+    """Content-addressed cache for generated GLB files with an in-memory LRU layer and an optional disk layer"""
+
+    def __init__(self, max_bytes: int = None, max_entry_bytes: int = None, cache_dir: str = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_bytes: Total size of the in-memory layer before least recently used entries are evicted
+            max_entry_bytes: Largest single file kept in memory (defaults to a quarter of max_bytes)
+            cache_dir: Directory for the disk layer; disabled when not set
+        """
+        if max_bytes is None:
+            max_bytes = int(os.getenv("GLB_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+        if max_entry_bytes is None:
+            max_entry_bytes = int(os.getenv("GLB_CACHE_MAX_ENTRY_BYTES", str(max_bytes // 4)))
+
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.cache_dir = cache_dir or os.getenv("GLB_CACHE_DIR") or None
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """
+        Hash the inputs that fully determine a GLB
+
+        Args:
+            parts: JSON-serializable generation inputs (polyline, parameters, format version)
+
+        Returns:
+            Hex SHA-256 digest used as both the cache key and the ETag
+        """
+        canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.glb")
+
+    def _remember(self, key: str, data: bytes):
+        """Insert into the memory layer and evict down to max_bytes (caller holds the lock)"""
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def contains(self, key: str) -> bool:
+        """Check whether a key is cached in either layer without counting a lookup"""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(key))
+
+    def get(self, key: str) -> Optional[Union[bytes, str]]:
+        """
+        Look up a GLB
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            The GLB bytes, the path of a disk entry too large to hold in memory, or None on a miss
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                size = os.path.getsize(path)
+                if size > self.max_entry_bytes:
+                    with self._lock:
+                        self.disk_hits += 1
+                    return path
+                with open(path, "rb") as f:
+                    data = f.read()
+                with self._lock:
+                    self._remember(key, data)
+                    self.disk_hits += 1
+                return data
+            except OSError:
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """
+        Store a GLB in memory (if it fits) and on disk (if enabled)
+
+        Args:
+            key: Cache key from make_key
+            data: Complete GLB file
+        """
+        if len(data) <= self.max_entry_bytes:
+            with self._lock:
+                self._remember(key, data)
+        if self.cache_dir:
+            for _ in self._write_disk(key, [data]):
+                pass
+
+    def tee(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass streamed GLB chunks through while writing them to the disk layer
+
+        Args:
+            key: Cache key from make_key
+            chunks: GLB chunks as produced by the writer
+
+        Returns:
+            Iterator yielding the same chunks
+        """
+        if not self.cache_dir:
+            yield from chunks
+            return
+        yield from self._write_disk(key, chunks)
+
+    def _write_disk(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Write chunks to a temporary file as they are yielded and move it into place once complete"""
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def record_not_modified(self):
+        """Count a conditional request answered with 304 without touching the cache"""
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current memory usage"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.not_modified
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.cache_dir),
+            }
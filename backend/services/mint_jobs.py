@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import socket
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+# Job statuses in order; a job ends as "minted" or "failed"
+JOB_STATUSES = ("queued", "rendering", "uploading", "sending", "confirming", "minted", "failed")
+FINAL_STATUSES = ("minted", "failed")
+
+# Hosts webhooks may be sent to; when unset, any host that resolves only to public addresses
+WEBHOOK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+def check_webhook_url(url: str):
+    """
+    Raise ValueError unless url is an http(s) URL the server may POST to: a host in
+    WEBHOOK_ALLOWED_HOSTS, or without an allowlist one whose every address is public
+    (not loopback, private, link-local such as cloud metadata, or reserved)
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS:
+        if host not in WEBHOOK_ALLOWED_HOSTS:
+            raise ValueError(f"webhook_url host {host} is not in WEBHOOK_ALLOWED_HOSTS")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"webhook_url host {host} could not be resolved: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if getattr(ip, "ipv4_mapped", None):
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"webhook_url host {host} resolves to non-public address {ip}")
+
+class MintJobs:
+    """In-memory mint job records and the worker pool that runs them"""
+
+    def __init__(self, max_workers: int = None, ttl: float = None):
+        """
+        Initialize the job store
+
+        Args:
+            max_workers: Jobs rendered, uploaded and sent at once (defaults to MINT_WORKERS or 4)
+            ttl: Seconds finished jobs are kept for status queries (defaults to MINT_JOB_TTL or 3600)
+        """
+        self.max_workers = max_workers or int(os.getenv("MINT_WORKERS", "4"))
+        self.ttl = ttl or float(os.getenv("MINT_JOB_TTL", "3600"))
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mint")
+        # Webhooks get their own thread so a slow receiver never holds up a mint, and arrive in order
+        self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mint-webhook")
+
+    def _expire(self, now: float):
+        """Drop finished jobs older than the TTL (caller holds the lock)"""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in FINAL_STATUSES and now - job["updated_at"] > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, run: Callable[[str], None], webhook_url: Optional[str] = None) -> Dict:
+        """
+        Create a job and queue run(job_id) on the worker pool
+
+        Args:
+            run: Does the work, reporting progress through update()
+            webhook_url: Receives the job as JSON on every status change
+
+        Returns:
+            The new job record
+        """
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "tx_hash": None,
+            "result": None,
+            "error": None,
+            "webhook_url": webhook_url,
+        }
+        with self._lock:
+            self._expire(now)
+            self._jobs[job["job_id"]] = job
+        self._executor.submit(self._run, run, job["job_id"])
+        return dict(job)
+
+    def _run(self, run, job_id):
+        try:
+            run(job_id)
+        except Exception as e:
+            print(f"Mint job {job_id} failed: {e}")
+            self.update(job_id, status="failed", error=str(e))
+
+    def update(self, job_id: str, **fields):
+        """Update a job's fields, notifying its webhook when the status changes"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            changed = "status" in fields and fields["status"] != job["status"]
+            job.update(fields, updated_at=time.time())
+            snapshot = dict(job)
+        if changed:
+            print(f"Mint job {job_id}: {snapshot['status']}")
+            if snapshot["webhook_url"]:
+                self._notifier.submit(self._notify, snapshot)
+
+    def _notify(self, job: Dict):
+        try:
+            # Checked again at send time: the host's DNS may have changed since the job was created
+            check_webhook_url(job["webhook_url"])
+            # A redirect could point anywhere, so it isn't followed
+            requests.post(job["webhook_url"], json=job, timeout=10, allow_redirects=False)
+        except Exception as e:
+            print(f"Mint job webhook {job['webhook_url']} failed: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """A copy of the job record, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict:
+        """Job counts by status"""
+        with self._lock:
+            counts = {status: 0 for status in JOB_STATUSES}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        return {"workers": self.max_workers, "jobs": counts}
@@ -0,0 +1,330 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Optional
+
+from web3 import Web3
+
+from services.walrus_service import WalrusService
+from services.nonce_manager import NonceManager
+from services.receipt_poller import ReceiptPoller
+from services.fee_oracle import FeeOracle
+from utils.nft_contract import contract_abi
+
+# Calldata for a string is padded to 32-byte words, so URIs within a word count cost the same gas
+URI_BUCKET_BYTES = 32
+
+class ProviderUnavailable(Exception):
+    """The chain or Walrus can't be used right now (missing configuration or unreachable)"""
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ttl seconds after they were stored"""
+
+    def __init__(self, max_entries: int, ttl: float = None):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is dropped
+            ttl: Seconds an entry stays valid; None keeps entries until evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (deadline, value)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """The cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            deadline = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (deadline, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_put(self, key: Hashable, compute: Callable[[], object]):
+        """The cached value, or compute() stored under key (compute runs outside the lock)"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class NFTProvider:
+    """
+    Web3 client, signer state, contract objects and Walrus service for the NFT
+    routes, created on first use instead of at import. A failed connection is
+    remembered for retry_interval seconds so a down RPC isn't retried on every request.
+    Connecting happens outside the lock that guards the provider's state, so
+    status() answers right away even while an RPC endpoint hangs.
+    Chain data that rarely changes (chain id, validated contracts, gas estimates)
+    is cached so a mint needs only the RPC calls that send it.
+    """
+
+    def __init__(self, rpc_url: str = None, public_address: str = None, private_key: str = None,
+                 walrus_config_path: str = None, retry_interval: float = None,
+                 contract_cache_ttl: float = None, gas_cache_ttl: float = None, cache_max_entries: int = None,
+                 w3: Web3 = None, walrus: WalrusService = None):
+        """
+        Initialize the provider without touching the network
+
+        Args:
+            rpc_url: Chain RPC endpoint (defaults to RPC_URL)
+            public_address: Sending account (defaults to PUBLIC_ADDRESS)
+            private_key: Key for public_address (defaults to PRIVATE_KEY)
+            walrus_config_path: Walrus client config (defaults to WALRUS_CONFIG_PATH)
+            retry_interval: Seconds before a failed initialization is retried (defaults to NFT_RETRY_INTERVAL or 10)
+            contract_cache_ttl: Seconds a validated contract address is trusted (defaults to NFT_CONTRACT_CACHE_TTL or 3600)
+            gas_cache_ttl: Seconds a cached gas estimate is reused (defaults to NFT_GAS_CACHE_TTL or 600)
+            cache_max_entries: Entries per cache (defaults to NFT_CACHE_MAX_ENTRIES or 256)
+            w3: Connected client to use instead of connecting to rpc_url (e.g. eth-tester in tests)
+            walrus: Walrus service to use instead of creating one
+        """
+        self.rpc_url = rpc_url or os.getenv("RPC_URL")
+        self.public_address = public_address or os.getenv("PUBLIC_ADDRESS")
+        self.private_key = private_key or os.getenv("PRIVATE_KEY")
+        self.walrus_config_path = walrus_config_path or os.getenv("WALRUS_CONFIG_PATH")
+        self.retry_interval = retry_interval or float(os.getenv("NFT_RETRY_INTERVAL", "10"))
+
+        # _lock guards the fields below and is never held during network I/O; the
+        # connect locks let one thread at a time set up each component
+        self._lock = threading.Lock()
+        self._connect_locks = {"chain": threading.Lock(), "walrus": threading.Lock()}
+        self._connecting = set()
+        self._w3: Optional[Web3] = None
+        self._nonce_manager: Optional[NonceManager] = None
+        self._receipt_poller: Optional[ReceiptPoller] = None
+        self._fee_oracle: Optional[FeeOracle] = None
+        self._walrus: Optional[WalrusService] = None
+        self._chain_id: Optional[int] = None
+
+        cache_max_entries = cache_max_entries or int(os.getenv("NFT_CACHE_MAX_ENTRIES", "256"))
+        contract_cache_ttl = contract_cache_ttl or float(os.getenv("NFT_CONTRACT_CACHE_TTL", "3600"))
+        gas_cache_ttl = gas_cache_ttl or float(os.getenv("NFT_GAS_CACHE_TTL", "600"))
+        self.contracts = TTLCache(cache_max_entries)
+        # Address -> (name, symbol) of contracts that passed validate_contract
+        self.validated_contracts = TTLCache(cache_max_entries, contract_cache_ttl)
+        # (address, function, URI bucket) -> gas estimate
+        self.gas_estimates = TTLCache(cache_max_entries, gas_cache_ttl)
+        self._errors: Dict[str, tuple] = {}  # component -> (monotonic time, message)
+        self._warm_up_thread = None
+        if w3 is not None:
+            self._attach(w3)
+        if walrus is not None:
+            self._walrus = walrus
+
+    def missing(self) -> List[str]:
+        """Required environment variables that aren't set"""
+        return [name for name, value in (("RPC_URL", self.rpc_url),
+                                         ("PUBLIC_ADDRESS", self.public_address),
+                                         ("PRIVATE_KEY", self.private_key)) if not value]
+
+    def _check_backoff(self, component):
+        """Raise the last error of component if it failed within retry_interval"""
+        with self._lock:
+            failed = self._errors.get(component)
+        if failed and time.monotonic() - failed[0] < self.retry_interval:
+            raise ProviderUnavailable(failed[1])
+
+    def _fail(self, component, message):
+        """Record and raise a failed initialization"""
+        print(f"NFT provider: {message}")
+        with self._lock:
+            self._errors[component] = (time.monotonic(), message)
+        raise ProviderUnavailable(message)
+
+    def _attach(self, w3: Web3):
+        """Publish a connected client and the signer state created alongside it"""
+        nonce_manager = NonceManager(w3, self.public_address)
+        receipt_poller = ReceiptPoller(w3)
+        fee_oracle = FeeOracle(w3)
+        with self._lock:
+            self._nonce_manager = nonce_manager
+            self._receipt_poller = receipt_poller
+            self._fee_oracle = fee_oracle
+            self._errors.pop("chain", None)
+            self._w3 = w3
+
+    def w3(self) -> Web3:
+        """The connected Web3 client; raises ProviderUnavailable if it isn't configured or reachable"""
+        if self._w3 is not None:
+            return self._w3
+        with self._connect_locks["chain"]:
+            if self._w3 is None:
+                missing = self.missing()
+                if missing:
+                    raise ProviderUnavailable(f"{', '.join(missing)} must be set in environment")
+                self._check_backoff("chain")
+                with self._connecting_to("chain"):
+                    # web3 checks eth_chainId before contract calls and transactions; it never changes for an endpoint
+                    w3 = Web3(Web3.HTTPProvider(self.rpc_url, request_kwargs={'timeout': 15}, cache_allowed_requests=True,
+                                                cacheable_requests={"eth_chainId", "net_version", "web3_clientVersion"}))
+                    try:
+                        connected = w3.is_connected()
+                    except Exception as e:
+                        connected = False
+                        print(f"NFT provider: RPC check failed: {e}")
+                if not connected:
+                    self._fail("chain", "Web3 connection failed; check RPC_URL")
+                self._attach(w3)
+                print(f"NFT provider: connected to chain {self.rpc_url}")
+        return self._w3
+
+    @contextmanager
+    def _connecting_to(self, component):
+        """Mark component as being set up, for status()"""
+        with self._lock:
+            self._connecting.add(component)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._connecting.discard(component)
+
+    def nonce_manager(self) -> NonceManager:
+        """Nonce allocation for public_address"""
+        self.w3()
+        return self._nonce_manager
+
+    def receipt_poller(self) -> ReceiptPoller:
+        """Batched receipt polling shared by all mints"""
+        self.w3()
+        return self._receipt_poller
+
+    def fee_oracle(self) -> FeeOracle:
+        """Transaction fee pricing from recent blocks"""
+        self.w3()
+        return self._fee_oracle
+
+    def contract(self, address: str):
+        """The GLBNFT contract object at address"""
+        address = Web3.to_checksum_address(address)
+        return self.contracts.get_or_put(
+            address, lambda: self.w3().eth.contract(address=address, abi=contract_abi())
+        )
+
+    def chain_id(self) -> int:
+        """Chain id of the connected RPC, read once"""
+        if self._chain_id is None:
+            self._chain_id = self.w3().eth.chain_id
+        return self._chain_id
+
+    def uri_gas(self, address: str, function: str, token_uri: str, estimate: Callable[[], int]) -> int:
+        """
+        Gas for a call taking token_uri, estimated once per contract, function and
+        URI length bucket. Callers add headroom for what the bucket doesn't capture
+        (e.g. a recipient's first token costing more storage).
+
+        Args:
+            address: Contract address
+            function: Contract function name
+            token_uri: URI passed to the call
+            estimate: Runs estimate_gas for this call on a cache miss
+        """
+        key = (Web3.to_checksum_address(address), function, len(token_uri.encode()) // URI_BUCKET_BYTES)
+        cached = self.gas_estimates.get(key)
+        if cached is not None:
+            return cached
+        gas = estimate()
+        self.gas_estimates.put(key, gas)
+        return gas
+
+    def forget_contract(self, address: str):
+        """Drop cached validation and gas data for address, e.g. after a call to it failed"""
+        address = Web3.to_checksum_address(address)
+        self.validated_contracts.discard(address)
+        self.gas_estimates.discard_where(lambda key: key[0] == address)
+
+    def walrus(self) -> WalrusService:
+        """The Walrus storage service; raises ProviderUnavailable if it can't be created"""
+        if self._walrus is not None:
+            return self._walrus
+        with self._connect_locks["walrus"]:
+            if self._walrus is None:
+                self._check_backoff("walrus")
+                with self._connecting_to("walrus"):
+                    try:
+                        walrus = WalrusService(self.walrus_config_path)
+                    except Exception as e:
+                        walrus = None
+                        error = e
+                if walrus is None:
+                    self._fail("walrus", f"Could not initialize Walrus service: {error}")
+                with self._lock:
+                    self._errors.pop("walrus", None)
+                    self._walrus = walrus
+                print("NFT provider: Walrus service initialized")
+        return self._walrus
+
+    def warm_up(self):
+        """Initialize the chain client and Walrus in the background, if neither is ready or being set up"""
+        with self._lock:
+            if (self._w3 is not None and self._walrus is not None) or \
+                    (self._warm_up_thread is not None and self._warm_up_thread.is_alive()):
+                return
+            self._warm_up_thread = threading.Thread(target=self._warm_up, name="nft-warm-up", daemon=True)
+            self._warm_up_thread.start()
+
+    def _warm_up(self):
+        for component in (self.w3, self.walrus):
+            try:
+                component()
+            except ProviderUnavailable:
+                pass
+
+    def status(self) -> Dict:
+        """Readiness of each component, without touching the network or waiting on a connection attempt"""
+        with self._lock:
+            warming = self._warm_up_thread is not None and self._warm_up_thread.is_alive()
+
+            def component_status(ready, name):
+                if ready:
+                    return {"status": "ready"}
+                if name in self._connecting or (warming and name not in self._errors):
+                    return {"status": "initializing"}
+                if name in self._errors:
+                    return {"status": "error", "error": self._errors[name][1]}
+                return {"status": "not_initialized"}
+
+            chain = component_status(self._w3 is not None, "chain")
+            if self._w3 is None and self.missing():
+                chain = {"status": "not_configured", "missing": self.missing()}
+            return {
+                "ready": self._w3 is not None and self._walrus is not None,
+                "chain": chain,
+                "walrus": component_status(self._walrus is not None, "walrus"),
+                "caches": {
+                    "contracts": self.contracts.stats(),
+                    "validated_contracts": self.validated_contracts.stats(),
+                    "gas_estimates": self.gas_estimates.stats(),
+                },
+            }
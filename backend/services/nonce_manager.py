@@ -0,0 +1,148 @@
+import heapq
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from web3 import Web3
+
+# Errors meaning the nonce is already used on chain (by us or another sender), not that it is free again
+STALE_NONCE_ERRORS = (
+    "nonce too low",
+    "already known",
+    "known transaction",
+    "replacement transaction underpriced",
+    "invalid transaction nonce",  # eth-tester
+)
+
+class NonceManager:
+    """Hands out nonces for one sending account without a chain round trip per transaction"""
+
+    def __init__(self, w3: Web3, address: str):
+        """
+        Initialize the manager. The pending transaction count is read on first use.
+
+        Args:
+            w3: Connected Web3 instance
+            address: Sending account
+        """
+        self.w3 = w3
+        self.address = Web3.to_checksum_address(address)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._next: Optional[int] = None
+        self._released = []  # nonces handed out but never broadcast, reused first
+        self.in_flight: Dict[int, Optional[str]] = {}  # nonce -> tx hash once sent
+
+        self.allocated = 0
+        self.resyncs = 0
+
+    def _pending_count(self) -> int:
+        return self.w3.eth.get_transaction_count(self.address, "pending")
+
+    def _resync(self):
+        """Re-read the pending count (caller holds the lock)"""
+        pending = self._pending_count()
+        self.resyncs += 1
+        if self._next is None:
+            self._next = pending
+            return
+        # Nonces the node doesn't know about and we aren't holding were dropped: hand them out again
+        gaps = {nonce for nonce in range(pending, self._next) if nonce not in self.in_flight}
+        self._released = sorted(gaps | {nonce for nonce in self._released if nonce >= pending})
+        self._next = max(self._next, pending)
+
+    def allocate(self) -> int:
+        """Reserve the next nonce; pass it back to sent, confirmed or failed"""
+        with self._lock:
+            if self._next is None:
+                self._resync()
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                nonce = self._next
+                self._next += 1
+            self.in_flight[nonce] = None
+            self.allocated += 1
+            return nonce
+
+    def sent(self, nonce: int, tx_hash: str):
+        """Record that the transaction using nonce was broadcast"""
+        with self._lock:
+            self.in_flight[nonce] = tx_hash
+
+    def confirmed(self, nonce: int):
+        """Record that the transaction using nonce was mined"""
+        with self._lock:
+            self.in_flight.pop(nonce, None)
+
+    def abandoned(self, nonce: int):
+        """
+        Stop waiting for the transaction using nonce (e.g. its receipt timed out).
+        The pending count is re-read, so if the node dropped it the nonce is
+        handed out again instead of leaving a gap that stalls later transactions.
+        """
+        with self._lock:
+            self.in_flight.pop(nonce, None)
+            self._resync()
+
+    def failed(self, nonce: int, error: Exception) -> bool:
+        """
+        Record that broadcasting with nonce failed.
+
+        Returns:
+            True if the nonce was already used on chain (the caller can retry
+            with a fresh one); otherwise the nonce is released for reuse
+        """
+        stale = any(marker in str(error).lower() for marker in STALE_NONCE_ERRORS)
+        with self._lock:
+            self.in_flight.pop(nonce, None)
+            if stale:
+                self._resync()
+            elif nonce == self._next - 1:
+                self._next -= 1
+            else:
+                heapq.heappush(self._released, nonce)
+            return stale
+
+    def send(self, tx: Dict, broadcast: Callable[[Dict], object]) -> Tuple[Dict, object]:
+        """
+        Give tx the next nonce and broadcast it. Broadcasts are serialized so
+        nonces reach the node in order (only the broadcast, not waiting for
+        receipts). If the chain reports the nonce as already used, retries
+        once with a resynced nonce.
+
+        Args:
+            tx: Transaction fields without a nonce
+            broadcast: Signs and sends a transaction, returning its hash
+
+        Returns:
+            The transaction with its nonce, and the hash from broadcast
+        """
+        with self._send_lock:
+            for attempt in range(2):
+                nonced = dict(tx, nonce=self.allocate())
+                try:
+                    tx_hash = broadcast(nonced)
+                except Exception as e:
+                    if not self.failed(nonced["nonce"], e) or attempt:
+                        raise
+                    print(f"Nonce {nonced['nonce']} already used ({e}), retrying with a fresh nonce")
+                    continue
+                self.sent(nonced["nonce"], Web3.to_hex(tx_hash))
+                return nonced, tx_hash
+
+    def resync(self):
+        """Re-read the pending count, e.g. after a transaction was dropped from the mempool"""
+        with self._lock:
+            self._resync()
+
+    def stats(self) -> Dict:
+        """Allocation counters and in-flight transactions"""
+        with self._lock:
+            return {
+                "address": self.address,
+                "next_nonce": self._next,
+                "released": list(self._released),
+                "in_flight": {str(nonce): tx_hash for nonce, tx_hash in sorted(self.in_flight.items())},
+                "allocated": self.allocated,
+                "resyncs": self.resyncs,
+            }
@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+from concurrent.futures import Future
+from typing import Dict
+
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+from utils.batch_reads import BatchUnsupported, batch_request, batch_unsupported
+
+class ReceiptPoller:
+    """Waits for many transaction receipts at once from one background thread, polling them in JSON-RPC batches"""
+
+    def __init__(self, w3: Web3, interval: float = None, timeout: float = None, batch_size: int = 100):
+        """
+        Initialize the poller. The polling thread starts with the first wait().
+
+        Args:
+            w3: Connected Web3 instance
+            interval: Seconds between polls (defaults to RECEIPT_POLL_INTERVAL or 2)
+            timeout: Seconds before a wait fails with TimeExhausted (defaults to RECEIPT_TIMEOUT or 300)
+            batch_size: Receipts requested per JSON-RPC batch
+        """
+        self.w3 = w3
+        self.interval = interval or float(os.getenv("RECEIPT_POLL_INTERVAL", "2"))
+        self.timeout = timeout or float(os.getenv("RECEIPT_TIMEOUT", "300"))
+        self.batch_size = batch_size
+
+        self._pending: Dict[str, tuple] = {}  # tx hash -> (deadline, future)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batching = True
+
+        self.polls = 0
+        self.confirmed = 0
+        self.timed_out = 0
+
+    def wait(self, tx_hash) -> Future:
+        """
+        A future resolved with the receipt of tx_hash once it is mined,
+        or failed with TimeExhausted after the timeout
+        """
+        if not isinstance(tx_hash, str):
+            tx_hash = Web3.to_hex(tx_hash)
+        with self._lock:
+            entry = self._pending.get(tx_hash)
+            if entry is None:
+                entry = (time.monotonic() + self.timeout, Future())
+                self._pending[tx_hash] = entry
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="receipt-poller", daemon=True)
+                self._thread.start()
+        return entry[1]
+
+    def forget(self, tx_hash):
+        """Stop polling for tx_hash (e.g. a replaced transaction); its future is never resolved"""
+        if not isinstance(tx_hash, str):
+            tx_hash = Web3.to_hex(tx_hash)
+        with self._lock:
+            self._pending.pop(tx_hash, None)
+
+    def _run(self):
+        # Polling only on the interval (not per wait) lets receipts accumulate into one batch
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                pending = list(self._pending.items())
+            if not pending:
+                continue
+            try:
+                self._poll(pending)
+            except Exception as e:
+                print(f"Receipt poll failed: {e}")
+
+    def _stop_batching(self, error):
+        # Providers without batch support get one request per receipt from now on
+        print(f"Batch receipt request unsupported ({error}), polling receipts individually")
+        self._batching = False
+
+    def _mined(self, hashes):
+        """
+        The subset of hashes that have receipts, found with one batch request per batch_size hashes.
+        Hashes a batch couldn't answer this poll (after retries) are included, to be checked individually.
+        """
+        if not self._batching:
+            return hashes
+        mined = []
+        for i in range(0, len(hashes), self.batch_size):
+            chunk = hashes[i:i + self.batch_size]
+            responses = [None] * len(chunk)
+            try:
+                unanswered = set(batch_request(
+                    self.w3.provider, [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in chunk], responses
+                ))
+            except BatchUnsupported as e:
+                self._stop_batching(e)
+                return hashes
+            mined.extend(tx_hash for j, (tx_hash, response) in enumerate(zip(chunk, responses))
+                         if j in unanswered or isinstance(response, dict) and response.get("result"))
+        return mined
+
+    def _receipts(self, hashes):
+        """
+        Formatted receipts for hashes, batched when the provider supports it; missing ones are skipped.
+        A chunk whose batch fails is fetched receipt by receipt for this poll.
+        """
+        receipts = {}
+        individually = hashes
+        if self._batching:
+            individually = []
+            for i in range(0, len(hashes), self.batch_size):
+                chunk = hashes[i:i + self.batch_size]
+                try:
+                    with self.w3.batch_requests() as batch:
+                        for tx_hash in chunk:
+                            batch.add(self.w3.eth.get_transaction_receipt(tx_hash))
+                        receipts.update(zip(chunk, batch.execute()))
+                except Exception as e:
+                    if batch_unsupported(e):
+                        self._stop_batching(e)
+                    else:
+                        print(f"Batch receipt request failed ({e}), fetching {len(chunk)} receipts individually")
+                    individually.extend(chunk)
+
+        for tx_hash in individually:
+            try:
+                receipts[tx_hash] = self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                pass
+        return receipts
+
+    def _poll(self, pending):
+        self.polls += 1
+        hashes = [tx_hash for tx_hash, _ in pending]
+        mined = self._mined(hashes)
+        receipts = self._receipts(mined) if mined else {}
+
+        now = time.monotonic()
+        settled = []
+        for tx_hash, (deadline, future) in pending:
+            if tx_hash in receipts:
+                self.confirmed += 1
+                settled.append((future, receipts[tx_hash], None))
+            elif now > deadline:
+                self.timed_out += 1
+                settled.append((future, None, TimeExhausted(
+                    f"Transaction {tx_hash} is not in the chain after {self.timeout} seconds"
+                )))
+            else:
+                continue
+            with self._lock:
+                self._pending.pop(tx_hash, None)
+
+        # Callbacks run outside the lock
+        for future, receipt, error in settled:
+            if error is None:
+                future.set_result(receipt)
+            else:
+                future.set_exception(error)
+
+    def stats(self) -> Dict:
+        """Polling counters"""
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "polls": self.polls,
+            "confirmed": self.confirmed,
+            "timed_out": self.timed_out,
+            "batching": self._batching,
+        }
@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+import polyline
+
+from utils.route_compare import RouteIndex, MAX_SAMPLES, MIN_SPACING_M
+
+class RouteIndexStore:
+    """Cache of decoded, projected and resampled reference routes with their KD-tree, keyed by polyline hash"""
+
+    def __init__(self, max_bytes: int = None, cache_dir: str = None):
+        """
+        Initialize the store
+
+        Args:
+            max_bytes: Memory budget for cached indexes before least recently used ones are evicted
+            cache_dir: Directory for .npy sample files that are memory-mapped on load; disabled when not set
+        """
+        if max_bytes is None:
+            max_bytes = int(os.getenv("ROUTE_INDEX_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir or os.getenv("ROUTE_INDEX_DIR") or None
+
+        self._entries: "OrderedDict[str, RouteIndex]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(polyline_str: str) -> str:
+        """Hash a polyline together with the resampling settings that shape its index"""
+        canonical = json.dumps([polyline_str, MAX_SAMPLES, MIN_SPACING_M])
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.npy", f"{base}.json"
+
+    def _remember(self, key: str, index: RouteIndex):
+        """Insert into memory and evict down to max_bytes (caller holds the lock)"""
+        if key in self._entries:
+            self._size -= self._entries.pop(key).nbytes
+        self._entries[key] = index
+        self._size += index.nbytes
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.nbytes
+            self.evictions += 1
+
+    def _load(self, key: str) -> Optional[RouteIndex]:
+        """Load an index from disk, memory-mapping its samples"""
+        samples_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            samples = np.load(samples_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return RouteIndex.restore(samples, meta["origin"], meta["lower"], meta["upper"], meta["spacing"])
+
+    def _save(self, key: str, index: RouteIndex):
+        """Write the samples and metadata to disk; the metadata is moved into place last"""
+        samples_path, meta_path = self._paths(key)
+        directory = os.path.dirname(samples_path)
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            "origin": index.origin.tolist(),
+            "lower": index.lower.tolist(),
+            "upper": index.upper.tolist(),
+            "spacing": index.spacing,
+        }
+        for path, write in (
+            (samples_path, lambda f: np.save(f, np.ascontiguousarray(index.samples))),
+            (meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8"))),
+        ):
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+
+    def get(self, polyline_str: str) -> RouteIndex:
+        """
+        Get the index for a reference polyline, building it on first use
+
+        Args:
+            polyline_str: Encoded reference polyline
+
+        Returns:
+            RouteIndex for the polyline
+        """
+        key = self.make_key(polyline_str)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+
+        index = self._load(key) if self.cache_dir else None
+        if index is not None:
+            counter = "disk_hits"
+        else:
+            counter = "misses"
+            index = RouteIndex.from_coords(polyline.decode(polyline_str))
+            if self.cache_dir:
+                try:
+                    self._save(key, index)
+                except OSError as e:
+                    print(f"Warning: Could not write route index {key[:12]}: {e}")
+
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._remember(key, index)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current memory usage"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.cache_dir),
+            }
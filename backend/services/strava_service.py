@@ -0,0 +1,318 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from utils.route_streams import STREAM_KEYS, ActivityStreams, StreamDecoder
+
+class StravaError(Exception):
+    """Error response from the Strava API"""
+
+    def __init__(self, status_code: int, message: str, retry_after: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class RateLimitBudget:
+    """Strava's 15-minute and daily request budgets, as last reported in response headers"""
+
+    WINDOW_SECONDS = 15 * 60
+    DAY_SECONDS = 24 * 60 * 60
+
+    def __init__(self, reserve_fraction: float = None):
+        """
+        Args:
+            reserve_fraction: Share of each limit kept in reserve; requests are shed once only the reserve is left
+        """
+        if reserve_fraction is None:
+            reserve_fraction = float(os.getenv("STRAVA_RATE_RESERVE", "0.05"))
+        self.reserve_fraction = reserve_fraction
+        self.limits = None   # (15-minute limit, daily limit)
+        self.usage = [0, 0]  # usage in the current windows, including our own requests since the last report
+        self.window_starts = (0, 0)
+        self.blocked_until = 0.0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def _current_windows(self, now):
+        # Strava's windows reset on natural quarter hours and at midnight UTC
+        return (int(now // self.WINDOW_SECONDS), int(now // self.DAY_SECONDS))
+
+    def _roll(self, now):
+        """Zero the usage of any window that has ended since the last report (caller holds the lock)"""
+        windows = self._current_windows(now)
+        for i in range(2):
+            if windows[i] != self.window_starts[i]:
+                self.usage[i] = 0
+        self.window_starts = windows
+
+    def retry_after(self, now=None) -> int:
+        """Seconds until the 15-minute window resets"""
+        now = now or time.time()
+        return max(1, int(self.WINDOW_SECONDS - now % self.WINDOW_SECONDS))
+
+    def acquire(self):
+        """
+        Reserve one request, or raise StravaError(429) if that would dig into the reserve.
+        Until the first response reports the limits, requests are let through.
+        """
+        now = time.time()
+        with self._lock:
+            self._roll(now)
+            if now < self.blocked_until:
+                self.shed += 1
+                raise StravaError(429, "Strava rate limit reached, try again later", int(self.blocked_until - now) + 1)
+            if self.limits:
+                for limit, used in zip(self.limits, self.usage):
+                    if used >= limit - max(1, int(limit * self.reserve_fraction)):
+                        self.shed += 1
+                        raise StravaError(429, "Strava rate limit budget exhausted, try again later", self.retry_after(now))
+            self.usage[0] += 1
+            self.usage[1] += 1
+
+    def update(self, headers, status_code: int):
+        """Record the limits and usage reported by a response"""
+        now = time.time()
+        # Read endpoints report a separate, stricter read budget when it applies
+        limit = headers.get("X-ReadRateLimit-Limit") or headers.get("X-RateLimit-Limit")
+        usage = headers.get("X-ReadRateLimit-Usage") or headers.get("X-RateLimit-Usage")
+        with self._lock:
+            self._roll(now)
+            if limit and usage:
+                try:
+                    self.limits = tuple(int(value) for value in limit.split(",")[:2])
+                    self.usage = [int(value) for value in usage.split(",")[:2]]
+                except ValueError:
+                    pass
+            if status_code == 429:
+                self.blocked_until = now + self.retry_after(now)
+
+    def snapshot(self) -> Dict:
+        """Current view of the budget"""
+        with self._lock:
+            self._roll(time.time())
+            return {
+                "limits": list(self.limits) if self.limits else None,
+                "usage": list(self.usage),
+                "shed": self.shed,
+            }
+
+class StravaService:
+    """Async access to the Strava API over one pooled HTTP client"""
+
+    def __init__(self, base_url: str = None, timeout: float = 15.0, max_connections: int = None,
+                 cache_ttl: float = None, cache_max_entries: int = None):
+        """
+        Initialize the service
+
+        Args:
+            base_url: API root (defaults to STRAVA_API_URL or the public v3 API; point it at a fake server in tests)
+            timeout: Per-request timeout in seconds
+            max_connections: Connection pool size (defaults to STRAVA_MAX_CONNECTIONS or 20)
+            cache_ttl: Seconds an activity polyline stays cached (defaults to STRAVA_CACHE_TTL or 3600)
+            cache_max_entries: Polylines kept before the oldest are dropped (defaults to STRAVA_CACHE_MAX_ENTRIES or 10000)
+        """
+        self.base_url = (base_url or os.getenv("STRAVA_API_URL", "https://www.strava.com/api/v3")).rstrip("/")
+        self.oauth_url = os.getenv("STRAVA_OAUTH_URL", "https://www.strava.com/oauth/token")
+        self.timeout = timeout
+        self.max_connections = max_connections or int(os.getenv("STRAVA_MAX_CONNECTIONS", "20"))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("STRAVA_CACHE_TTL", "3600"))
+        self.cache_max_entries = cache_max_entries or int(os.getenv("STRAVA_CACHE_MAX_ENTRIES", "10000"))
+        self.budget = RateLimitBudget()
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _http(self) -> httpx.AsyncClient:
+        """Shared client for the running event loop (connections cannot move between loops)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+            self._client_loop = loop
+            self._inflight = {}
+        return self._client
+
+    async def _get_json(self, path: str, access_token: str, params: Dict = None):
+        """GET a JSON resource within the rate-limit budget, raising StravaError for non-2xx responses"""
+        self.budget.acquire()
+        response = await self._http().get(
+            path,
+            params=params,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        self.budget.update(response.headers, response.status_code)
+        self._raise_for_status(response)
+        return response.json()
+
+    def _raise_for_status(self, response: httpx.Response):
+        if response.status_code >= 400:
+            retry_after = self.budget.retry_after() if response.status_code == 429 else None
+            raise StravaError(
+                response.status_code,
+                f"Strava API returned {response.status_code}: {response.text[:200]}",
+                retry_after
+            )
+
+    async def get_activity_streams(self, activity_id: int, access_token: str, keys=STREAM_KEYS) -> Dict:
+        """
+        Fetch an activity's full-resolution streams, decoding the response as it arrives.
+        The route is resampled and the other streams decimated on the fly, so memory
+        stays bounded however long the activity is (see utils.route_streams).
+
+        Args:
+            activity_id: Strava activity ID
+            access_token: OAuth access token with activity:read scope
+            keys: Stream types to request
+
+        Returns:
+            Dict with the resampled "latlng" route as (lat, lng) pairs, float32 arrays
+            for the other streams and "original_size" (latlng points received)
+        """
+        self.budget.acquire()
+        streams = ActivityStreams()
+        decoder = StreamDecoder(streams.add, keys)
+        async with self._http().stream(
+            "GET",
+            f"/activities/{activity_id}/streams",
+            params={"keys": ",".join(keys), "key_by_type": "true"},
+            headers={"Authorization": f"Bearer {access_token}"}
+        ) as response:
+            self.budget.update(response.headers, response.status_code)
+            if response.status_code >= 400:
+                await response.aread()
+                self._raise_for_status(response)
+            async for text in response.aiter_text():
+                decoder.feed(text)
+        return streams.finish()
+
+    async def oauth_token(self, **params) -> Dict:
+        """
+        Call Strava's OAuth token endpoint (authorization_code or refresh_token grant)
+
+        Args:
+            params: Form fields, including client_id, client_secret and grant_type
+
+        Returns:
+            The token response with access_token, refresh_token and expires_at
+        """
+        response = await self._http().post(self.oauth_url, data=params)
+        if response.status_code >= 400:
+            raise StravaError(
+                response.status_code,
+                f"Strava OAuth returned {response.status_code}: {response.text[:200]}"
+            )
+        return response.json()
+
+    def _cached(self, activity_id: int, access_token: str) -> Optional[str]:
+        """Cached polyline, shared for public activities and per token for private ones"""
+        now = time.monotonic()
+        for key in ((activity_id,), (activity_id, access_token)):
+            entry = self._cache.get(key)
+            if entry is None:
+                continue
+            expires_at, polyline_str = entry
+            if expires_at < now:
+                del self._cache[key]
+                continue
+            return polyline_str
+        return None
+
+    def _remember(self, activity_id: int, access_token: str, polyline_str: str, private: bool):
+        key = (activity_id, access_token) if private else (activity_id,)
+        self._cache[key] = (time.monotonic() + self.cache_ttl, polyline_str)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    async def _fetch_activity_polyline(self, activity_id: int, access_token: str) -> str:
+        # Strava has no field selection; skipping segment efforts is what keeps the payload small
+        activity = await self._get_json(
+            f"/activities/{activity_id}", access_token, params={"include_all_efforts": "false"}
+        )
+        polyline_str = (activity.get("map") or {}).get("summary_polyline") or ""
+        private = activity.get("private", True) or activity.get("visibility", "everyone") != "everyone"
+        self._remember(activity_id, access_token, polyline_str, private)
+        return polyline_str
+
+    async def get_activity_polyline(self, activity_id: int, access_token: str) -> str:
+        """
+        Fetch an activity's summary polyline, from cache when possible.
+        Concurrent requests for the same activity and token share one upstream call.
+
+        Args:
+            activity_id: Strava activity ID
+            access_token: OAuth access token with activity:read scope
+
+        Returns:
+            The encoded map.summary_polyline (empty string for activities without a map)
+        """
+        self._http()
+        cached = self._cached(activity_id, access_token)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        key = (activity_id, access_token)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch_activity_polyline(activity_id, access_token))
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    async def get_activity_polylines(self, activity_ids: Iterable[int], access_token: str,
+                                     return_exceptions: bool = False) -> List[str]:
+        """
+        Fetch several activities' summary polylines concurrently
+
+        Args:
+            activity_ids: Strava activity IDs
+            access_token: OAuth access token with activity:read scope
+            return_exceptions: Return an activity's StravaError in its place instead of raising the first one
+
+        Returns:
+            Polylines in the same order as activity_ids
+        """
+        return list(await asyncio.gather(
+            *(self.get_activity_polyline(activity_id, access_token) for activity_id in activity_ids),
+            return_exceptions=return_exceptions
+        ))
+
+    def stats(self) -> Dict:
+        """Cache counters and rate-limit budget"""
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._cache),
+            "rate_limit": self.budget.snapshot(),
+        }
+
+    async def aclose(self):
+        """Close the pooled client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,320 @@
+import os
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from services.strava_service import StravaError, StravaService
+
+# Anonymous callers share this entry when routes/map.py allows them (the old single-token behaviour)
+DEFAULT_USER = "default"
+
+# Seconds between backend re-reads after a refresh token is rejected, waiting for another worker's refresh to land
+CONFLICT_RECHECK_DELAYS = (0, 0.25, 0.5, 1, 2)
+
+class MemoryTokenBackend:
+    """Tokens held in this process only"""
+
+    def __init__(self):
+        self._tokens: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            tokens = self._tokens.get(user_id)
+            return dict(tokens) if tokens else None
+
+    def put(self, user_id: str, tokens: Dict):
+        with self._lock:
+            self._tokens[user_id] = dict(tokens)
+
+    def replace(self, user_id: str, tokens: Dict, expires_at: int) -> bool:
+        """Store tokens only if the stored ones still expire at expires_at; False if someone else replaced them"""
+        with self._lock:
+            current = self._tokens.get(user_id)
+            if current is None or current["expires_at"] != expires_at:
+                return False
+            self._tokens[user_id] = dict(tokens)
+            return True
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._tokens.pop(user_id, None)
+
+    def expiring(self, before: float) -> List[Tuple[str, Dict]]:
+        with self._lock:
+            return [(user_id, dict(tokens)) for user_id, tokens in self._tokens.items()
+                    if tokens["expires_at"] <= before]
+
+class SQLiteTokenBackend:
+    """Tokens in a SQLite file, shared by every worker on the host"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS strava_tokens ("
+                "user_id TEXT PRIMARY KEY, access_token TEXT NOT NULL, "
+                "refresh_token TEXT NOT NULL, expires_at INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT access_token, refresh_token, expires_at FROM strava_tokens WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"access_token": row[0], "refresh_token": row[1], "expires_at": row[2]}
+
+    def put(self, user_id: str, tokens: Dict):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO strava_tokens (user_id, access_token, refresh_token, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (user_id, tokens["access_token"], tokens["refresh_token"], int(tokens["expires_at"]))
+            )
+
+    def replace(self, user_id: str, tokens: Dict, expires_at: int) -> bool:
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE strava_tokens SET access_token = ?, refresh_token = ?, expires_at = ? "
+                "WHERE user_id = ? AND expires_at = ?",
+                (tokens["access_token"], tokens["refresh_token"], int(tokens["expires_at"]), user_id, int(expires_at))
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, user_id: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM strava_tokens WHERE user_id = ?", (user_id,))
+
+    def expiring(self, before: float) -> List[Tuple[str, Dict]]:
+        rows = self._connect().execute(
+            "SELECT user_id, access_token, refresh_token, expires_at FROM strava_tokens WHERE expires_at <= ?",
+            (int(before),)
+        ).fetchall()
+        return [(row[0], {"access_token": row[1], "refresh_token": row[2], "expires_at": row[3]}) for row in rows]
+
+class SupabaseTokenBackend:
+    """Tokens in the Supabase strava_tokens table (see migrations/), shared across hosts"""
+
+    def __init__(self, url: str, key: str, table: str = "strava_tokens"):
+        from supabase import create_client
+        self.client = create_client(url, key)
+        self.table = table
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        rows = self.client.table(self.table).select("*").eq("user_id", user_id).limit(1).execute().data
+        if not rows:
+            return None
+        row = rows[0]
+        return {"access_token": row["access_token"], "refresh_token": row["refresh_token"],
+                "expires_at": row["expires_at"]}
+
+    def put(self, user_id: str, tokens: Dict):
+        self.client.table(self.table).upsert({
+            "user_id": user_id,
+            "access_token": tokens["access_token"],
+            "refresh_token": tokens["refresh_token"],
+            "expires_at": int(tokens["expires_at"]),
+        }).execute()
+
+    def replace(self, user_id: str, tokens: Dict, expires_at: int) -> bool:
+        rows = self.client.table(self.table).update({
+            "access_token": tokens["access_token"],
+            "refresh_token": tokens["refresh_token"],
+            "expires_at": int(tokens["expires_at"]),
+        }).eq("user_id", user_id).eq("expires_at", int(expires_at)).execute().data
+        return bool(rows)
+
+    def delete(self, user_id: str):
+        self.client.table(self.table).delete().eq("user_id", user_id).execute()
+
+    def expiring(self, before: float) -> List[Tuple[str, Dict]]:
+        rows = self.client.table(self.table).select("*").lte("expires_at", int(before)).execute().data
+        return [(row["user_id"], {"access_token": row["access_token"], "refresh_token": row["refresh_token"],
+                                  "expires_at": row["expires_at"]}) for row in rows]
+
+def default_backend():
+    """Backend picked from STRAVA_TOKEN_BACKEND (memory, sqlite or supabase)"""
+    kind = os.getenv("STRAVA_TOKEN_BACKEND", "sqlite" if os.getenv("STRAVA_TOKEN_DB") else "memory").lower()
+    if kind == "sqlite":
+        return SQLiteTokenBackend(os.getenv("STRAVA_TOKEN_DB", "strava_tokens.db"))
+    if kind == "supabase":
+        from config import settings
+        return SupabaseTokenBackend(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+    return MemoryTokenBackend()
+
+class StravaTokenStore:
+    """Per-user Strava OAuth tokens, refreshed in the background before they expire"""
+
+    def __init__(self, strava: StravaService, backend=None, refresh_margin: float = None, refresh_interval: float = None):
+        """
+        Initialize the store
+
+        Args:
+            strava: Service whose pooled client makes the OAuth calls
+            backend: Token backend (defaults to the one configured by STRAVA_TOKEN_BACKEND / STRAVA_TOKEN_DB)
+            refresh_margin: Refresh tokens this many seconds before they expire (defaults to STRAVA_TOKEN_REFRESH_MARGIN or 900)
+            refresh_interval: Seconds between background refresh sweeps (defaults to STRAVA_TOKEN_REFRESH_INTERVAL or 60)
+        """
+        self.strava = strava
+        self.backend = backend or default_backend()
+        self.refresh_margin = refresh_margin if refresh_margin is not None else float(os.getenv("STRAVA_TOKEN_REFRESH_MARGIN", "900"))
+        self.refresh_interval = refresh_interval or float(os.getenv("STRAVA_TOKEN_REFRESH_INTERVAL", "60"))
+
+        self._refreshing: Dict[str, asyncio.Future] = {}
+        self._refresher: Optional[asyncio.Task] = None
+
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.refresh_failures = 0
+        self.refresh_conflicts = 0
+
+    def _credentials(self) -> Dict:
+        return {
+            "client_id": os.getenv("STRAVA_CLIENT_ID"),
+            "client_secret": os.getenv("STRAVA_CLIENT_SECRET"),
+        }
+
+    def _ensure_refresher(self):
+        """Start the background sweep on the running loop, once"""
+        loop = asyncio.get_running_loop()
+        if self._refresher is None or self._refresher.get_loop() is not loop:
+            self._refreshing = {}
+            self._refresher = loop.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        # Jitter so several workers sharing a backend don't sweep in lockstep
+        await asyncio.sleep(random.uniform(0, self.refresh_interval))
+        while True:
+            try:
+                due = await asyncio.to_thread(self.backend.expiring, time.time() + self.refresh_margin + self.refresh_interval)
+                for user_id, tokens in due:
+                    try:
+                        await self._refresh(user_id, tokens)
+                        self.background_refreshes += 1
+                    except Exception as e:
+                        self.refresh_failures += 1
+                        print(f"Strava token refresh failed for {user_id}: {e}")
+            except Exception as e:
+                print(f"Strava token refresh sweep failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    @staticmethod
+    def _tokens(response: Dict) -> Dict:
+        return {
+            "access_token": response["access_token"],
+            "refresh_token": response["refresh_token"],
+            "expires_at": int(response["expires_at"]),
+        }
+
+    async def _store(self, user_id: str, response: Dict) -> Dict:
+        tokens = self._tokens(response)
+        await asyncio.to_thread(self.backend.put, user_id, tokens)
+        return tokens
+
+    async def _refresh(self, user_id: str, tokens: Dict) -> Dict:
+        """
+        Refresh a user's tokens; concurrent refreshes for the same user share one call.
+        Tokens read from the backend (with their expires_at) are only replaced if no
+        other worker refreshed them meanwhile; otherwise that worker's tokens are used.
+        """
+        inflight = self._refreshing.get(user_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        async def winner():
+            """Tokens stored by another worker since ours were read, or None"""
+            current = await asyncio.to_thread(self.backend.get, user_id)
+            if current is not None and current["expires_at"] != tokens["expires_at"]:
+                self.refresh_conflicts += 1
+                return current
+            return None
+
+        async def refresh():
+            try:
+                response = await self.strava.oauth_token(
+                    grant_type="refresh_token", refresh_token=tokens["refresh_token"], **self._credentials()
+                )
+            except StravaError:
+                if "expires_at" not in tokens:
+                    raise
+                # Our refresh token may have been rotated by another worker's refresh, whose
+                # tokens reach the backend right after its own call to Strava returns
+                for delay in CONFLICT_RECHECK_DELAYS:
+                    await asyncio.sleep(delay)
+                    current = await winner()
+                    if current is not None:
+                        return current
+                raise
+            self.refreshes += 1
+            if "expires_at" not in tokens:
+                return await self._store(user_id, response)
+            refreshed = self._tokens(response)
+            if await asyncio.to_thread(self.backend.replace, user_id, refreshed, tokens["expires_at"]):
+                return refreshed
+            return await winner() or refreshed
+
+        task = asyncio.ensure_future(refresh())
+        self._refreshing[user_id] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._refreshing.get(user_id) is task:
+                del self._refreshing[user_id]
+
+    async def exchange_code(self, user_id: str, code: str) -> Dict:
+        """Exchange an OAuth authorization code and store the user's tokens"""
+        self._ensure_refresher()
+        response = await self.strava.oauth_token(grant_type="authorization_code", code=code, **self._credentials())
+        return await self._store(user_id, response)
+
+    async def refresh_with(self, user_id: str, refresh_token: str) -> Dict:
+        """Refresh with a refresh token supplied by the client and store the result"""
+        self._ensure_refresher()
+        return await self._refresh(user_id, {"refresh_token": refresh_token})
+
+    async def get_access_token(self, user_id: str) -> Optional[str]:
+        """
+        A valid access token for the user, or None if they haven't authorized.
+        Tokens are normally refreshed by the background sweep; one found within
+        the margin of expiry here is refreshed before returning.
+        """
+        self._ensure_refresher()
+        tokens = await asyncio.to_thread(self.backend.get, user_id)
+        if tokens is None:
+            return None
+        if tokens["expires_at"] - time.time() <= self.refresh_margin:
+            try:
+                tokens = await self._refresh(user_id, tokens)
+            except StravaError:
+                self.refresh_failures += 1
+                # Still usable until it actually expires
+                if tokens["expires_at"] <= time.time():
+                    raise
+        return tokens["access_token"]
+
+    async def forget(self, user_id: str):
+        """Drop a user's tokens"""
+        await asyncio.to_thread(self.backend.delete, user_id)
+
+    def stats(self) -> Dict:
+        """Refresh counters"""
+        return {
+            "backend": type(self.backend).__name__,
+            "refreshes": self.refreshes,
+            "background_refreshes": self.background_refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refresh_conflicts": self.refresh_conflicts,
+        }
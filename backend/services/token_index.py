@@ -0,0 +1,333 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from web3 import Web3
+
+from utils.nft_events import NFT_MINTED_TOPIC, TRANSFER_TOPIC, ZERO_ADDRESS, decode_log
+
+class TokenIndex:
+    """
+    Ownership and token URI index for GLBNFT contracts, built incrementally from
+    their Transfer and NFTMinted logs and stored in SQLite. Each sync first
+    checks the hashes of recently indexed blocks and rolls back whatever a
+    reorg (up to reorg_depth blocks) replaced.
+    """
+
+    def __init__(self, db_path: str = None, chunk_blocks: int = None, reorg_depth: int = None,
+                 max_blocks_per_sync: int = None):
+        """
+        Initialize the index
+
+        Args:
+            db_path: SQLite file path (defaults to TOKEN_INDEX_PATH or a file in the temp dir)
+            chunk_blocks: Blocks per eth_getLogs request, halved when the node rejects a range (defaults to TOKEN_INDEX_CHUNK_BLOCKS or 2000)
+            reorg_depth: Deepest reorg that is detected and rolled back (defaults to TOKEN_INDEX_REORG_DEPTH or 12)
+            max_blocks_per_sync: Blocks indexed per sync() call, so one request never scans the whole chain (defaults to TOKEN_INDEX_MAX_BLOCKS or 100000)
+        """
+        self.db_path = db_path or os.getenv(
+            "TOKEN_INDEX_PATH",
+            os.path.join(tempfile.gettempdir(), "racefi_token_index.sqlite3")
+        )
+        self.chunk_blocks = chunk_blocks or int(os.getenv("TOKEN_INDEX_CHUNK_BLOCKS", "2000"))
+        self.reorg_depth = reorg_depth or int(os.getenv("TOKEN_INDEX_REORG_DEPTH", "12"))
+        self.max_blocks_per_sync = max_blocks_per_sync or int(os.getenv("TOKEN_INDEX_MAX_BLOCKS", "100000"))
+
+        self._local = threading.local()
+        self._sync_locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS index_state ("
+                "contract TEXT PRIMARY KEY, start_block INTEGER NOT NULL, last_block INTEGER NOT NULL, "
+                "synced_at REAL NOT NULL)"
+            )
+            # Hashes of indexed blocks near the tip, compared against the chain to detect reorgs
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS index_blocks ("
+                "contract TEXT NOT NULL, number INTEGER NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (contract, number))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS transfers ("
+                "contract TEXT NOT NULL, block_number INTEGER NOT NULL, log_index INTEGER NOT NULL, "
+                "token_id INTEGER NOT NULL, from_address TEXT NOT NULL, to_address TEXT NOT NULL, tx_hash TEXT NOT NULL, "
+                "PRIMARY KEY (contract, block_number, log_index))"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "contract TEXT NOT NULL, token_id INTEGER NOT NULL, owner TEXT, token_uri TEXT, minted_block INTEGER, "
+                "PRIMARY KEY (contract, token_id))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS tokens_owner ON tokens (contract, owner)")
+            db.execute("CREATE INDEX IF NOT EXISTS transfers_token ON transfers (contract, token_id)")
+
+        self.logs_indexed = 0
+        self.reorgs = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _sync_lock(self, contract: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._sync_locks.setdefault(contract, threading.Lock())
+
+    def state(self, contract_address: str) -> Optional[Dict]:
+        """Indexing progress of a contract, or None if it was never synced"""
+        row = self._connect().execute(
+            "SELECT start_block, last_block, synced_at FROM index_state WHERE contract = ?",
+            (Web3.to_checksum_address(contract_address),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"start_block": row[0], "last_block": row[1], "synced_at": row[2]}
+
+    def _deployment_block(self, w3: Web3, contract: str, head: int) -> int:
+        """First block with code at the contract address, by binary search (needs historical state)"""
+        if not w3.eth.get_code(contract, head):
+            raise ValueError(f"No contract at {contract}")
+        low, high = 0, head
+        while low < high:
+            middle = (low + high) // 2
+            if w3.eth.get_code(contract, middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _start_block(self, w3: Web3, contract: str, head: int) -> int:
+        start_block = os.getenv("TOKEN_INDEX_START_BLOCK")
+        if start_block:
+            return int(start_block)
+        try:
+            return self._deployment_block(w3, contract, head)
+        except ValueError:
+            raise
+        except Exception as e:
+            # Nodes without historical state can't answer get_code at old blocks
+            print(f"Could not find deployment block of {contract} ({e}); indexing from genesis")
+            return 0
+
+    def _rollback(self, db: sqlite3.Connection, contract: str, block: int):
+        """Forget everything the index learned after block (caller commits)"""
+        changed = [row[0] for row in db.execute(
+            "SELECT DISTINCT token_id FROM transfers WHERE contract = ? AND block_number > ?", (contract, block)
+        )]
+        db.execute("DELETE FROM transfers WHERE contract = ? AND block_number > ?", (contract, block))
+        db.execute("DELETE FROM tokens WHERE contract = ? AND minted_block > ?", (contract, block))
+        for token_id in changed:
+            last = db.execute(
+                "SELECT to_address FROM transfers WHERE contract = ? AND token_id = ? "
+                "ORDER BY block_number DESC, log_index DESC LIMIT 1", (contract, token_id)
+            ).fetchone()
+            if last is None:
+                db.execute("DELETE FROM tokens WHERE contract = ? AND token_id = ?", (contract, token_id))
+            else:
+                db.execute("UPDATE tokens SET owner = ? WHERE contract = ? AND token_id = ?",
+                           (None if last[0] == ZERO_ADDRESS else last[0], contract, token_id))
+        db.execute("DELETE FROM index_blocks WHERE contract = ? AND number > ?", (contract, block))
+        db.execute("UPDATE index_state SET last_block = ? WHERE contract = ?", (block, contract))
+
+    def _check_reorg(self, w3: Web3, contract: str, last_block: int, start_block: int) -> Optional[int]:
+        """
+        Roll back to the newest stored block whose hash still matches the chain.
+        Returns the block rolled back to, or None when there was no reorg.
+        """
+        db = self._connect()
+        checkpoints = db.execute(
+            "SELECT number, hash FROM index_blocks WHERE contract = ? ORDER BY number DESC", (contract,)
+        ).fetchall()
+        if not checkpoints:
+            return None
+        for position, (number, block_hash) in enumerate(checkpoints):
+            try:
+                current = Web3.to_hex(w3.eth.get_block(number)["hash"])
+            except Exception:
+                current = None  # the block is gone from a shorter chain
+            if current == block_hash:
+                if position == 0:
+                    return None
+                rollback_to = number
+                break
+        else:
+            # Every checkpoint changed: assume blocks deeper than the reorg depth are final
+            rollback_to = max(start_block - 1, last_block - self.reorg_depth)
+        print(f"Reorg detected for {contract}: rolling token index back from block {last_block} to {rollback_to}")
+        with db:
+            self._rollback(db, contract, rollback_to)
+        self.reorgs += 1
+        return rollback_to
+
+    def _get_logs(self, w3: Web3, contract: str, from_block: int, to_block: int):
+        return w3.eth.get_logs({
+            "address": contract,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [[Web3.to_hex(TRANSFER_TOPIC), Web3.to_hex(NFT_MINTED_TOPIC)]],
+        })
+
+    def _apply(self, db: sqlite3.Connection, contract: str, logs):
+        """Write a chunk's logs to the index (caller commits)"""
+        for log in sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"])):
+            event = decode_log(log)
+            if event is None:
+                continue
+            token_id = event["token_id"]
+            if event["event"] == "Transfer":
+                from_address, to_address = event["from"], event["to"]
+                db.execute(
+                    "INSERT OR IGNORE INTO transfers (contract, block_number, log_index, token_id, from_address, "
+                    "to_address, tx_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (contract, log["blockNumber"], log["logIndex"], token_id, from_address, to_address,
+                     Web3.to_hex(log["transactionHash"]))
+                )
+                db.execute(
+                    "INSERT INTO tokens (contract, token_id, owner, minted_block) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (contract, token_id) DO UPDATE SET owner = excluded.owner",
+                    (contract, token_id, None if to_address == ZERO_ADDRESS else to_address,
+                     log["blockNumber"] if from_address == ZERO_ADDRESS else None)
+                )
+            else:
+                db.execute(
+                    "INSERT INTO tokens (contract, token_id, owner, token_uri, minted_block) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (contract, token_id) DO UPDATE SET token_uri = excluded.token_uri, "
+                    "minted_block = excluded.minted_block",
+                    (contract, token_id, event["recipient"], event["token_uri"], log["blockNumber"])
+                )
+            if log["blockNumber"] > 0:
+                db.execute("INSERT OR REPLACE INTO index_blocks (contract, number, hash) VALUES (?, ?, ?)",
+                           (contract, log["blockNumber"], Web3.to_hex(log["blockHash"])))
+            self.logs_indexed += 1
+
+    def sync(self, w3: Web3, contract_address: str, max_age: float = 0) -> Dict:
+        """
+        Index new logs of a contract, up to max_blocks_per_sync blocks
+
+        Args:
+            w3: Connected Web3 instance
+            contract_address: GLBNFT contract
+            max_age: Skip syncing when the last sync is at most this many seconds old
+
+        Returns:
+            Dict with the last indexed block, the chain head, blocks still behind,
+            logs indexed and the block a reorg rolled back to (if any)
+        """
+        contract = Web3.to_checksum_address(contract_address)
+        with self._sync_lock(contract):
+            state = self.state(contract)
+            if state and time.time() - state["synced_at"] <= max_age:
+                return {"contract": contract, "last_block": state["last_block"], "head": None,
+                        "behind": None, "logs": 0, "reorged_to": None, "skipped": True}
+
+            head = w3.eth.block_number
+            db = self._connect()
+            if state is None:
+                start_block = self._start_block(w3, contract, head)
+                with db:
+                    db.execute(
+                        "INSERT INTO index_state (contract, start_block, last_block, synced_at) VALUES (?, ?, ?, ?)",
+                        (contract, start_block, start_block - 1, 0)
+                    )
+                state = {"start_block": start_block, "last_block": start_block - 1}
+                reorged_to = None
+            else:
+                reorged_to = self._check_reorg(w3, contract, state["last_block"], state["start_block"])
+                if reorged_to is not None:
+                    state["last_block"] = reorged_to
+
+            logs_before = self.logs_indexed
+            target = min(head, state["last_block"] + self.max_blocks_per_sync)
+            from_block = state["last_block"] + 1
+            chunk = self.chunk_blocks
+            while from_block <= target:
+                to_block = min(target, from_block + chunk - 1)
+                try:
+                    logs = self._get_logs(w3, contract, from_block, to_block)
+                except Exception as e:
+                    if chunk == 1:
+                        raise
+                    # Nodes cap the block range or result count of eth_getLogs
+                    chunk = max(1, chunk // 2)
+                    print(f"eth_getLogs {from_block}-{to_block} failed ({e}), retrying with {chunk} blocks")
+                    continue
+                with db:
+                    self._apply(db, contract, logs)
+                    db.execute("UPDATE index_state SET last_block = ? WHERE contract = ?", (to_block, contract))
+                from_block = to_block + 1
+
+            if target >= state["last_block"] + 1 and target > head - self.reorg_depth:
+                # A checkpoint at the tip catches reorgs even when no logs landed near it
+                tip_hash = Web3.to_hex(w3.eth.get_block(target)["hash"])
+                with db:
+                    db.execute("INSERT OR REPLACE INTO index_blocks (contract, number, hash) VALUES (?, ?, ?)",
+                               (contract, target, tip_hash))
+            with db:
+                db.execute("DELETE FROM index_blocks WHERE contract = ? AND number < ?",
+                           (contract, target - self.reorg_depth))
+                db.execute("UPDATE index_state SET synced_at = ? WHERE contract = ?", (time.time(), contract))
+
+            return {"contract": contract, "last_block": max(target, state["last_block"]), "head": head,
+                    "behind": head - max(target, state["last_block"]), "logs": self.logs_indexed - logs_before,
+                    "reorged_to": reorged_to, "skipped": False}
+
+    def owner_tokens(self, contract_address: str, owner_address: str) -> List[Dict]:
+        """Tokens currently owned by owner_address, by token id"""
+        rows = self._connect().execute(
+            "SELECT token_id, token_uri, minted_block FROM tokens WHERE contract = ? AND owner = ? ORDER BY token_id",
+            (Web3.to_checksum_address(contract_address), Web3.to_checksum_address(owner_address))
+        ).fetchall()
+        return [{"token_id": row[0], "token_uri": row[1], "minted_block": row[2]} for row in rows]
+
+    def tokens(self, contract_address: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """A page of the collection, by token id"""
+        rows = self._connect().execute(
+            "SELECT token_id, owner, token_uri, minted_block FROM tokens WHERE contract = ? "
+            "ORDER BY token_id LIMIT ? OFFSET ?",
+            (Web3.to_checksum_address(contract_address), limit, offset)
+        ).fetchall()
+        return [{"token_id": row[0], "owner": row[1], "token_uri": row[2], "minted_block": row[3]} for row in rows]
+
+    def token(self, contract_address: str, token_id: int) -> Optional[Dict]:
+        """One token with its transfer history, or None if it isn't indexed"""
+        contract = Web3.to_checksum_address(contract_address)
+        db = self._connect()
+        row = db.execute(
+            "SELECT owner, token_uri, minted_block FROM tokens WHERE contract = ? AND token_id = ?", (contract, token_id)
+        ).fetchone()
+        if row is None:
+            return None
+        transfers = db.execute(
+            "SELECT block_number, from_address, to_address, tx_hash FROM transfers WHERE contract = ? AND token_id = ? "
+            "ORDER BY block_number, log_index", (contract, token_id)
+        ).fetchall()
+        return {
+            "token_id": token_id,
+            "owner": row[0],
+            "token_uri": row[1],
+            "minted_block": row[2],
+            "transfers": [{"block_number": t[0], "from": t[1], "to": t[2], "tx_hash": t[3]} for t in transfers],
+        }
+
+    def stats(self, contract_address: str = None) -> Dict:
+        """Indexing progress and token counts, for one contract or all of them"""
+        db = self._connect()
+        query = "SELECT contract, start_block, last_block, synced_at FROM index_state"
+        params = ()
+        if contract_address:
+            query += " WHERE contract = ?"
+            params = (Web3.to_checksum_address(contract_address),)
+        contracts = {}
+        for contract, start_block, last_block, synced_at in db.execute(query, params).fetchall():
+            total, owned = db.execute(
+                "SELECT COUNT(*), COUNT(owner) FROM tokens WHERE contract = ?", (contract,)
+            ).fetchone()
+            contracts[contract] = {"start_block": start_block, "last_block": last_block, "synced_at": synced_at,
+                                   "tokens": total, "owned_tokens": owned}
+        return {"contracts": contracts, "logs_indexed": self.logs_indexed, "reorgs": self.reorgs}
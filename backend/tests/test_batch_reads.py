@@ -0,0 +1,121 @@
+"""BatchReader's JSON-RPC batches against a scripted provider: transient failures are retried, not fatal"""
+
+import pytest
+import requests
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from utils import batch_reads
+from utils.batch_reads import BatchReader
+
+TOKEN = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+BALANCE_OF_ABI = [{"type": "function", "name": "balanceOf", "stateMutability": "view",
+                   "inputs": [{"name": "account", "type": "address"}],
+                   "outputs": [{"name": "", "type": "uint256"}]}]
+
+def rate_limited(request_id=0):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32005, "message": "daily request count exceeded"}}
+
+class ScriptedProvider(BaseProvider):
+    """
+    Answers balanceOf(account) with the account's last byte. Each batch request
+    consumes the next scripted failure: an exception to raise, a single error
+    object to return instead of the list, or a function rewriting the responses.
+    """
+
+    def __init__(self, failures=()):
+        super().__init__()
+        self.failures = list(failures)
+        self.batches = []
+        self.single_requests = 0
+
+    def _answer(self, request_id, params):
+        balance = int(params[0]["data"][-2:], 16)
+        return {"jsonrpc": "2.0", "id": request_id, "result": "0x" + balance.to_bytes(32, "big").hex()}
+
+    def make_request(self, method, params):
+        self.single_requests += 1
+        return self._answer(0, params)
+
+    def make_batch_request(self, batch):
+        self.batches.append(len(batch))
+        failure = self.failures.pop(0) if self.failures else None
+        if isinstance(failure, Exception):
+            raise failure
+        if isinstance(failure, dict):
+            return failure
+        responses = [self._answer(i, params) for i, (_, params) in enumerate(batch)]
+        return failure(responses) if failure else responses
+
+@pytest.fixture(autouse=True)
+def no_retry_delays(monkeypatch):
+    monkeypatch.setattr(batch_reads, "BATCH_RETRY_DELAYS", (0, 0, 0))
+
+def read(provider, count=4):
+    w3 = Web3(provider)
+    token = w3.eth.contract(address=TOKEN, abi=BALANCE_OF_ABI)
+    reader = BatchReader(w3, rpc_batch_size=100, multicall_address=None)
+    accounts = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, count + 1)]
+    return reader, reader.read_many([token.functions.balanceOf(account) for account in accounts], block=1)
+
+def expected(count=4):
+    return [(True, i) for i in range(1, count + 1)]
+
+@pytest.mark.parametrize("failure", [
+    requests.exceptions.ReadTimeout("read timed out"),
+    requests.exceptions.HTTPError("429 Client Error: Too Many Requests"),
+    rate_limited(),
+])
+def test_transient_batch_failure_is_retried(failure):
+    provider = ScriptedProvider([failure])
+    reader, results = read(provider)
+    assert results == expected()
+    assert provider.batches == [4, 4]
+    assert provider.single_requests == 0
+    assert reader._batching
+
+def test_rate_limited_calls_are_retried_alone():
+    def limit_second(responses):
+        responses[1] = rate_limited(1)
+        return responses
+
+    provider = ScriptedProvider([limit_second])
+    _, results = read(provider)
+    assert results == expected()
+    assert provider.batches == [4, 1]
+
+def test_persistent_failure_falls_back_for_that_chunk_only():
+    provider = ScriptedProvider([requests.exceptions.ConnectTimeout("timed out")] * 4)
+    reader, results = read(provider)
+    assert results == expected()
+    assert provider.batches == [4, 4, 4, 4]
+    assert provider.single_requests == 4
+    # The next read goes back to batching
+    assert reader._batching
+    results = reader.read_many([reader.w3.eth.contract(address=TOKEN, abi=BALANCE_OF_ABI)
+                                .functions.balanceOf(Web3.to_checksum_address(f"0x{7:040x}"))], block=1)
+    assert results == [(True, 7)]
+    assert provider.batches[-1] == 1
+
+@pytest.mark.parametrize("failure", [
+    NotImplementedError("Providers must implement this method"),
+    {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "invalid request"}},
+    {"jsonrpc": "2.0", "id": None, "error": {"code": -32000, "message": "batch requests are not supported"}},
+])
+def test_unsupported_batches_switch_to_single_requests(failure):
+    provider = ScriptedProvider([failure])
+    reader, results = read(provider)
+    assert results == expected()
+    assert provider.batches == [4]
+    assert provider.single_requests == 4
+    assert not reader._batching
+
+def test_reverted_calls_fail_without_retrying():
+    def revert_first(responses):
+        responses[0] = {"jsonrpc": "2.0", "id": 0, "error": {"code": 3, "message": "execution reverted"}}
+        return responses
+
+    provider = ScriptedProvider([revert_first])
+    _, results = read(provider)
+    assert results == [(False, None)] + expected()[1:]
+    assert provider.batches == [4]
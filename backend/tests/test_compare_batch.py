@@ -0,0 +1,73 @@
+"""POST /maps/compare-batch scores every readable candidate even when Strava refuses some of them"""
+
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import map as maps
+from services.strava_service import StravaError
+from utils import supabase_auth
+
+SECRET = "test-jwt-secret-of-at-least-32-bytes"
+ROUTE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+# Activity id -> summary polyline, or the error Strava answers with
+ACTIVITIES = {
+    1: ROUTE,
+    2: StravaError(404, "Record Not Found"),
+    3: StravaError(429, "Rate Limit Exceeded", retry_after=60),
+    4: ROUTE,
+    5: StravaError(403, "Forbidden"),
+}
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(supabase_auth, "SUPABASE_JWT_SECRET", SECRET)
+
+    async def get_access_token(user_id):
+        return "strava-access-token"
+
+    async def get_activity_polyline(activity_id, access_token):
+        activity = ACTIVITIES[activity_id]
+        if isinstance(activity, StravaError):
+            raise activity
+        return activity
+
+    monkeypatch.setattr(maps.token_store, "get_access_token", get_access_token)
+    monkeypatch.setattr(maps.strava_service, "get_activity_polyline", get_activity_polyline)
+    app = FastAPI()
+    app.include_router(maps.router)
+    token = jwt.encode({"sub": "alice", "aud": "authenticated", "exp": int(time.time()) + 3600}, SECRET, "HS256")
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"})
+
+def test_unreadable_candidates_fail_on_their_own(client):
+    response = client.post("/maps/compare-batch", json={
+        "reference_activity_id": 4,
+        "candidate_polylines": [ROUTE],
+        "candidate_activity_ids": [1, 2, 3],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["matched"]) == (4, 2)
+    results = body["results"]
+    assert [(result["index"], result["activity_id"], result["match"]) for result in results] == [
+        (0, None, True), (1, 1, True), (2, 2, False), (3, 3, False)
+    ]
+    assert results[1]["error"] is None
+    assert results[2]["error"] == "Strava API error: Record Not Found"
+    assert results[3]["error"] == "Strava API error: Rate Limit Exceeded"
+
+def test_every_candidate_unreadable(client):
+    response = client.post("/maps/compare-batch", json={"reference_polyline": ROUTE, "candidate_activity_ids": [2, 5]})
+    assert response.status_code == 200
+    assert response.json()["matched"] == 0
+    assert [result["error"] for result in response.json()["results"]] == [
+        "Strava API error: Record Not Found", "Strava API error: Forbidden"
+    ]
+
+def test_unreadable_reference_fails_the_request(client):
+    response = client.post("/maps/compare-batch", json={"reference_activity_id": 5, "candidate_activity_ids": [1, 4]})
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Strava API error: Forbidden"
@@ -0,0 +1,96 @@
+"""Concurrent single mints and mint jobs on a local eth-tester chain, and token id decoding from receipts"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_abi import encode as abi_encode
+from web3 import Web3
+
+from services.mint_jobs import MintJobs
+from utils.nft_events import NFT_MINTED_TOPIC, TRANSFER_TOPIC, ZERO_ADDRESS, minted_token_ids
+
+CONTRACT = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+def assert_uris_on_chain(nft, contract_address, minted):
+    """Every (token id, recipient, token URI) is on chain, with no token id handed out twice"""
+    contract = nft.provider.contract(contract_address)
+    token_ids = [token_id for token_id, _, _ in minted]
+    assert sorted(token_ids) == list(range(len(minted)))
+    for token_id, recipient, token_uri in minted:
+        assert contract.functions.ownerOf(token_id).call() == recipient
+        assert contract.functions.tokenURI(token_id).call() == token_uri
+
+def test_parallel_mints_get_their_own_token_ids(nft, glbnft):
+    contract_address = nft.deploy_contract()
+    accounts = nft.provider.w3().eth.accounts
+
+    def mint(i):
+        return nft.mint_floating_line(nft.MintFloatingLineRequest(
+            polyline=f"line-{i}", recipient=accounts[1 + i % 3], contract_address=contract_address
+        ))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(mint, range(16)))
+
+    assert [response["token_uri"] for response in responses] == [f"walrus://metadata/line-{i}" for i in range(16)]
+    assert_uris_on_chain(nft, contract_address, [
+        (response["token_id"], accounts[1 + i % 3], response["token_uri"])
+        for i, response in enumerate(responses)
+    ])
+    assert nft.provider.nonce_manager().stats()["in_flight"] == {}
+
+def test_parallel_mint_jobs_get_their_own_token_ids(nft, glbnft, monkeypatch):
+    monkeypatch.setattr(nft, "mint_jobs", MintJobs(max_workers=8))
+    contract_address = nft.deploy_contract()
+    accounts = nft.provider.w3().eth.accounts
+
+    jobs = [nft.create_mint_job(nft.MintJobRequest(
+        polyline=f"job-{i}", recipient=accounts[1 + i % 3], contract_address=contract_address
+    ))["job_id"] for i in range(12)]
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        finished = [nft.get_mint_job(job_id) for job_id in jobs]
+        if all(job["status"] in ("minted", "failed") for job in finished):
+            break
+        time.sleep(0.05)
+
+    assert [job["status"] for job in finished] == ["minted"] * 12
+    assert_uris_on_chain(nft, contract_address, [
+        (job["result"]["token_id"], accounts[1 + i % 3], job["result"]["token_uri"])
+        for i, job in enumerate(finished)
+    ])
+    assert [job["result"]["token_uri"] for job in finished] == [f"walrus://metadata/job-{i}" for i in range(12)]
+    assert all(job["tx_hash"] == job["result"]["tx_hash"] for job in finished)
+
+def address_topic(address):
+    return b"\x00" * 12 + Web3.to_bytes(hexstr=address)
+
+def transfer_log(sender, recipient, token_id, address=CONTRACT):
+    return {"address": address, "data": "0x",
+            "topics": [TRANSFER_TOPIC, address_topic(sender), address_topic(recipient), token_id.to_bytes(32, "big")]}
+
+def minted_log(recipient, token_id, token_uri, address=CONTRACT):
+    return {"address": address, "data": abi_encode(["string"], [token_uri]),
+            "topics": [NFT_MINTED_TOPIC, address_topic(recipient), token_id.to_bytes(32, "big")]}
+
+def test_token_ids_come_from_nft_minted_logs():
+    recipient = "0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF"
+    receipt = {"logs": [
+        transfer_log(ZERO_ADDRESS, recipient, 7), minted_log(recipient, 7, "walrus://a"),
+        transfer_log(ZERO_ADDRESS, recipient, 8), minted_log(recipient, 8, "walrus://b"),
+    ]}
+    assert minted_token_ids(receipt, CONTRACT) == [7, 8]
+
+def test_token_ids_fall_back_to_transfers_from_the_zero_address():
+    # Contracts without NFTMinted only emit the ERC-721 Transfer
+    recipient = "0x2B5AD5c4795c026514f8317c7a215E218DcCD6cF"
+    other_contract = "0x6813Eb9362372EEF6200f3b1dbC3f819671cBA69"
+    receipt = {"logs": [
+        transfer_log(ZERO_ADDRESS, recipient, 3),
+        transfer_log(recipient, other_contract, 1),  # a plain transfer, not a mint
+        transfer_log(ZERO_ADDRESS, recipient, 99, address=other_contract),
+        transfer_log(ZERO_ADDRESS, recipient, 4),
+    ]}
+    assert minted_token_ids(receipt, CONTRACT) == [3, 4]
+    assert minted_token_ids(receipt) == [3, 99, 4]
@@ -0,0 +1,68 @@
+"""Requests stop waiting for unmined transactions after MINT_CONFIRM_TIMEOUT"""
+
+import json
+import time
+from concurrent.futures import Future
+
+import pytest
+from web3 import Web3
+
+from conftest import wait_for
+
+def transfer(nft):
+    w3 = nft.provider.w3()
+    return {"from": nft.PUBLIC_ADDRESS, "to": w3.eth.accounts[1], "value": 1, "gas": 21000,
+            "chainId": nft.CHAIN_ID, **nft.provider.fee_oracle().fees()}
+
+def test_pending_transaction_keeps_its_nonce_until_it_settles(nft, held):
+    nonce_manager = nft.provider.nonce_manager()
+    started = time.monotonic()
+    with pytest.raises(nft.ConfirmationPending) as pending:
+        nft.sign_send_wait(transfer(nft))
+    assert time.monotonic() - started < 5
+    assert nonce_manager.stats()["in_flight"] == {"0": pending.value.tx_hash}
+
+    held.set()
+    wait_for(lambda: nonce_manager.stats()["in_flight"] == {})
+    assert pending.value.future.result()[2].status == 1
+
+def test_failed_transaction_releases_its_nonce(nft, monkeypatch):
+    def dropped(tx, tx_hash):
+        future = Future()
+        future.set_exception(TimeoutError("dropped from the mempool"))
+        return future
+
+    def never_mined(tx):
+        return Web3.keccak(text=f"dropped-{tx['nonce']}")
+
+    monkeypatch.setattr(nft, "confirm", dropped)
+    monkeypatch.setattr(nft, "broadcast", never_mined)
+    with pytest.raises(TimeoutError):
+        nft.sign_send_wait(transfer(nft))
+    nonce_manager = nft.provider.nonce_manager()
+    assert nonce_manager.stats()["in_flight"] == {}
+    assert nonce_manager.allocate() == 0
+
+def test_pending_mint_is_followed_by_a_mint_job(nft, glbnft, held, monkeypatch):
+    monkeypatch.setattr(nft, "mint_jobs", nft.MintJobs())
+    held.set()
+    contract_address = nft.deploy_contract()
+    held.clear()
+    recipient = nft.provider.w3().eth.accounts[1]
+
+    response = nft.mint_floating_line(nft.MintFloatingLineRequest(
+        polyline="line", recipient=recipient, contract_address=contract_address
+    ))
+
+    assert response.status_code == 202
+    body = json.loads(response.body)
+    assert body["status_url"] == f"/nft/mint-jobs/{body['job_id']}"
+    assert nft.get_mint_job(body["job_id"])["tx_hash"] == body["tx_hash"]
+
+    held.set()
+    wait_for(lambda: nft.get_mint_job(body["job_id"])["status"] == "minted")
+    result = nft.get_mint_job(body["job_id"])["result"]
+    contract = nft.provider.contract(contract_address)
+    assert contract.functions.ownerOf(result["token_id"]).call() == recipient
+    assert contract.functions.tokenURI(result["token_id"]).call() == body["token_uri"]
+    assert nft.provider.nonce_manager().stats()["in_flight"] == {}
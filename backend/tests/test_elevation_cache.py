@@ -0,0 +1,78 @@
+"""fetch_elevation against an offline stand-in for the Google Elevation API"""
+
+import asyncio
+import threading
+
+import polyline
+import pytest
+
+from routes import dimension
+from services.elevation_cache import ElevationCache
+
+class FakeElevationProvider:
+    """Returns lat + lng as the elevation and records every batch it is asked for"""
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, locations):
+        with self._lock:
+            self.batches.append(list(locations))
+        return [lat + lng for lat, lng in locations]
+
+    @property
+    def locations(self):
+        return [location for batch in self.batches for location in batch]
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ElevationCache(":memory:", grid_deg=0.0001)
+    monkeypatch.setattr(dimension, "elevation_cache", cache)
+    return cache
+
+def fetch(coords, provider):
+    return asyncio.run(dimension.fetch_elevation(polyline.encode(coords), provider=provider))
+
+def test_quantize_snaps_to_grid(cache):
+    cells = cache.quantize([(37.77491, -122.41941), (37.77494, -122.41944), (37.77496, -122.41941)])
+    assert cells[0] == cells[1] == (377749, -1224194)
+    assert cells[2] == (377750, -1224194)
+    assert cache.cell_centers(cells[:1]) == [(37.7749, -122.4194)]
+
+def test_only_uncached_cells_go_upstream(cache):
+    provider = FakeElevationProvider()
+    # The first two points share a grid cell
+    route = [(37.77491, -122.41941), (37.77492, -122.41942), (37.7760, -122.4200), (37.7800, -122.4300)]
+
+    coords_3d = fetch(route, provider)
+    assert len(coords_3d) == len(route)
+    assert sorted(provider.locations) == sorted(cache.cell_centers(set(cache.quantize(route))))
+    assert len(provider.locations) == 3
+    # Every point gets the elevation of its cell's grid point
+    assert coords_3d[0][2] == coords_3d[1][2] == pytest.approx(37.7749 - 122.4194)
+    assert cache.stats()["misses"] == 3
+
+    provider.batches.clear()
+    assert fetch(route, provider) == coords_3d
+    assert provider.batches == []
+    assert cache.stats()["hits"] == 3
+
+    # A route overlapping the cached one only fetches its new cell
+    fetch([(37.7760, -122.4200), (37.7900, -122.4400)], provider)
+    assert provider.locations == [(37.79, -122.44)]
+
+def test_batches_respect_size_and_url_limits(cache, monkeypatch):
+    provider = FakeElevationProvider()
+    monkeypatch.setattr(dimension, "ELEVATION_BATCH_SIZE", 4)
+    route = [(37.77 + i * 0.001, -122.41 - i * 0.001) for i in range(10)]
+
+    fetch(route, provider)
+    assert sorted(len(batch) for batch in provider.batches) == [2, 4, 4]
+    assert len(provider.locations) == 10
+
+    # "37.xxxx,-122.xxxx|" is about 19 characters, so a 40 character limit allows two points per batch
+    monkeypatch.setattr(dimension, "ELEVATION_MAX_URL_CHARS", 40)
+    batches = list(dimension.elevation_batches(cache.cell_centers(cache.quantize(route))))
+    assert [len(batch) for batch in batches] == [2] * 5
+    assert all(sum(len(f"{lat},{lng}|") for lat, lng in batch) <= 40 for batch in batches)
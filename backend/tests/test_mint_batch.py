@@ -0,0 +1,94 @@
+"""POST /nft/mint-batch against GLBNFT on a local eth-tester chain"""
+
+import json
+from concurrent.futures import Future
+
+from web3 import Web3
+
+from conftest import wait_for
+
+def batch_request(nft, count, contract_address=""):
+    w3 = nft.provider.w3()
+    return nft.MintBatchRequest(
+        mints=[nft.BatchMint(polyline=f"line-{i}", recipient=w3.eth.accounts[1 + i % 3]) for i in range(count)],
+        contract_address=contract_address,
+    )
+
+def assert_minted_on_chain(nft, response):
+    contract = nft.provider.contract(response["contract_address"])
+    for result in response["results"]:
+        assert result["error"] is None
+        assert contract.functions.ownerOf(result["token_id"]).call() == result["recipient"]
+        assert contract.functions.tokenURI(result["token_id"]).call() == result["token_uri"]
+
+def test_batch_mints_every_token_in_one_transaction(nft, glbnft):
+    response = nft.mint_batch(batch_request(nft, 5))
+
+    assert response["mode"] == "batch"
+    assert len(response["transactions"]) == 1
+    assert response["transactions"][0]["token_count"] == 5
+    assert [result["token_id"] for result in response["results"]] == [0, 1, 2, 3, 4]
+    assert [result["token_uri"] for result in response["results"]] == [f"walrus://metadata/line-{i}" for i in range(5)]
+    assert_minted_on_chain(nft, response)
+    assert nft.provider.nonce_manager().stats()["in_flight"] == {}
+
+def test_batches_are_split_to_fit_the_gas_limit(nft, glbnft, monkeypatch):
+    contract_address = nft.deploy_contract()
+    w3 = nft.provider.w3()
+    base, per_token = nft.batch_gas(nft.provider.contract(contract_address), w3.eth.accounts[1:3], ["walrus://a", "walrus://b"])
+    assert per_token > 0
+    # Room for two tokens (plus the 20% headroom) per transaction
+    monkeypatch.setattr(nft, "MINT_BATCH_GAS_LIMIT", int((base + 2.5 * per_token) * 1.2))
+
+    response = nft.mint_batch(batch_request(nft, 5, contract_address))
+
+    assert response["mode"] == "batch"
+    assert [tx["token_count"] for tx in response["transactions"]] == [2, 2, 1]
+    assert all(tx["gas_used"] <= nft.MINT_BATCH_GAS_LIMIT for tx in response["transactions"])
+    assert [result["token_id"] for result in response["results"]] == [0, 1, 2, 3, 4]
+    assert_minted_on_chain(nft, response)
+
+def test_unconfirmed_batch_releases_its_nonce(nft, glbnft, monkeypatch):
+    contract_address = nft.deploy_contract()
+    nonce_manager = nft.provider.nonce_manager()
+    deployed_nonce = nft.provider.w3().eth.get_transaction_count(nft.PUBLIC_ADDRESS)
+
+    def dropped(tx, tx_hash):
+        future = Future()
+        future.set_exception(TimeoutError("dropped from the mempool"))
+        return future
+
+    def never_mined(tx):
+        return Web3.keccak(text=f"dropped-{tx['nonce']}")
+
+    monkeypatch.setattr(nft, "confirm", dropped)
+    monkeypatch.setattr(nft, "broadcast", never_mined)
+    response = nft.mint_batch(batch_request(nft, 2, contract_address))
+
+    assert response["transactions"][0]["error"]
+    assert all(result["token_id"] is None for result in response["results"])
+    assert nonce_manager.stats()["in_flight"] == {}
+    # The next transaction reuses the nonce instead of queueing behind a gap
+    assert nonce_manager.allocate() == deployed_nonce
+
+def test_unmined_batch_answers_202_with_its_pending_hashes(nft, glbnft, held):
+    held.set()
+    contract_address = nft.deploy_contract()
+    held.clear()
+
+    response = nft.mint_batch(batch_request(nft, 3, contract_address))
+
+    assert response.status_code == 202
+    body = json.loads(response.body)
+    assert body["pending_tx_hashes"] == [body["transactions"][0]["tx_hash"]]
+    assert body["transactions"][0]["pending"]
+    assert all(result["token_id"] is None and result["error"] is None for result in body["results"])
+    nonce_manager = nft.provider.nonce_manager()
+    assert list(nonce_manager.stats()["in_flight"].values()) == body["pending_tx_hashes"]
+
+    # Once mined, the nonce is released and the tokens are on chain
+    held.set()
+    wait_for(lambda: nonce_manager.stats()["in_flight"] == {})
+    contract = nft.provider.contract(contract_address)
+    for token_id, result in enumerate(body["results"]):
+        assert contract.functions.tokenURI(token_id).call() == result["token_uri"]
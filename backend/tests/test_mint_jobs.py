@@ -0,0 +1,59 @@
+"""Mint job webhooks only go to public hosts or the configured allowlist"""
+
+import socket
+from urllib.parse import urlsplit
+
+import pytest
+
+from services import mint_jobs
+from services.mint_jobs import check_webhook_url
+
+@pytest.fixture
+def resolve(monkeypatch):
+    """Resolve hostnames from a table instead of DNS"""
+    table = {}
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host not in table:
+            raise socket.gaierror(f"unknown host {host}")
+        return [(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))
+                for address in table[host]]
+
+    monkeypatch.setattr(mint_jobs.socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(mint_jobs, "WEBHOOK_ALLOWED_HOSTS", set())
+    return table
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5:8080/hook",
+    "http://192.168.1.1/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_non_public_addresses_are_rejected(resolve, url):
+    host = urlsplit(url).hostname
+    resolve[host] = [host]
+    with pytest.raises(ValueError):
+        check_webhook_url(url)
+
+def test_hostnames_are_checked_by_every_address(resolve):
+    resolve["hooks.example.com"] = ["93.184.216.34"]
+    check_webhook_url("https://hooks.example.com/mint")
+
+    # One private address among public ones is enough to reject (DNS can rotate between them)
+    resolve["rebind.example.com"] = ["93.184.216.34", "10.1.2.3"]
+    with pytest.raises(ValueError):
+        check_webhook_url("https://rebind.example.com/mint")
+
+    with pytest.raises(ValueError):
+        check_webhook_url("https://unresolvable.example.com/mint")
+    with pytest.raises(ValueError):
+        check_webhook_url("file:///etc/passwd")
+
+def test_allowlist_replaces_address_checks(resolve, monkeypatch):
+    monkeypatch.setattr(mint_jobs, "WEBHOOK_ALLOWED_HOSTS", {"hooks.internal"})
+    check_webhook_url("http://hooks.internal/mint")
+    with pytest.raises(ValueError):
+        check_webhook_url("https://hooks.example.com/mint")
@@ -0,0 +1,53 @@
+"""NFTProvider readiness reporting while the chain is slow or unreachable"""
+
+import socket
+import threading
+import time
+
+import pytest
+from web3 import EthereumTesterProvider, Web3
+
+from services.nft_provider import NFTProvider, ProviderUnavailable
+
+ACCOUNT = "0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf"
+
+@pytest.fixture
+def silent_rpc():
+    """An RPC URL whose server accepts connections and never answers"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    yield f"http://127.0.0.1:{server.getsockname()[1]}"
+    server.close()
+
+def test_status_does_not_wait_for_a_hanging_rpc(silent_rpc):
+    provider = NFTProvider(silent_rpc, ACCOUNT, "0x" + "00" * 31 + "01", retry_interval=60)
+    connecting = threading.Thread(target=lambda: pytest.raises(ProviderUnavailable, provider.w3), daemon=True)
+    connecting.start()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    status = provider.status()
+    assert time.monotonic() - started < 1
+    assert status["chain"] == {"status": "initializing"}
+    assert not status["ready"]
+
+def test_failed_connection_is_reported_and_backed_off():
+    provider = NFTProvider("http://127.0.0.1:9", ACCOUNT, "0x" + "00" * 31 + "01", retry_interval=60)
+    with pytest.raises(ProviderUnavailable):
+        provider.w3()
+    assert provider.status()["chain"]["status"] == "error"
+    # Within retry_interval the stored error is raised without another connection attempt
+    started = time.monotonic()
+    with pytest.raises(ProviderUnavailable):
+        provider.w3()
+    assert time.monotonic() - started < 0.1
+
+def test_injected_client_is_ready():
+    w3 = Web3(EthereumTesterProvider())
+    provider = NFTProvider(public_address=ACCOUNT, w3=w3, walrus=object())
+    assert provider.w3() is w3
+    assert provider.nonce_manager().address == ACCOUNT
+    status = provider.status()
+    assert status["ready"]
+    assert status["chain"] == {"status": "ready"}
@@ -0,0 +1,94 @@
+"""NonceManager against a local eth-tester chain"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from web3 import EthereumTesterProvider, Web3
+
+from services.nonce_manager import NonceManager
+
+@pytest.fixture
+def w3():
+    return Web3(EthereumTesterProvider())
+
+@pytest.fixture
+def sender(w3):
+    return w3.eth.accounts[0]
+
+def transfer(w3, sender, value=1):
+    return {"from": sender, "to": w3.eth.accounts[1], "value": value, "gas": 21000,
+            "maxFeePerGas": Web3.to_wei(10, "gwei"), "maxPriorityFeePerGas": Web3.to_wei(1, "gwei")}
+
+def test_concurrent_sends_get_consecutive_nonces(w3, sender):
+    manager = NonceManager(w3, sender)
+
+    def send(i):
+        tx, tx_hash = manager.send(transfer(w3, sender, i + 1), w3.eth.send_transaction)
+        manager.confirmed(tx["nonce"])
+        return tx["nonce"], w3.eth.get_transaction_receipt(tx_hash)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sent = list(pool.map(send, range(32)))
+
+    assert sorted(nonce for nonce, _ in sent) == list(range(32))
+    assert all(receipt.status == 1 for _, receipt in sent)
+    assert w3.eth.get_transaction_count(sender) == 32
+    assert manager.stats()["in_flight"] == {}
+    # One read of the pending count served every allocation
+    assert manager.resyncs == 1
+
+def test_out_of_band_transaction_is_skipped(w3, sender):
+    manager = NonceManager(w3, sender)
+    tx, _ = manager.send(transfer(w3, sender), w3.eth.send_transaction)
+    manager.confirmed(tx["nonce"])
+
+    # Another sender process uses the next nonce behind the manager's back
+    w3.eth.send_transaction(dict(transfer(w3, sender), nonce=1))
+
+    tx, tx_hash = manager.send(transfer(w3, sender), w3.eth.send_transaction)
+    assert tx["nonce"] == 2
+    assert w3.eth.get_transaction_receipt(tx_hash).status == 1
+    assert manager.resyncs == 2
+
+def test_dropped_transaction_nonce_is_reused_after_resync(w3, sender):
+    manager = NonceManager(w3, sender)
+
+    def dropped(tx):
+        # Accepted by the node, then dropped from its mempool before being mined
+        return Web3.keccak(text=f"dropped-{tx['nonce']}")
+
+    tx, _ = manager.send(transfer(w3, sender), dropped)
+    assert tx["nonce"] == 0
+    assert manager.stats()["in_flight"] == {"0": Web3.to_hex(Web3.keccak(text="dropped-0"))}
+
+    # Without a release, every later transaction would queue behind the missing nonce 0
+    manager.abandoned(tx["nonce"])
+    tx, tx_hash = manager.send(transfer(w3, sender), w3.eth.send_transaction)
+    assert tx["nonce"] == 0
+    assert w3.eth.get_transaction_receipt(tx_hash).status == 1
+
+def test_resync_releases_gaps_but_keeps_in_flight_nonces(w3, sender):
+    manager = NonceManager(w3, sender)
+    held = manager.allocate()
+    lost = manager.allocate()
+    assert (held, lost) == (0, 1)
+    manager.sent(held, "0x01")
+    manager.sent(lost, "0x02")
+    manager.confirmed(lost)  # e.g. popped without ever being mined
+
+    manager.resync()
+    # Nonce 0 is still awaited; nonce 1 is unknown to the node and free again
+    assert manager.stats()["released"] == [1]
+    assert manager.allocate() == 1
+    assert manager.allocate() == 2
+
+def test_failed_broadcast_releases_its_nonce(w3, sender):
+    manager = NonceManager(w3, sender)
+
+    def rejected(tx):
+        raise ValueError("insufficient funds for gas * price + value")
+
+    with pytest.raises(ValueError):
+        manager.send(transfer(w3, sender), rejected)
+    tx, _ = manager.send(transfer(w3, sender), w3.eth.send_transaction)
+    assert tx["nonce"] == 0
@@ -0,0 +1,61 @@
+"""ReceiptPoller keeps batching through transient batch failures on a local eth-tester chain"""
+
+import pytest
+import requests
+from web3 import EthereumTesterProvider, Web3
+from web3.providers.base import JSONBaseProvider
+
+from services.receipt_poller import ReceiptPoller
+from utils import batch_reads
+
+class FlakyBatchProvider(EthereumTesterProvider, JSONBaseProvider):
+    """eth-tester with JSON-RPC batches; each batch consumes the next scripted exception (None to succeed)"""
+
+    def __init__(self, failures=()):
+        super().__init__()
+        self.failures = list(failures)
+        self.batches = 0
+
+    def make_batch_request(self, batch):
+        self.batches += 1
+        failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            raise failure
+        return [dict(self.make_request(method, params), id=i) for i, (method, params) in enumerate(batch)]
+
+@pytest.fixture(autouse=True)
+def no_retry_delays(monkeypatch):
+    monkeypatch.setattr(batch_reads, "BATCH_RETRY_DELAYS", (0, 0, 0))
+
+def confirm_transfer(w3, poller):
+    tx_hash = w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": w3.eth.accounts[1], "value": 1})
+    # eth-tester's camelCase formatting is middleware that batches skip, so only fields named alike are compared
+    assert poller.wait(tx_hash).result(timeout=10)["status"] == 1
+
+@pytest.mark.parametrize("failures", [
+    # A timeout on the receipt check, retried within the poll
+    [requests.exceptions.ReadTimeout("read timed out")],
+    # Every retry of the check fails: this poll checks receipts individually
+    [requests.exceptions.HTTPError("429 Client Error: Too Many Requests")] * 4,
+    # The batch fetching the formatted receipt drops its connection
+    [None, requests.exceptions.ConnectionError("connection reset")],
+])
+def test_transient_batch_failures_keep_batching(failures):
+    w3 = Web3(FlakyBatchProvider(failures))
+    poller = ReceiptPoller(w3, interval=0.01)
+    confirm_transfer(w3, poller)
+    assert w3.provider.failures == []
+    assert poller.stats()["batching"]
+
+    # The next poll is batched again: one batch finds the receipt, one fetches it
+    batches = w3.provider.batches
+    confirm_transfer(w3, poller)
+    assert w3.provider.batches == batches + 2
+
+def test_unsupported_batches_switch_to_single_requests():
+    w3 = Web3(FlakyBatchProvider([NotImplementedError("Providers must implement this method")]))
+    poller = ReceiptPoller(w3, interval=0.01)
+    confirm_transfer(w3, poller)
+    confirm_transfer(w3, poller)
+    assert not poller.stats()["batching"]
+    assert w3.provider.batches == 1
@@ -0,0 +1,98 @@
+"""Per-user Strava tokens: callers are identified by their Supabase JWT, and refreshes race safely across workers"""
+
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import map as maps
+from services.strava_service import StravaError
+from services.strava_token_store import SQLiteTokenBackend, StravaTokenStore
+from utils import supabase_auth
+
+SECRET = "test-jwt-secret-of-at-least-32-bytes"
+
+def access_token(user_id, secret=SECRET, expires_in=3600):
+    return jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + expires_in}, secret, "HS256")
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(supabase_auth, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(maps, "STRAVA_ALLOW_ANONYMOUS", False)
+    looked_up = []
+
+    async def get_access_token(user_id):
+        looked_up.append(user_id)
+        return None
+
+    monkeypatch.setattr(maps.token_store, "get_access_token", get_access_token)
+    app = FastAPI()
+    app.include_router(maps.router)
+    client = TestClient(app)
+    client.looked_up = looked_up
+    return client
+
+def test_strava_tokens_follow_the_signed_in_user(client):
+    response = client.get("/maps/", params={"activity_id": 1, "user_id": "victim"},
+                          headers={"Authorization": f"Bearer {access_token('alice')}"})
+    assert response.status_code == 401
+    assert "complete OAuth" in response.json()["detail"]
+    assert client.looked_up == ["alice"]
+
+def test_unauthenticated_and_forged_callers_are_rejected(client):
+    assert client.get("/maps/", params={"activity_id": 1}).status_code == 401
+    forged = access_token("victim", secret="not-the-project-secret-but-just-as-long")
+    assert client.get("/maps/", params={"activity_id": 1}, headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    expired = access_token("victim", expires_in=-60)
+    assert client.get("/maps/", params={"activity_id": 1}, headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+    assert client.looked_up == []
+
+def test_polyline_comparison_needs_no_session(client):
+    route = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    response = client.post("/maps/compare", json={"polyline1": route, "polyline2": route})
+    assert response.status_code == 200
+    assert response.json()["match"] is True
+
+class RotatingStrava:
+    """Strava's refresh grant: each refresh issues a new refresh token and revokes the one used"""
+
+    def __init__(self, refresh_token):
+        self.valid = refresh_token
+        self.calls = 0
+
+    async def oauth_token(self, grant_type, refresh_token, **credentials):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if refresh_token != self.valid:
+            raise StravaError(400, "invalid refresh token")
+        self.valid = f"refresh-{self.calls}"
+        return {"access_token": f"access-{self.calls}", "refresh_token": self.valid,
+                "expires_at": int(time.time()) + 21600 + self.calls}
+
+def test_workers_refreshing_the_same_user_keep_one_token_chain(tmp_path):
+    expiring = {"access_token": "access-0", "refresh_token": "refresh-0", "expires_at": int(time.time()) + 60}
+    strava = RotatingStrava("refresh-0")
+    # Two workers with their own stores and connections to the same SQLite file
+    workers = [StravaTokenStore(strava, SQLiteTokenBackend(str(tmp_path / "tokens.db"))) for _ in range(2)]
+    workers[0].backend.put("alice", expiring)
+
+    async def refresh_both():
+        return await asyncio.gather(*(worker._refresh("alice", dict(expiring)) for worker in workers))
+
+    first, second = asyncio.run(refresh_both())
+    stored = workers[0].backend.get("alice")
+    # The loser's refresh token was revoked by the winner; it adopts the winner's tokens instead of failing
+    assert first == second == stored
+    assert stored["refresh_token"] == strava.valid
+    assert sum(worker.refresh_conflicts for worker in workers) == 1
+
+def test_stale_refresh_does_not_overwrite_newer_tokens(tmp_path):
+    backend = SQLiteTokenBackend(str(tmp_path / "tokens.db"))
+    backend.put("alice", {"access_token": "a", "refresh_token": "r", "expires_at": 100})
+    newer = {"access_token": "b", "refresh_token": "r2", "expires_at": 200}
+    assert backend.replace("alice", newer, 100)
+    assert not backend.replace("alice", {"access_token": "c", "refresh_token": "r3", "expires_at": 300}, 100)
+    assert backend.get("alice") == newer
@@ -0,0 +1,221 @@
+"""
+Batched Contract Reads
+Runs many view calls (e.g. ownerOf for every token) as Multicall3 aggregate3 calls when the chain has
+Multicall3, otherwise as JSON-RPC batch requests, with a bounded number of batches in flight
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from eth_utils import get_abi_output_types
+from web3 import Web3
+
+# Multicall3 has the same address on nearly every chain (including Sepolia)
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+MULTICALL3_ABI = [{
+    "type": "function",
+    "name": "aggregate3",
+    "stateMutability": "payable",
+    "inputs": [{
+        "name": "calls",
+        "type": "tuple[]",
+        "components": [
+            {"name": "target", "type": "address"},
+            {"name": "allowFailure", "type": "bool"},
+            {"name": "callData", "type": "bytes"},
+        ],
+    }],
+    "outputs": [{
+        "name": "returnData",
+        "type": "tuple[]",
+        "components": [
+            {"name": "success", "type": "bool"},
+            {"name": "returnData", "type": "bytes"},
+        ],
+    }],
+}]
+
+# Seconds before each retry of a JSON-RPC batch that failed transiently (timeout, rate limit); after the last
+# one the calls still unanswered are read individually
+BATCH_RETRY_DELAYS = (0.5, 1, 2)
+# JSON-RPC error codes meaning "slow down" (-32005 is Infura's and Alchemy's "limit exceeded")
+RATE_LIMIT_CODES = {-32005, -32029, 429}
+# Errors a server gives for a batch it can't take at all: invalid request, method not found
+BATCH_UNSUPPORTED_CODES = {-32600, -32601}
+
+def _error(response) -> Optional[dict]:
+    error = response.get("error") if isinstance(response, dict) else None
+    return error if isinstance(error, dict) else None
+
+def _rate_limited(response) -> bool:
+    """Whether a JSON-RPC response is a rate limit error, worth retrying after a pause"""
+    error = _error(response)
+    if error is None:
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") in RATE_LIMIT_CODES or "rate limit" in message or "too many requests" in message
+
+def batch_unsupported(failure) -> bool:
+    """
+    Whether a failed batch (an exception, or the single error object a server
+    answers an unparsable batch with) means the provider can't do batches at
+    all, as opposed to a timeout, rate limit or other failure worth retrying
+    """
+    if isinstance(failure, (NotImplementedError, AttributeError)):
+        return True
+    if isinstance(failure, Exception):
+        # web3 raises Web3RPCError with the response attached; older versions pass the error dict as the argument
+        error = _error(getattr(failure, "rpc_response", None)) or (
+            failure.args[0] if failure.args and isinstance(failure.args[0], dict) else {}
+        )
+        message = str(error.get("message", failure)).lower()
+        code = error.get("code")
+    else:
+        error = _error(failure)
+        if error is None:
+            # Not a JSON-RPC error at all; nothing we can read batches from
+            return True
+        message, code = str(error.get("message", "")).lower(), error.get("code")
+    if code in RATE_LIMIT_CODES or "rate limit" in message:
+        return False
+    return code in BATCH_UNSUPPORTED_CODES or ("batch" in message and "not" in message and "support" in message)
+
+class BatchUnsupported(Exception):
+    """The provider can't take JSON-RPC batch requests at all"""
+
+def batch_request(provider, requests, responses) -> List[int]:
+    """
+    Send requests as one JSON-RPC batch, filling in responses. Timeouts and rate
+    limits (of the whole batch or of single requests in it) are retried after
+    BATCH_RETRY_DELAYS.
+
+    Args:
+        provider: Web3 provider
+        requests: (method, params) pairs
+        responses: List as long as requests, filled in by index
+
+    Returns:
+        The indices still unanswered after the last retry, to send individually.
+        Raises BatchUnsupported when the provider can't do batches.
+    """
+    unanswered = list(range(len(requests)))
+    failure = None
+    for delay in (0,) + BATCH_RETRY_DELAYS:
+        time.sleep(delay)
+        try:
+            batch = provider.make_batch_request([requests[i] for i in unanswered])
+        except Exception as e:
+            batch = e
+        if not isinstance(batch, list):
+            failure = batch
+            if batch_unsupported(batch):
+                raise BatchUnsupported(str(batch))
+            continue
+        for i, response in zip(unanswered, batch):
+            responses[i] = response
+        # A short batch leaves its missing requests unanswered too
+        unanswered = [i for i in unanswered if responses[i] is None or _rate_limited(responses[i])]
+        if not unanswered:
+            return []
+        failure = responses[unanswered[0]]
+    print(f"Batch {requests[0][0]} still failing after {len(BATCH_RETRY_DELAYS)} retries ({failure}), "
+          f"sending {len(unanswered)} requests individually")
+    return unanswered
+
+class BatchReader:
+    """
+    Reads many contract view functions with few round trips. Every call in one
+    read_many() sees the same block. Failed calls (e.g. ownerOf on a token that
+    doesn't exist) come back as (False, None) instead of failing the batch.
+    """
+
+    def __init__(self, w3: Web3, rpc_batch_size: int = None, multicall_size: int = None,
+                 concurrency: int = None, multicall_address: str = MULTICALL3_ADDRESS):
+        """
+        Args:
+            w3: Connected Web3 instance
+            rpc_batch_size: eth_calls per JSON-RPC batch request (defaults to TRACKER_RPC_BATCH_SIZE or 100)
+            multicall_size: Calls per aggregate3 call (defaults to TRACKER_MULTICALL_SIZE or 500)
+            concurrency: Batches in flight at once (defaults to TRACKER_CONCURRENCY or 4)
+            multicall_address: Multicall3 deployment; None to always use JSON-RPC batches
+        """
+        self.w3 = w3
+        self.rpc_batch_size = rpc_batch_size or int(os.getenv("TRACKER_RPC_BATCH_SIZE", "100"))
+        self.multicall_size = multicall_size or int(os.getenv("TRACKER_MULTICALL_SIZE", "500"))
+        self.concurrency = concurrency or int(os.getenv("TRACKER_CONCURRENCY", "4"))
+        self.multicall_address = multicall_address
+        self._multicall = None
+        self._batching = True
+
+    def multicall(self):
+        """The Multicall3 contract, or None if it isn't deployed on this chain (checked once)"""
+        if self._multicall is None and self.multicall_address:
+            address = Web3.to_checksum_address(self.multicall_address)
+            if self.w3.eth.get_code(address):
+                self._multicall = self.w3.eth.contract(address=address, abi=MULTICALL3_ABI)
+            else:
+                self.multicall_address = None
+        return self._multicall
+
+    @staticmethod
+    def _decode(function, success, data) -> Tuple[bool, Optional[object]]:
+        if not success or not data:
+            return False, None
+        try:
+            values = function.w3.codec.decode(get_abi_output_types(function.abi), data)
+        except Exception:
+            return False, None
+        return True, values[0] if len(values) == 1 else values
+
+    def _read_multicall(self, functions, block):
+        calls = [(function.address, True, function._encode_transaction_data()) for function in functions]
+        results = self.multicall().functions.aggregate3(calls).call(block_identifier=block)
+        return [self._decode(function, success, data) for function, (success, data) in zip(functions, results)]
+
+    def _read_batch(self, functions, block):
+        block = Web3.to_hex(block) if isinstance(block, int) else block
+        requests = [("eth_call", [{"to": function.address, "data": function._encode_transaction_data()}, block])
+                    for function in functions]
+        responses = [None] * len(requests)
+        unanswered = range(len(requests))
+        if self._batching:
+            try:
+                unanswered = batch_request(self.w3.provider, requests, responses)
+            except BatchUnsupported as e:
+                # Providers without batch support get one request per call from now on
+                print(f"Batch eth_call unsupported ({e}), reading calls individually")
+                self._batching = False
+        for i in unanswered:
+            responses[i] = self.w3.provider.make_request(*requests[i])
+
+        results = []
+        for function, response in zip(functions, responses):
+            result = response.get("result") if isinstance(response, dict) else None
+            results.append(self._decode(function, result is not None, Web3.to_bytes(hexstr=result) if result else b""))
+        return results
+
+    def read_many(self, functions: List, block=None) -> List[Tuple[bool, Optional[object]]]:
+        """
+        Call every bound contract function (e.g. contract.functions.ownerOf(1))
+
+        Args:
+            functions: Bound view functions, in any mix of contracts
+            block: Block to read at (defaults to the latest block, read once)
+
+        Returns:
+            (success, decoded value) per function, in order
+        """
+        if not functions:
+            return []
+        if block is None:
+            block = self.w3.eth.block_number
+
+        if self.multicall() is not None:
+            read, size = self._read_multicall, self.multicall_size
+        else:
+            read, size = self._read_batch, self.rpc_batch_size
+        chunks = [functions[i:i + size] for i in range(0, len(functions), size)]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as pool:
+            return [result for chunk in pool.map(lambda chunk: read(chunk, block), chunks) for result in chunk]
@@ -0,0 +1,95 @@
+"""
+Route Geometry Utilities
+Local metric projection and polyline simplification shared by the route modules
+"""
+
+import heapq
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+def project_local(coords, origin=None):
+    """
+    Project (lat, lng) pairs onto a local equirectangular plane in meters.
+    The origin defaults to the mean of the coordinates; pass the same origin
+    to put several routes on one plane. Returns (xy, origin).
+    """
+    coords = np.asarray(coords, dtype=np.float64)[:, :2]
+    if origin is None:
+        origin = coords.mean(axis=0)
+    lat0 = np.radians(origin[0])
+    scale = np.radians(1.0) * EARTH_RADIUS_M
+    xy = np.empty_like(coords)
+    xy[:, 0] = (coords[:, 1] - origin[1]) * scale * np.cos(lat0)
+    xy[:, 1] = (coords[:, 0] - origin[0]) * scale
+    return xy, origin
+
+def unproject_local(xy, origin):
+    """Inverse of project_local: local plane coordinates in meters back to (lat, lng) pairs"""
+    xy = np.asarray(xy, dtype=np.float64)
+    lat0 = np.radians(origin[0])
+    scale = np.radians(1.0) * EARTH_RADIUS_M
+    coords = np.empty_like(xy)
+    coords[:, 0] = xy[:, 1] / scale + origin[0]
+    coords[:, 1] = xy[:, 0] / (scale * np.cos(lat0)) + origin[1]
+    return coords
+
+def segment_distances(points, start, end):
+    """Distance from each point to the segment start-end"""
+    direction = end - start
+    length_sq = float(direction @ direction)
+    if length_sq == 0.0:
+        return np.linalg.norm(points - start, axis=1)
+    t = np.clip((points - start) @ direction / length_sq, 0.0, 1.0)
+    return np.linalg.norm(points - (start + t[:, None] * direction), axis=1)
+
+def simplify_indices(xy, tolerance=None, max_points=None):
+    """
+    Douglas-Peucker simplification of a planar polyline.
+
+    Segments are split in order of their largest deviation, so the result is
+    the classic tolerance-based simplification when only tolerance is given,
+    and the best max_points-point approximation (greedily) when a budget is
+    given. Distances for each split are computed in one vectorized pass.
+    Returns the sorted indices of the points to keep.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    n = len(xy)
+    if max_points is not None:
+        max_points = max(int(max_points), 2)
+    if n <= 2 or (tolerance is None and (max_points is None or max_points >= n)):
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    kept = 2
+    heap = []
+
+    def push(first, last):
+        if last - first < 2:
+            return
+        distances = segment_distances(xy[first + 1:last], xy[first], xy[last])
+        farthest = int(np.argmax(distances))
+        heapq.heappush(heap, (-distances[farthest], first, last, first + 1 + farthest))
+
+    push(0, n - 1)
+    while heap and (max_points is None or kept < max_points):
+        neg_distance, first, last, split = heapq.heappop(heap)
+        if tolerance is not None and -neg_distance <= tolerance:
+            break
+        keep[split] = True
+        kept += 1
+        push(first, split)
+        push(split, last)
+
+    return np.flatnonzero(keep)
+
+def simplify_coords(coords, tolerance_m=None, max_points=None):
+    """
+    Simplify a (lat, lng) route with a tolerance in meters and/or a point budget.
+    Returns the kept coordinates in their original order.
+    """
+    if len(coords) <= 2 or (tolerance_m is None and max_points is None):
+        return list(coords)
+    xy, _ = project_local(coords)
+    return [coords[i] for i in simplify_indices(xy, tolerance_m, max_points)]
@@ -0,0 +1,200 @@
+"""
+NFT Contract Artifact
+Solidity source of the GLBNFT contract and its ABI/bytecode, loaded from a prebuilt artifact keyed by the source hash
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+SOLIDITY_VERSION = "0.8.20"
+CONTRACT_NAME = "GLBNFT"
+# Bump when the artifact layout changes
+ARTIFACT_FORMAT = 1
+ARTIFACT_PATH = os.getenv(
+    "NFT_ARTIFACT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "artifacts", f"{CONTRACT_NAME}.json")
+)
+
+OZ_ERC721_SOURCE = """
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+contract GLBNFT {
+    string public name;
+    string public symbol;
+    address public owner;
+    uint256 private _nextTokenId;
+    
+    mapping(uint256 => address) private _owners;
+    mapping(address => uint256) private _balances;
+    mapping(uint256 => string) private _tokenURIs;
+    
+    event NFTMinted(address indexed recipient, uint256 indexed tokenId, string tokenURI);
+    event Transfer(address indexed from, address indexed to, uint256 indexed tokenId);
+    
+    modifier onlyOwner() {
+        require(msg.sender == owner, "Not owner");
+        _;
+    }
+    
+    constructor(string memory name_, string memory symbol_) {
+        name = name_;
+        symbol = symbol_;
+        owner = msg.sender;
+    }
+    
+    function mintNFT(address recipient, string memory tokenURI) public onlyOwner returns (uint256) {
+        uint256 tokenId = _nextTokenId++;
+        _mint(recipient, tokenId);
+        _setTokenURI(tokenId, tokenURI);
+        
+        emit NFTMinted(recipient, tokenId, tokenURI);
+        return tokenId;
+    }
+    
+    function mintBatch(address[] calldata recipients, string[] calldata tokenURIs) public onlyOwner returns (uint256) {
+        require(recipients.length == tokenURIs.length, "Length mismatch");
+        uint256 firstTokenId = _nextTokenId;
+        for (uint256 i = 0; i < recipients.length; i++) {
+            uint256 tokenId = _nextTokenId++;
+            _mint(recipients[i], tokenId);
+            _setTokenURI(tokenId, tokenURIs[i]);
+            
+            emit NFTMinted(recipients[i], tokenId, tokenURIs[i]);
+        }
+        return firstTokenId;
+    }
+    
+    function _mint(address to, uint256 tokenId) internal {
+        require(to != address(0), "Invalid recipient");
+        require(_owners[tokenId] == address(0), "Token already exists");
+        
+        _balances[to]++;
+        _owners[tokenId] = to;
+        
+        emit Transfer(address(0), to, tokenId);
+    }
+    
+    function _setTokenURI(uint256 tokenId, string memory tokenURI) internal {
+        _tokenURIs[tokenId] = tokenURI;
+    }
+    
+    function ownerOf(uint256 tokenId) public view returns (address) {
+        address tokenOwner = _owners[tokenId];
+        require(tokenOwner != address(0), "Token does not exist");
+        return tokenOwner;
+    }
+    
+    function balanceOf(address account) public view returns (uint256) {
+        return _balances[account];
+    }
+    
+    function tokenURI(uint256 tokenId) public view returns (string memory) {
+        require(_owners[tokenId] != address(0), "Token does not exist");
+        return _tokenURIs[tokenId];
+    }
+    
+    function getCurrentTokenId() public view returns (uint256) {
+        return _nextTokenId;
+    }
+}
+"""
+
+COMPILER_SETTINGS = {"outputSelection": {"*": {"*": ["abi", "evm.bytecode"]}}}
+
+_interface = None
+_interface_lock = threading.Lock()
+
+def source_hash():
+    """sha256 of everything that determines the compiled output"""
+    key = json.dumps({
+        "source": OZ_ERC721_SOURCE,
+        "solc_version": SOLIDITY_VERSION,
+        "settings": COMPILER_SETTINGS,
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def cache_path():
+    """Where a contract compiled at runtime is cached when ARTIFACT_PATH isn't writable (e.g. on Vercel)"""
+    return os.path.join(tempfile.gettempdir(), f"{CONTRACT_NAME}-{source_hash()[:12]}.json")
+
+def compile_contract():
+    """Compile the contract with solc (installing it if needed), returning (abi, bytecode)"""
+    try:
+        from solcx import compile_standard, install_solc
+    except ImportError:
+        raise RuntimeError(f"{ARTIFACT_PATH} is missing or stale and py-solc-x is not installed; "
+                           "run build_contract_artifact.py and commit the artifact")
+    install_solc(SOLIDITY_VERSION)
+    compiled = compile_standard(
+        {
+            "language": "Solidity",
+            "sources": {f"{CONTRACT_NAME}.sol": {"content": OZ_ERC721_SOURCE}},
+            "settings": COMPILER_SETTINGS,
+        },
+        solc_version=SOLIDITY_VERSION
+    )
+    contract_interface = compiled["contracts"][f"{CONTRACT_NAME}.sol"][CONTRACT_NAME]
+    return contract_interface["abi"], contract_interface["evm"]["bytecode"]["object"]
+
+def write_artifact(abi, bytecode, path=ARTIFACT_PATH):
+    """Write a compiled artifact tagged with the current source hash"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "contract": CONTRACT_NAME,
+        "solc_version": SOLIDITY_VERSION,
+        "source_sha256": source_hash(),
+        "abi": abi,
+        "bytecode": bytecode,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(artifact, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def read_artifact(path=ARTIFACT_PATH):
+    """(abi, bytecode) from the artifact, or None if it is missing or was built from a different source"""
+    try:
+        with open(path) as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if artifact.get("format") != ARTIFACT_FORMAT or artifact.get("source_sha256") != source_hash():
+        print(f"Contract artifact {path} is stale (source changed since it was built)")
+        return None
+    return artifact["abi"], artifact["bytecode"]
+
+def contract_interface():
+    """
+    (abi, bytecode) for the contract, loaded on first use. Comes from the
+    prebuilt artifact when its hash matches the source; otherwise the source
+    is compiled once and cached in ARTIFACT_PATH, or in the temp dir where
+    ARTIFACT_PATH is read-only.
+    """
+    global _interface
+    if _interface is None:
+        with _interface_lock:
+            if _interface is None:
+                interface = read_artifact() or read_artifact(cache_path())
+                if interface is None:
+                    print(f"Compiling {CONTRACT_NAME} with solc {SOLIDITY_VERSION} (run build_contract_artifact.py to skip this)")
+                    interface = compile_contract()
+                    for path in (ARTIFACT_PATH, cache_path()):
+                        try:
+                            write_artifact(*interface, path=path)
+                            break
+                        except OSError as e:
+                            print(f"Could not cache contract artifact in {path}: {e}")
+                _interface = interface
+    return _interface
+
+def contract_abi():
+    return contract_interface()[0]
+
+def contract_bytecode():
+    return contract_interface()[1]
@@ -0,0 +1,76 @@
+"""
+NFT Event Decoding
+Decodes GLBNFT Transfer and NFTMinted logs straight from their topics, for receipts and eth_getLogs results
+"""
+
+from eth_abi import decode as abi_decode
+from web3 import Web3
+
+# keccak256 of the event signatures (topic 0), computed once
+TRANSFER_TOPIC = bytes(Web3.keccak(text="Transfer(address,address,uint256)"))
+NFT_MINTED_TOPIC = bytes(Web3.keccak(text="NFTMinted(address,uint256,string)"))
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+def _topic_bytes(topic):
+    return Web3.to_bytes(hexstr=topic) if isinstance(topic, str) else bytes(topic)
+
+def _topic_address(topic):
+    return Web3.to_checksum_address(topic[-20:])
+
+def decode_log(log, with_uri=True):
+    """
+    Decode a Transfer or NFTMinted log (a receipt log or an eth_getLogs entry)
+
+    Args:
+        log: Log with "topics" and "data"
+        with_uri: Decode the token URI from NFTMinted data (the only part that needs ABI decoding)
+
+    Returns:
+        Dict with "event", "token_id" and the event's addresses ("from"/"to" or
+        "recipient", plus "token_uri"), or None for any other log
+    """
+    topics = [_topic_bytes(topic) for topic in log["topics"]]
+    if not topics:
+        return None
+    if topics[0] == TRANSFER_TOPIC and len(topics) == 4:
+        return {
+            "event": "Transfer",
+            "from": _topic_address(topics[1]),
+            "to": _topic_address(topics[2]),
+            "token_id": int.from_bytes(topics[3], "big"),
+        }
+    if topics[0] == NFT_MINTED_TOPIC and len(topics) == 3:
+        event = {
+            "event": "NFTMinted",
+            "recipient": _topic_address(topics[1]),
+            "token_id": int.from_bytes(topics[2], "big"),
+        }
+        if with_uri:
+            data = log["data"]
+            event["token_uri"] = abi_decode(["string"], _topic_bytes(data))[0]
+        return event
+    return None
+
+def minted_token_ids(receipt, contract_address=None):
+    """
+    Token ids minted by a transaction, in mint order, from its receipt logs.
+    NFTMinted logs are used when present; otherwise Transfer logs from the zero address.
+
+    Args:
+        receipt: Transaction receipt
+        contract_address: Only count logs emitted by this contract
+    """
+    if contract_address:
+        contract_address = Web3.to_checksum_address(contract_address)
+    minted, transferred = [], []
+    for log in receipt["logs"]:
+        if contract_address and Web3.to_checksum_address(log["address"]) != contract_address:
+            continue
+        event = decode_log(log, with_uri=False)
+        if event is None:
+            continue
+        if event["event"] == "NFTMinted":
+            minted.append(event["token_id"])
+        elif event["from"] == ZERO_ADDRESS:
+            transferred.append(event["token_id"])
+    return minted or transferred
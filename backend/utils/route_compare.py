@@ -0,0 +1,176 @@
+"""
+Route Comparison Engine
+Compares routes in local metric coordinates with Hausdorff and discrete Fréchet distances
+"""
+
+import numpy as np
+import polyline
+from scipy.spatial import cKDTree
+
+from utils.geometry import project_local
+
+# Resampled routes keep at most this many points, spaced no closer than MIN_SPACING_M
+MAX_SAMPLES = 2000
+MIN_SPACING_M = 1.0
+QUERY_CHUNK = 512
+# The Fréchet check runs on routes resampled at this fraction of the match threshold
+FRECHET_SPACING_FRACTION = 0.25
+FRECHET_BLOCK = 128
+
+def path_length(xy):
+    """Total length of a planar polyline"""
+    return float(np.linalg.norm(np.diff(xy, axis=0), axis=1).sum()) if len(xy) > 1 else 0.0
+
+def resample(xy, spacing):
+    """Resample a planar polyline to points evenly spaced along its length (endpoints kept)"""
+    steps = np.linalg.norm(np.diff(xy, axis=0), axis=1)
+    distance = np.concatenate([[0.0], np.cumsum(steps)])
+    total = distance[-1]
+    if total == 0.0:
+        return xy[:1].copy()
+    samples = np.linspace(0.0, total, max(2, int(np.ceil(total / spacing)) + 1))
+    return np.column_stack([np.interp(samples, distance, xy[:, 0]), np.interp(samples, distance, xy[:, 1])])
+
+def sample_spacing(xy, minimum=MIN_SPACING_M):
+    """Resampling step that keeps a route within MAX_SAMPLES points"""
+    return max(path_length(xy) / MAX_SAMPLES, minimum)
+
+def directed_hausdorff(points, tree):
+    """Largest distance from any of points to the points indexed by tree"""
+    worst = 0.0
+    for i in range(0, len(points), QUERY_CHUNK):
+        distances, _ = tree.query(points[i:i + QUERY_CHUNK])
+        worst = max(worst, float(distances.max()))
+    return worst
+
+def frechet_within(a, b, threshold):
+    """
+    Decide whether the discrete Fréchet distance between a and b is <= threshold.
+    Works row by row over the free-space grid, keeping only one row of reachable
+    cells (free cells are computed FRECHET_BLOCK rows at a time), and stops as
+    soon as a row has none.
+    """
+    if np.linalg.norm(a[0] - b[0]) > threshold or np.linalg.norm(a[-1] - b[-1]) > threshold:
+        return False
+
+    limit = threshold * threshold
+    index = np.arange(len(b))
+    reach = None
+    for start in range(0, len(a), FRECHET_BLOCK):
+        offsets = a[start:start + FRECHET_BLOCK, None, :] - b[None, :, :]
+        free_block = np.einsum("ijk,ijk->ij", offsets, offsets) <= limit
+        for free in free_block:
+            if reach is None:
+                reach = np.logical_and.accumulate(free)
+                continue
+            # A cell is entered from above or diagonally, then reach spreads right along free runs
+            entered = reach.copy()
+            entered[1:] |= reach[:-1]
+            last_seed = np.maximum.accumulate(np.where(free & entered, index, -1))
+            last_block = np.maximum.accumulate(np.where(free, -1, index))
+            reach = free & (last_seed > last_block)
+            if not reach.any():
+                return False
+    return bool(reach[-1])
+
+class RouteIndex:
+    """A reference route projected, resampled and KD-tree indexed once, to compare many candidates against"""
+
+    def __init__(self, xy, origin):
+        """
+        Args:
+            xy: Reference route on the local metric plane
+            origin: (lat, lng) origin of that plane, used to project candidates
+        """
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.lower = xy.min(axis=0)
+        self.upper = xy.max(axis=0)
+        self.spacing = sample_spacing(xy)
+        self.samples = resample(xy, self.spacing)
+        self.tree = cKDTree(self.samples)
+
+    @classmethod
+    def from_coords(cls, coords):
+        """Build an index from (lat, lng) pairs"""
+        xy, origin = project_local(coords)
+        return cls(xy, origin)
+
+    @classmethod
+    def restore(cls, samples, origin, lower, upper, spacing):
+        """Rebuild an index from stored samples (e.g. a memory-mapped array) without re-projecting or resampling"""
+        index = cls.__new__(cls)
+        index.origin = np.asarray(origin, dtype=np.float64)
+        index.lower = np.asarray(lower, dtype=np.float64)
+        index.upper = np.asarray(upper, dtype=np.float64)
+        index.spacing = float(spacing)
+        index.samples = samples
+        index.tree = cKDTree(samples)
+        return index
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index"""
+        return self.samples.nbytes * 3
+
+    def compare(self, coords, threshold_ratio=0.02, check_order=False):
+        """
+        Compare a (lat, lng) candidate route against the reference.
+
+        The candidate is projected onto the reference's plane and resampled at
+        the same spacing (coarser if needed to stay within MAX_SAMPLES). They
+        match when the symmetric Hausdorff distance is below threshold_ratio of
+        the joint bounding box diagonal; with check_order the discrete Fréchet
+        distance must also be within that threshold (same direction and order
+        of travel). The Fréchet check runs on a coarser resampling and is
+        skipped once Hausdorff has failed.
+        """
+        xy, _ = project_local(coords, self.origin)
+        lower = np.minimum(self.lower, xy.min(axis=0))
+        upper = np.maximum(self.upper, xy.max(axis=0))
+        bbox_diagonal = float(np.linalg.norm(upper - lower))
+        threshold_m = threshold_ratio * bbox_diagonal
+        result = {
+            "match": False,
+            "hausdorff_m": None,
+            "ratio": None,
+            "threshold_m": threshold_m,
+            "bbox_diagonal_m": bbox_diagonal,
+            "frechet_match": None,
+        }
+        if bbox_diagonal == 0:
+            return result
+
+        candidate = resample(xy, sample_spacing(xy, self.spacing))
+        hausdorff = max(
+            directed_hausdorff(candidate, self.tree),
+            directed_hausdorff(self.samples, cKDTree(candidate))
+        )
+        result["hausdorff_m"] = hausdorff
+        result["ratio"] = hausdorff / bbox_diagonal
+        result["match"] = result["ratio"] < threshold_ratio
+
+        if check_order and result["match"]:
+            spacing = max(self.spacing, threshold_m * FRECHET_SPACING_FRACTION)
+            result["frechet_match"] = frechet_within(
+                resample(self.samples, spacing), resample(candidate, spacing), threshold_m
+            )
+            result["match"] = result["frechet_match"]
+        return result
+
+def compare_routes(coords1, coords2, threshold_ratio=0.02, check_order=False):
+    """Compare two (lat, lng) routes, see RouteIndex.compare"""
+    return RouteIndex.from_coords(coords1).compare(coords2, threshold_ratio, check_order)
+
+def compare_encoded(index, polylines, threshold_ratio=0.02, check_order=False):
+    """
+    Decode and compare encoded candidate polylines against a RouteIndex.
+    Top-level so batches can be shipped to worker processes; a candidate that
+    fails to decode or compare gets a non-matching result with an error.
+    """
+    results = []
+    for encoded in polylines:
+        try:
+            results.append(index.compare(polyline.decode(encoded), threshold_ratio, check_order))
+        except Exception as e:
+            results.append({"match": False, "error": str(e)})
+    return results
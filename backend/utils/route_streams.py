@@ -0,0 +1,170 @@
+"""
+Activity Stream Decoding
+Incremental decoding of Strava activity streams into bounded, resampled float arrays
+"""
+
+import re
+import numpy as np
+
+from utils.geometry import project_local, unproject_local
+from utils.route_compare import MAX_SAMPLES, MIN_SPACING_M
+
+STREAM_KEYS = ("latlng", "altitude", "time")
+
+# Start of a stream's data array in a key_by_type=true response: "latlng":{...,"data":[
+STREAM_DATA = re.compile(r'"(\w+)"\s*:\s*\{[^{}]*?"data"\s*:\s*\[')
+# End of a data array; latlng is an array of pairs, so it ends with "]]" (or is empty)
+PAIRS_END = re.compile(r"^\s*\]|\]\s*\]")
+VALUES_END = re.compile(r"\]")
+# Enough of a chunk's tail to hold a stream header split across chunks
+HEADER_TAIL = 256
+STRIP = str.maketrans("", "", "[] \t\r\n")
+
+def parse_numbers(text):
+    """Comma separated numbers (brackets ignored) as a float64 array"""
+    text = text.translate(STRIP).strip(",")
+    if not text:
+        return np.empty(0)
+    return np.array(text.split(","), dtype=np.float64)
+
+class StreamDecoder:
+    """
+    Decodes a key_by_type=true streams response fed in arbitrary text chunks.
+    Each wanted stream's values are handed to on_values(key, values) in
+    pieces as they complete (latlng as (n, 2) arrays), so the response body
+    is never held whole; other streams are skipped without parsing.
+    """
+
+    def __init__(self, on_values, keys=STREAM_KEYS):
+        self.on_values = on_values
+        self.keys = set(keys)
+        self.buffer = ""
+        self.key = None
+
+    def feed(self, text):
+        self.buffer += text
+        while True:
+            if self.key is None:
+                match = STREAM_DATA.search(self.buffer)
+                if match is None:
+                    self.buffer = self.buffer[-HEADER_TAIL:]
+                    return
+                self.key = match.group(1)
+                self.buffer = self.buffer[match.end():]
+
+            pairs = self.key == "latlng"
+            end = (PAIRS_END if pairs else VALUES_END).search(self.buffer)
+            if end is not None:
+                body, self.buffer = self.buffer[:end.start()], self.buffer[end.end():]
+            else:
+                # Only hand over whole values (whole pairs for latlng)
+                separator = "]," if pairs else ","
+                cut = self.buffer.rfind(separator)
+                if cut < 0:
+                    return
+                body, self.buffer = self.buffer[:cut], self.buffer[cut + len(separator):]
+
+            if self.key in self.keys:
+                values = parse_numbers(body)
+                if len(values):
+                    self.on_values(self.key, values.reshape(-1, 2) if pairs else values)
+            if end is None:
+                return
+            self.key = None
+
+class StreamResampler:
+    """
+    Resamples a (lat, lng) route fed in chunks to points evenly spaced along
+    its length, in memory bounded by max_samples. Samples sit at multiples of
+    the spacing, so when the buffer fills, the spacing doubles and every other
+    sample is dropped. The result is the route sampled every `spacing` meters
+    from its start, plus its last point.
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES, min_spacing=MIN_SPACING_M):
+        self.capacity = 2 * max_samples
+        self.spacing = min_spacing
+        self.origin = None
+        self.samples = np.empty((0, 2))
+        self.distance = 0.0
+        self.last = None
+
+    def feed(self, latlng):
+        latlng = np.asarray(latlng, dtype=np.float64).reshape(-1, 2)
+        if not len(latlng):
+            return
+        if self.origin is None:
+            self.origin = latlng[0]
+        xy, _ = project_local(latlng, self.origin)
+        if self.last is not None:
+            xy = np.vstack([self.last, xy])
+        distance = self.distance + np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(xy, axis=0), axis=1))])
+        end = distance[-1]
+
+        while end / self.spacing + 1 > self.capacity:
+            self.samples = self.samples[::2]
+            self.spacing *= 2
+        # The next sample is always at len(samples) * spacing
+        positions = np.arange(len(self.samples), int(end / self.spacing) + 1) * self.spacing
+        if len(positions):
+            self.samples = np.vstack([self.samples, np.column_stack([
+                np.interp(positions, distance, xy[:, 0]),
+                np.interp(positions, distance, xy[:, 1]),
+            ])])
+        self.last = xy[-1]
+        self.distance = end
+
+    def finish(self):
+        """The resampled route as (lat, lng) pairs"""
+        if self.origin is None:
+            return np.empty((0, 2))
+        samples = self.samples
+        if self.distance > (len(samples) - 1) * self.spacing:
+            samples = np.vstack([samples, self.last])
+        return unproject_local(samples, self.origin)
+
+class SeriesDecimator:
+    """Keeps every stride-th value of a series fed in chunks, doubling the stride to stay within max_samples"""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.capacity = 2 * max_samples
+        self.stride = 1
+        self.count = 0
+        self.values = np.empty(0, dtype=np.float32)
+
+    def feed(self, values):
+        while (self.count + len(values)) // self.stride + 1 > self.capacity:
+            self.values = self.values[::2]
+            self.stride *= 2
+        kept = values[(-self.count) % self.stride::self.stride].astype(np.float32)
+        self.values = np.concatenate([self.values, kept])
+        self.count += len(values)
+
+    def finish(self):
+        return self.values
+
+class ActivityStreams:
+    """Collects decoded stream chunks: the route is resampled by distance, other series decimated by index"""
+
+    def __init__(self):
+        self.route = StreamResampler()
+        self.series = {}
+        self.sizes = {}
+
+    def add(self, key, values):
+        self.sizes[key] = self.sizes.get(key, 0) + len(values)
+        if key == "latlng":
+            self.route.feed(values)
+        else:
+            self.series.setdefault(key, SeriesDecimator()).feed(values)
+
+    def finish(self):
+        """
+        Returns:
+            Dict with the resampled "latlng" route, float32 arrays for the other
+            streams and "original_size", the number of latlng points received
+        """
+        streams = {key: series.finish() for key, series in self.series.items()}
+        streams["latlng"] = self.route.finish()
+        streams["original_size"] = self.sizes.get("latlng", 0)
+        return streams
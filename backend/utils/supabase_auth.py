@@ -0,0 +1,78 @@
+"""
+Supabase Authentication
+Identifies API callers by the Supabase access token (a JWT) the app sends as "Authorization: Bearer <token>"
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import jwt
+
+# Projects on the legacy JWT secret sign access tokens with HS256; others publish their signing keys as JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = "authenticated"
+ASYMMETRIC_ALGORITHMS = ["ES256", "RS256"]
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+
+class AuthError(Exception):
+    """The bearer token is malformed, expired or not signed by our Supabase project"""
+
+def jwks_client() -> jwt.PyJWKClient:
+    """Client for the project's published signing keys, fetched once and cached"""
+    global _jwks_client
+    with _jwks_lock:
+        if _jwks_client is None:
+            from config import settings
+            _jwks_client = jwt.PyJWKClient(
+                f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json", cache_keys=True
+            )
+        return _jwks_client
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """The token from an Authorization header, or None if there is no bearer token"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise AuthError("Authorization header must be 'Bearer <token>'")
+    return token.strip()
+
+def verify_access_token(token: str) -> Dict:
+    """
+    Verify a Supabase access token's signature, audience and expiry
+
+    Args:
+        token: Encoded JWT
+
+    Returns:
+        The token's claims; "sub" is the Supabase user id
+    """
+    options = {"require": ["exp", "sub"]}
+    try:
+        if SUPABASE_JWT_SECRET:
+            return jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"],
+                              audience=SUPABASE_JWT_AUDIENCE, options=options)
+        key = jwks_client().get_signing_key_from_jwt(token).key
+        return jwt.decode(token, key, algorithms=ASYMMETRIC_ALGORITHMS,
+                          audience=SUPABASE_JWT_AUDIENCE, options=options)
+    except jwt.PyJWTError as e:
+        raise AuthError(str(e))
+
+def authenticated_user_id(authorization: Optional[str]) -> Optional[str]:
+    """
+    The Supabase user id of the caller
+
+    Args:
+        authorization: Authorization header value
+
+    Returns:
+        The user id, or None when the request carries no bearer token. Raises
+        AuthError when it carries one that doesn't verify.
+    """
+    token = bearer_token(authorization)
+    if token is None:
+        return None
+    return verify_access_token(token)["sub"]
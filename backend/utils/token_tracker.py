@@ -14,6 +14,7 @@ from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from routes.nft import ABI, validate_contract, get_next_token_id
+from utils.batch_reads import BatchReader
 
 load_dotenv()
 
@@ -26,6 +27,8 @@ class TokenTracker:
         self.w3 = Web3(Web3.HTTPProvider(self.rpc_url, request_kwargs={'timeout': 15}))
         if not self.w3.is_connected():
             raise RuntimeError("Failed to connect to blockchain")
+        # Token scans read ownerOf through Multicall3 or JSON-RPC batches instead of one call per token
+        self.reader = BatchReader(self.w3)
     
     def get_contract_info(self, contract_address):
         """Get basic contract information"""
@@ -77,16 +80,12 @@ class TokenTracker:
             )
             owner_address = Web3.to_checksum_address(owner_address)
             
-            next_token_id = get_next_token_id(contract)
             owned_tokens = []
-            
-            for token_id in range(next_token_id):
-                try:
-                    owner = contract.functions.ownerOf(token_id).call({"timeout": 2})
-                    if owner.lower() == owner_address.lower():
-                        owned_tokens.append(token_id)
-                except:
-                    continue
+            if contract.functions.balanceOf(owner_address).call() > 0:
+                next_token_id = get_next_token_id(contract)
+                owners = self.reader.read_many([contract.functions.ownerOf(token_id) for token_id in range(next_token_id)])
+                owned_tokens = [token_id for token_id, (ok, owner) in enumerate(owners)
+                                if ok and owner.lower() == owner_address.lower()]
             
             return {
                 "owner": owner_address,
@@ -110,18 +109,12 @@ class TokenTracker:
             # Only check up to the limit to avoid long waits
             check_range = min(next_token_id, limit)
             
-            for token_id in range(check_range):
-                try:
-                    owner = contract.functions.ownerOf(token_id).call({"timeout": 2})
-                    tokens.append({
-                        "token_id": token_id,
-                        "owner": owner
-                    })
-                except:
-                    tokens.append({
-                        "token_id": token_id,
-                        "owner": "Error or doesn't exist"
-                    })
+            owners = self.reader.read_many([contract.functions.ownerOf(token_id) for token_id in range(check_range)])
+            for token_id, (ok, owner) in enumerate(owners):
+                tokens.append({
+                    "token_id": token_id,
+                    "owner": Web3.to_checksum_address(owner) if ok else "Error or doesn't exist"
+                })
             
             return {
                 "total_tokens": next_token_id,